@@ -1,17 +1,19 @@
 import asyncio
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 from fastapi.responses import StreamingResponse
 
 import json
 from typing import Any
 from langchain_core.messages import AIMessage
+from langgraph.graph import StateGraph
 
 from core.graph.state import init_state
-from core.graph.build_graph import create_main_graph
+from core.graph.graph_dependencies import get_graph
+from services.admission import admission
+from state_management.state_cleanup_manager import track_thread
 
 router = APIRouter()
-graph = create_main_graph()
 
 class ChatRequest(BaseModel):
     chat_id: str
@@ -19,12 +21,13 @@ class ChatRequest(BaseModel):
     uuid: str
 
 @router.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, graph: StateGraph = Depends(get_graph)):
     """
     Xử lý yêu cầu chat dạng streaming (v1).
 
     Args:
         request (ChatRequest): Thông tin phiên chat gồm `chat_id`, `user_input`, `uuid`.
+        graph (StateGraph): Graph dùng chung được inject từ lifespan.
 
     Returns:
         StreamingResponse: Dòng sự kiện SSE chứa nội dung phản hồi theo thời gian thực.
@@ -32,13 +35,18 @@ async def chat(request: ChatRequest):
     thread_id = str(request.uuid)
     config = {"configurable": {"thread_id": thread_id}}
 
-    state = graph.get_state(config).values if graph.get_state(config).values else init_state()
+    admission.check()
+
+    await track_thread(graph, thread_id)
+    snapshot = await graph.aget_state(config)
+    state = snapshot.values or init_state()
     state["user_input"] = request.user_input
     state["chat_id"] = request.chat_id
-    
+
     events = graph.astream(state, config=config)
+
     return StreamingResponse(
-        stream_messages(events, thread_id),
+        admission.guard_stream(stream_messages(events, thread_id)),
         media_type="text/event-stream"
     )
     
@@ -1,40 +1,39 @@
-from fastapi import APIRouter
+from typing import Optional
+from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 from fastapi.responses import StreamingResponse
 
-from core.graph.build_graph import create_main_graph
-from services.utils import get_or_create_customer, stream_messages
-from services.process_chat import handle_normal_chat, handle_new_chat
-from services.utils import get_final_response
+from langgraph.graph import StateGraph
+
+from core.graph.graph_dependencies import get_graph
+from services.process_chat import stream_chat_turn, invoke_chat_turn, handle_new_chat
+from services.admission import admission, AdmissionRejected
+from services.idempotency import idempotency_cache
 from log.logger_config import setup_logging
 
 logger = setup_logging(__name__)
 
 router = APIRouter()
-graph = create_main_graph()
 
 class ChatRequest(BaseModel):
     chat_id: str
     user_input: str
+    message_id: Optional[str] = None
 
 @router.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, graph: StateGraph = Depends(get_graph)):
     """
     Xử lý yêu cầu chat dạng streaming (v2) có kiểm soát luồng nghiệp vụ.
 
     Args:
         request (ChatRequest): Dữ liệu gồm `chat_id`, `user_input`.
+        graph (StateGraph): Graph dùng chung được inject từ lifespan.
 
     Returns:
         StreamingResponse: Dòng sự kiện SSE phản hồi.
     """
     try:
         user_input = request.user_input
-        
-        customer = await get_or_create_customer(chat_id=request.chat_id)
-        
-        logger.info(f"Lấy hoặc tạo mới khách: {customer}")
-        logger.info(f"Tin nhắn của khách: {user_input}")
 
         if any(cmd in user_input for cmd in ["/start", "/restart"]):
             return StreamingResponse(
@@ -42,51 +41,68 @@ async def chat(request: ChatRequest):
                 media_type="text/event-stream"
             )
 
-        events, thread_id = await handle_normal_chat(
-            user_input=user_input,
-            chat_id=request.chat_id,
-            customer=customer,
-            graph=graph
+        admission.check()
+        return StreamingResponse(
+            admission.guard_stream(
+                stream_chat_turn(
+                    user_input=user_input,
+                    chat_id=request.chat_id,
+                    graph=graph,
+                    metric_prefix="api_v2.chat"
+                )
+            ),
+            media_type="text/event-stream"
         )
 
-        if events and thread_id:
-            return StreamingResponse(
-                stream_messages(events, thread_id),
-                media_type="text/event-stream"
-            )
-            
     except Exception as e:
         logger.error(f"Lỗi: {e}")
         raise
 
 class ChatResponse(BaseModel):
     reply: str
+    coalesced: bool = False
+    replayed: bool = False
 
 @router.post("/chat/invoke", response_model=ChatResponse)
-async def chat_invoke(request: ChatRequest):
+async def chat_invoke(request: ChatRequest, graph: StateGraph = Depends(get_graph)):
     """
     Xử lý yêu cầu chat và trả về một phản hồi JSON duy nhất (không streaming).
+    Nếu tin nhắn được gộp vào một lượt khác của cùng chat, `coalesced` là True và `reply` rỗng.
+    Nếu có `message_id`, lần gửi lại cùng tin nhắn sẽ nhận lại kết quả cũ (`replayed` là True)
+    thay vì chạy lại graph.
     """
+    async def run_turn():
+        async with admission.slot():
+            return await invoke_chat_turn(
+                user_input=request.user_input,
+                chat_id=request.chat_id,
+                graph=graph
+            )
+
     try:
-        customer = await get_or_create_customer(chat_id=request.chat_id)
-        
-        events, thread_id = await handle_normal_chat(
-            user_input=request.user_input,
-            chat_id=request.chat_id,
-            customer=customer,
-            graph=graph
-        )
+        replayed = False
+        if request.message_id:
+            (final_reply, coalesced), replayed = await idempotency_cache.run(
+                chat_id=request.chat_id,
+                message_id=request.message_id,
+                factory=run_turn
+            )
+        else:
+            final_reply, coalesced = await run_turn()
+
+        if coalesced:
+            return ChatResponse(reply="", coalesced=True, replayed=replayed)
 
-        if events and thread_id:
-            # Lấy câu trả lời cuối cùng từ luồng sự kiện
-            final_reply = await get_final_response(events)
-            if final_reply:
-                return ChatResponse(reply=final_reply)
+        if final_reply:
+            return ChatResponse(reply=final_reply, replayed=replayed)
 
         # Xử lý trường hợp không có phản hồi
         logger.warning("Không tìm thấy phản hồi cuối cùng từ graph.")
         return ChatResponse(reply="Xin lỗi, em chưa thể xử lý yêu cầu này ạ.")
 
+    except AdmissionRejected:
+        raise
+
     except Exception as e:
         logger.error(f"Lỗi trong chat_invoke: {e}")
-        return ChatResponse(reply="Rất tiếc, đã có sự cố xảy ra phía máy chủ.")
\ No newline at end of file
+        return ChatResponse(reply="Rất tiếc, đã có sự cố xảy ra phía máy chủ.")
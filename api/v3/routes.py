@@ -1,41 +1,47 @@
+from typing import Optional
 from pydantic import BaseModel
 from fastapi import APIRouter, Depends
 from fastapi.responses import StreamingResponse
 
+from langgraph.graph import StateGraph
+
 from core.graph.graph_dependencies import get_graph
-from core.graph.build_graph import create_main_graph
-from services.utils import get_or_create_customer, stream_messages
-from services.process_chat import handle_normal_chat, handle_new_chat
+from services.process_chat import (
+    stream_chat_turn,
+    handle_new_chat,
+    run_chat_batch,
+    stream_chat_batch
+)
+from services.admission import admission
 
 from log.logger_config import setup_logging
 
 logger = setup_logging(__name__)
 
 router = APIRouter()
-# graph = Depends(get_graph)
-graph = create_main_graph()
 
 class ChatRequest(BaseModel):
     chat_id: str
     user_input: str
 
+class BatchChatRequest(BaseModel):
+    items: list[ChatRequest]
+    stream: bool = False
+
+class BatchChatResult(BaseModel):
+    chat_id: str
+    reply: Optional[str] = None
+    coalesced: bool = False
+    error: Optional[str] = None
+
+class BatchChatResponse(BaseModel):
+    results: list[BatchChatResult]
+
 @router.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, graph: StateGraph = Depends(get_graph)):
     try:
         user_input = request.user_input
         chat_id = request.chat_id
-        
-        config = {
-            "configurable": 
-            {
-                "thread_id": chat_id
-            }
-        }
-        
-        customer = await get_or_create_customer(chat_id=chat_id)
-        
-        logger.info(f"Lấy hoặc tạo mới khách: {customer}")
-        logger.info(f"Tin nhắn của khách: {user_input}")
 
         if any(cmd in user_input for cmd in ["/start", "/restart"]):
             return StreamingResponse(
@@ -43,19 +49,50 @@ async def chat(request: ChatRequest):
                 media_type="text/event-stream"
             )
 
-        events, thread_id = await handle_normal_chat(
-            user_input=user_input,
-            chat_id=chat_id,
-            customer=customer,
-            graph=graph
+        admission.check()
+        return StreamingResponse(
+            admission.guard_stream(
+                stream_chat_turn(
+                    user_input=user_input,
+                    chat_id=chat_id,
+                    graph=graph,
+                    metric_prefix="api_v3.chat"
+                )
+            ),
+            media_type="text/event-stream"
         )
 
-        if events and thread_id:
+    except Exception as e:
+        logger.error(f"Lỗi: {e}")
+        raise
+
+@router.post("/chat/batch")
+async def chat_batch(request: BatchChatRequest, graph: StateGraph = Depends(get_graph)):
+    """
+    Xử lý đồng thời một batch tin nhắn từ gateway (nhiều `chat_id` trong một request).
+
+    Args:
+        request (BatchChatRequest): Danh sách `items` (`chat_id`, `user_input`) và cờ `stream`.
+        graph (StateGraph): Graph dùng chung được inject từ lifespan.
+
+    Returns:
+        BatchChatResponse | StreamingResponse: Kết quả JSON theo thứ tự `items`, hoặc
+        dòng SSE gắn `index`/`chat_id` nếu `stream` là True.
+    """
+    try:
+        # Từ chối cả batch ngay (429) nếu hàng đợi đã đầy, trước khi response bắt đầu
+        admission.check()
+        items = [item.model_dump() for item in request.items]
+
+        if request.stream:
             return StreamingResponse(
-                stream_messages(events, thread_id),
+                stream_chat_batch(items=items, graph=graph),
                 media_type="text/event-stream"
             )
-            
+
+        results = await run_chat_batch(items=items, graph=graph)
+        return BatchChatResponse(results=results)
+
     except Exception as e:
         logger.error(f"Lỗi: {e}")
-        raise
\ No newline at end of file
+        raise
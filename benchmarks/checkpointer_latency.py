@@ -0,0 +1,115 @@
+"""
+So sánh độ trễ đọc/ghi checkpoint mỗi lượt chat giữa `MemorySaver`, SQLite và Postgres.
+
+Graph giả lập hai bước mỗi lượt (supervisor -> agent), mỗi bước thêm một message và một khóa học
+vào `seen_products`, nên số checkpoint/lượt và kích thước state tăng giống graph thật mà không
+gọi LLM hay Supabase.
+
+Chạy:
+    python -m benchmarks.checkpointer_latency --threads 20 --turns 15
+    CHECKPOINTER_POSTGRES_URL=postgresql://... python -m benchmarks.checkpointer_latency --backends memory sqlite postgres
+"""
+import os
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+from typing import Annotated, TypedDict
+
+from langgraph.graph import StateGraph, START, END
+from langgraph.graph.message import add_messages
+from langchain_core.messages import AIMessage, HumanMessage
+
+import core.graph.checkpointer as checkpointer_module
+from core.graph.checkpointer import open_checkpointer
+from core.graph.state import _merge_dict
+
+DESCRIPTION = (
+    "Khóa học luyện thi IELTS chuyên sâu 4 kỹ năng, cam kết đầu ra, lớp học tối đa 12 học viên, "
+    "giáo trình Cambridge cập nhật mới nhất."
+)
+
+
+class BenchState(TypedDict):
+    messages: Annotated[list, add_messages]
+    seen_products: Annotated[dict, _merge_dict]
+
+
+def _supervisor(state: BenchState) -> dict:
+    return {"messages": [HumanMessage(content="Cho em xem thêm khóa IELTS")]}
+
+
+def _agent(state: BenchState) -> dict:
+    course_id = len(state["messages"])
+    return {
+        "messages": [AIMessage(content=f"Dạ, đây là khóa học #{course_id}: {DESCRIPTION}", name="course_advisor_agent")],
+        "seen_products": {course_id: {"course_id": course_id, "name": f"IELTS {course_id}", "description": DESCRIPTION}},
+    }
+
+
+def _build(checkpointer):
+    workflow = StateGraph(BenchState)
+    workflow.add_node("supervisor", _supervisor)
+    workflow.add_node("agent", _agent)
+    workflow.add_edge(START, "supervisor")
+    workflow.add_edge("supervisor", "agent")
+    workflow.add_edge("agent", END)
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def _run_thread(graph, turns: int, writes: list, reads: list):
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    for _ in range(turns):
+        started = time.perf_counter()
+        await graph.ainvoke({"messages": [], "seen_products": None}, config=config)
+        writes.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await graph.aget_state(config)
+        reads.append(time.perf_counter() - started)
+
+
+async def _measure(backend: str, threads: int, turns: int) -> dict:
+    writes, reads = [], []
+    async with open_checkpointer(backend) as checkpointer:
+        graph = _build(checkpointer)
+        started = time.perf_counter()
+        await asyncio.gather(*(_run_thread(graph, turns, writes, reads) for _ in range(threads)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "elapsed": elapsed,
+        "turn_p50": _percentile(writes, 0.5),
+        "turn_p95": _percentile(writes, 0.95),
+        "read_p50": _percentile(reads, 0.5),
+        "read_p95": _percentile(reads, 0.95),
+    }
+
+
+async def main(backends: list[str], threads: int, turns: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpointer_module.CHECKPOINTER_SQLITE_PATH = os.path.join(tmp, "bench.sqlite")
+
+        print(f"{'backend':<9} {'tổng (s)':>9} {'lượt p50':>9} {'lượt p95':>9} {'đọc p50':>9} {'đọc p95':>9}  (ms)")
+        for backend in backends:
+            result = await _measure(backend, threads, turns)
+            print(
+                f"{backend:<9} {result['elapsed']:9.2f} "
+                f"{result['turn_p50'] * 1000:9.2f} {result['turn_p95'] * 1000:9.2f} "
+                f"{result['read_p50'] * 1000:9.2f} {result['read_p95'] * 1000:9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"])
+    parser.add_argument("--threads", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=15)
+    args = parser.parse_args()
+    asyncio.run(main(args.backends, args.threads, args.turns))
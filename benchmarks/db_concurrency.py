@@ -0,0 +1,55 @@
+"""
+Kiểm tra các truy vấn Supabase trong services không còn chạy tuần tự trên event loop.
+
+Cần Supabase thật. Bản kiểm tra không cần DB (truy vấn giả chậm sau `run_db`, gọi qua endpoint chat)
+nằm ở `tests/test_db_concurrency.py`.
+
+Chạy:
+    python -m benchmarks.db_concurrency --chat-id <chat_id> --concurrency 20
+"""
+import time
+import asyncio
+import argparse
+
+from services.utils import get_customer
+
+
+async def _loop_lag_probe(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Đo độ trễ lớn nhất của event loop trong lúc chạy truy vấn."""
+    max_lag = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, time.perf_counter() - started - interval)
+    return max_lag
+
+
+async def main(chat_id: str, concurrency: int):
+    # Khởi động pool và kết nối trước khi đo
+    await get_customer(chat_id=chat_id)
+
+    started = time.perf_counter()
+    for _ in range(concurrency):
+        await get_customer(chat_id=chat_id)
+    sequential = time.perf_counter() - started
+
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_loop_lag_probe(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(get_customer(chat_id=chat_id) for _ in range(concurrency)))
+    concurrent = time.perf_counter() - started
+    stop.set()
+    max_lag = await probe
+
+    print(f"{concurrency} truy vấn tuần tự : {sequential * 1000:8.1f} ms")
+    print(f"{concurrency} truy vấn song song: {concurrent * 1000:8.1f} ms")
+    print(f"Tăng tốc                : {sequential / concurrent:8.1f}x")
+    print(f"Độ trễ event loop tối đa: {max_lag * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chat-id", required=True)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.chat_id, args.concurrency))
@@ -0,0 +1,73 @@
+"""
+Đo chi phí import của worker bằng `python -X importtime` và so với ngân sách khởi động.
+
+Chạy:
+    python -m benchmarks.import_profile --module main --top 25 --budget-ms 3000
+
+Thoát với mã 1 nếu tổng thời gian import vượt `--budget-ms` (hoặc biến môi trường
+`IMPORT_BUDGET_MS`), để có thể dùng làm bước kiểm tra trong CI.
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+
+def _profile(module: str) -> tuple[list[tuple[str, int, int]], float]:
+    """
+    Import `module` trong process con với `-X importtime`.
+
+    Returns:
+        tuple[list[tuple[str, int, int]], float]: Danh sách (module, self_us, cumulative_us)
+        và thời gian chạy thực tế của process con (giây).
+    """
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True
+    )
+    elapsed = time.perf_counter() - started
+
+    if proc.returncode != 0:
+        print(proc.stderr.splitlines()[-1] if proc.stderr else "Import thất bại")
+        sys.exit(2)
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+
+    return rows, elapsed
+
+
+def main(module: str, top: int, budget_ms: float):
+    rows, elapsed = _profile(module)
+
+    # Thời gian cộng dồn của chính module cần đo (đã gồm mọi module nó kéo theo)
+    total_us = next((cumulative for name, _, cumulative in rows if name == module), 0)
+    total_ms = total_us / 1000
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {name.strip()}")
+
+    print()
+    print(f"Tổng thời gian import {module}: {total_ms:.1f} ms (process con: {elapsed * 1000:.1f} ms)")
+    print(f"Ngân sách: {budget_ms:.0f} ms")
+
+    if total_ms > budget_ms:
+        print("VƯỢT NGÂN SÁCH")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "3000")))
+    args = parser.parse_args()
+    main(args.module, args.top, args.budget_ms)
@@ -0,0 +1,65 @@
+"""
+So sánh thông lượng của graph khi dùng node đồng bộ (chạy trong thread pool của LangGraph)
+và node bất đồng bộ (`ainvoke` trực tiếp trên event loop) với nhiều phiên chat đồng thời.
+
+Chạy:
+    python -m benchmarks.node_throughput --sessions 50
+"""
+import time
+import uuid
+import asyncio
+import argparse
+
+from core.graph.build_graph import create_main_graph
+from core.graph.state import init_state
+
+
+async def _run_session(graph, user_input: str) -> float:
+    state = init_state()
+    state["user_input"] = user_input
+    state["chat_id"] = f"bench-{uuid.uuid4()}"
+    # student_id khác rỗng để supervisor bỏ qua bước tạo/lấy khách trong DB
+    state["student_id"] = -1
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+
+    started = time.perf_counter()
+    await graph.ainvoke(state, config=config)
+    return time.perf_counter() - started
+
+
+async def _measure(async_nodes: bool, sessions: int, user_input: str) -> dict:
+    graph = create_main_graph(async_nodes=async_nodes)
+
+    # Khởi động kết nối trước khi đo
+    await _run_session(graph, user_input)
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(_run_session(graph, user_input) for _ in range(sessions)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latencies)
+    return {
+        "elapsed": elapsed,
+        "throughput": sessions / elapsed,
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
+
+
+async def main(sessions: int, user_input: str):
+    for async_nodes in (False, True):
+        result = await _measure(async_nodes, sessions, user_input)
+        label = "async" if async_nodes else "sync "
+        print(
+            f"[{label}] {sessions} phiên: {result['elapsed']:6.2f} s | "
+            f"{result['throughput']:6.2f} phiên/s | "
+            f"p50 {result['p50'] * 1000:7.0f} ms | p95 {result['p95'] * 1000:7.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--user-input", default="Trung tâm có những khóa học tiếng Anh nào?")
+    args = parser.parse_args()
+    asyncio.run(main(args.sessions, args.user_input))
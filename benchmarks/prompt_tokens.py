@@ -0,0 +1,99 @@
+"""
+Báo cáo số token của phần system prompt mỗi agent khi chèn trạng thái dạng `repr` (cũ)
+so với dạng rút gọn của `core.utils.prompt_context`.
+
+Chạy:
+    python -m benchmarks.prompt_tokens --courses 5 --order-items 3
+"""
+import argparse
+from datetime import datetime
+
+import tiktoken
+
+from core.utils.prompt_context import render_seen_products, render_cart, render_order
+
+# Các trường trạng thái mà từng agent chèn vào system prompt
+AGENT_CONTEXT = {
+    "supervisor": ("core/prompts/supervisor_prompt.md", ["order", "cart"]),
+    "course_advisor_agent": ("core/prompts/course_advisor_agent_prompt.md", ["seen_products"]),
+    "enrollment_agent": ("core/prompts/enrollment_agent_prompt.md", ["seen_products", "cart"]),
+    "modify_agent": ("core/prompts/modify_agent_prompt.md", ["seen_products", "order"]),
+}
+
+
+def _sample_state(courses: int, order_items: int) -> dict:
+    seen_products = {
+        course_id: {
+            "course_id": course_id,
+            "name": f"IELTS Intensive {course_id}",
+            "description": (
+                "Khóa học luyện thi IELTS chuyên sâu 4 kỹ năng, cam kết đầu ra, "
+                "lớp học tối đa 12 học viên, giáo trình Cambridge cập nhật mới nhất, "
+                "có buổi thi thử hàng tháng và phản hồi chi tiết từ giảng viên."
+            ),
+            "type": "offline",
+            "duration": 12,
+            "price": 6500000,
+            "sessions_per_week": 3,
+            "minutes_per_session": 90,
+            "instructor_name": "Nguyễn Văn A",
+        }
+        for course_id in range(1, courses + 1)
+    }
+    cart = {
+        course_id: {"course_id": course_id, "price": 6500000, "subtotal": 6500000}
+        for course_id in list(seen_products)[:2]
+    }
+    order = {
+        101: {
+            "order_id": 101,
+            "status": "pending",
+            "payment": "bank_transfer",
+            "order_total": 6500000 * order_items,
+            "discount_voucher": 0,
+            "grand_total": 6500000 * order_items,
+            "created_at": datetime(2025, 9, 1, 10, 30),
+            "receiver_name": "Trần Thị B",
+            "receiver_phone_number": "0912345678",
+            "receiver_email": "b@example.com",
+            "items": {
+                item_id: {"item_id": item_id, **seen_products[(item_id - 1) % courses + 1]}
+                for item_id in range(1, order_items + 1)
+            },
+            "admission_day": "2025-09-15",
+        }
+    }
+    return {"seen_products": seen_products, "cart": cart, "order": order}
+
+
+def _render_compact(field: str, state: dict) -> str:
+    if field == "seen_products":
+        return render_seen_products(state["seen_products"])
+    if field == "cart":
+        return render_cart(state["cart"], state["seen_products"])
+    return render_order(state["order"])
+
+
+def main(courses: int, order_items: int, encoding_name: str):
+    encoding = tiktoken.get_encoding(encoding_name)
+    state = _sample_state(courses, order_items)
+
+    print(f"{'agent':<22} {'prompt':>7} {'raw ctx':>8} {'compact':>8} {'giảm':>7}")
+    for agent, (prompt_path, fields) in AGENT_CONTEXT.items():
+        with open(prompt_path, "r", encoding="utf-8") as f:
+            prompt_tokens = len(encoding.encode(f.read()))
+
+        raw = sum(len(encoding.encode(str(state[field]))) for field in fields)
+        compact = sum(len(encoding.encode(_render_compact(field, state))) for field in fields)
+        reduction = 1 - compact / raw if raw else 0.0
+
+        print(f"{agent:<22} {prompt_tokens:7d} {raw:8d} {compact:8d} {reduction:7.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses", type=int, default=5)
+    parser.add_argument("--order-items", type=int, default=3)
+    parser.add_argument("--encoding", default="o200k_base")
+    args = parser.parse_args()
+    main(args.courses, args.order_items, args.encoding)
@@ -0,0 +1,114 @@
+"""
+So sánh số byte mỗi checkpoint khi `seen_products` lưu bản ghi khóa học đầy đủ (cũ) và khi chỉ
+lưu tham chiếu `course_id` + `version` tới `course_catalog` (mới).
+
+Graph giả lập hai bước mỗi lượt (supervisor -> agent), agent thêm một khóa học vào `seen_products`
+mỗi lượt; dung lượng đo bằng `MeteredMemorySaver` (checkpoint, metadata, blob kênh, pending writes),
+không cắt lịch sử checkpoint.
+
+Chạy:
+    python -m benchmarks.seen_products_checkpoint --threads 20 --turns 15
+"""
+import uuid
+import asyncio
+import argparse
+from typing import Annotated, TypedDict
+
+from langgraph.graph import StateGraph, START, END
+from langgraph.graph.message import add_messages
+from langchain_core.messages import AIMessage, HumanMessage
+
+from core.graph.checkpointer import MeteredMemorySaver
+from core.graph.state import _merge_dict
+from core.utils.course_catalog import course_catalog, _to_record
+
+DESCRIPTION = (
+    "Khóa học luyện thi IELTS chuyên sâu 4 kỹ năng, cam kết đầu ra, lớp học tối đa 12 học viên, "
+    "giáo trình Cambridge cập nhật mới nhất, có buổi thi thử hàng tháng và phản hồi chi tiết từ giảng viên."
+)
+
+
+class BenchState(TypedDict):
+    messages: Annotated[list, add_messages]
+    seen_products: Annotated[dict, _merge_dict]
+
+
+def _course(course_id: int) -> dict:
+    return {
+        "course_id": course_id,
+        "name": f"IELTS Intensive {course_id}",
+        "description": DESCRIPTION,
+        "type": "offline",
+        "duration": 12,
+        "price": 6500000,
+        "sessions_per_week": 3,
+        "minutes_per_session": 90,
+        "instructor_name": "Nguyễn Văn A",
+    }
+
+
+def _build(checkpointer: MeteredMemorySaver, references: bool):
+    def supervisor(state: BenchState) -> dict:
+        return {"messages": [HumanMessage(content="Cho em xem thêm khóa IELTS")]}
+
+    def agent(state: BenchState) -> dict:
+        course_id = len(state["messages"])
+        course = _course(course_id)
+        seen_products = course_catalog.remember([course]) if references else {course_id: _to_record(course)}
+        return {
+            "messages": [AIMessage(content=f"Dạ, đây là khóa học #{course_id}", name="course_advisor_agent")],
+            "seen_products": seen_products,
+        }
+
+    workflow = StateGraph(BenchState)
+    workflow.add_node("supervisor", supervisor)
+    workflow.add_node("agent", agent)
+    workflow.add_edge(START, "supervisor")
+    workflow.add_edge("supervisor", "agent")
+    workflow.add_edge("agent", END)
+    return workflow.compile(checkpointer=checkpointer)
+
+
+async def _run_thread(graph, turns: int):
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    for _ in range(turns):
+        await graph.ainvoke({"messages": [], "seen_products": None}, config=config)
+
+
+async def _measure(references: bool, threads: int, turns: int) -> dict:
+    checkpointer = MeteredMemorySaver()
+    graph = _build(checkpointer, references)
+    await asyncio.gather(*(_run_thread(graph, turns) for _ in range(threads)))
+
+    checkpoints = sum(
+        len(checkpoint_ids)
+        for namespaces in checkpointer.storage.values()
+        for checkpoint_ids in namespaces.values()
+    )
+    return {
+        "total": checkpointer.total_bytes,
+        "checkpoints": checkpoints,
+        "per_checkpoint": checkpointer.total_bytes / checkpoints if checkpoints else 0,
+    }
+
+
+async def main(threads: int, turns: int):
+    before = await _measure(False, threads, turns)
+    after = await _measure(True, threads, turns)
+
+    print(f"{'seen_products':<14} {'checkpoint':>11} {'tổng (KB)':>10} {'byte/checkpoint':>16}")
+    for label, result in (("bản ghi (cũ)", before), ("tham chiếu", after)):
+        print(
+            f"{label:<14} {result['checkpoints']:>11} {result['total'] / 1024:10.1f} "
+            f"{result['per_checkpoint']:16.0f}"
+        )
+    if before["per_checkpoint"]:
+        print(f"Giảm {1 - after['per_checkpoint'] / before['per_checkpoint']:.0%} byte mỗi checkpoint")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=15)
+    args = parser.parse_args()
+    asyncio.run(main(args.threads, args.turns))
@@ -0,0 +1,79 @@
+"""
+Đo chi phí một lượt dọn state hết hạn theo số thread đang theo dõi: cách cũ duyệt toàn bộ
+`thread_timestamps` so với `ExpiryIndex` (min-heap, xóa lười) của `StateCleanupManager`.
+
+Mỗi lượt dọn có `--expire-ratio` số thread hết hạn; trước mỗi lượt một phần thread được truy cập
+lại (`--touch-ratio`) để heap có mục cũ cần bỏ qua. Chỉ đo phần tìm thread hết hạn, không đo xóa.
+
+Chạy:
+    python -m benchmarks.state_expiry_tick --sizes 10000 100000 1000000
+"""
+import time
+import random
+import argparse
+import statistics
+
+from state_management.state_cleanup_manager import ExpiryIndex
+
+
+def _walk_tick(thread_timestamps: dict, cutoff: float) -> list[str]:
+    # Cách cũ: duyệt mọi thread ở mỗi lượt
+    expired = [thread_id for thread_id, timestamp in thread_timestamps.items() if timestamp <= cutoff]
+    for thread_id in expired:
+        del thread_timestamps[thread_id]
+    return expired
+
+
+def _measure(size: int, ticks: int, expire_ratio: float, touch_ratio: float) -> dict:
+    rng = random.Random(0)
+    thread_ids = [f"thread-{i}" for i in range(size)]
+    thread_timestamps = {thread_id: float(i) for i, thread_id in enumerate(thread_ids)}
+    index = ExpiryIndex()
+    for thread_id, timestamp in thread_timestamps.items():
+        index.touch(thread_id, timestamp)
+
+    walk, heap = [], []
+    now = float(size)
+    step = max(1, int(size * expire_ratio))
+    for tick in range(ticks):
+        # Một phần thread còn sống quay lại chat: cập nhật cả hai cấu trúc
+        alive = list(index.last_access)
+        for thread_id in rng.sample(alive, min(len(alive), int(size * touch_ratio))):
+            now += 1
+            thread_timestamps[thread_id] = now
+            index.touch(thread_id, now)
+
+        cutoff = float((tick + 1) * step)
+
+        started = time.perf_counter()
+        walk_expired = _walk_tick(thread_timestamps, cutoff)
+        walk.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        heap_expired = index.pop_expired(cutoff)
+        heap.append(time.perf_counter() - started)
+
+        assert sorted(walk_expired) == sorted(heap_expired)
+
+    return {"walk": statistics.median(walk), "heap": statistics.median(heap), "expired": step}
+
+
+def main(sizes: list[int], ticks: int, expire_ratio: float, touch_ratio: float):
+    print(f"{'threads':>9} {'hết hạn/lượt':>13} {'duyệt (ms)':>11} {'heap (ms)':>10} {'nhanh hơn':>10}")
+    for size in sizes:
+        result = _measure(size, ticks, expire_ratio, touch_ratio)
+        speedup = result["walk"] / result["heap"] if result["heap"] else float("inf")
+        print(
+            f"{size:>9} {result['expired']:>13} "
+            f"{result['walk'] * 1000:11.3f} {result['heap'] * 1000:10.3f} {speedup:9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--ticks", type=int, default=5)
+    parser.add_argument("--expire-ratio", type=float, default=0.001)
+    parser.add_argument("--touch-ratio", type=float, default=0.01)
+    args = parser.parse_args()
+    main(args.sizes, args.ticks, args.expire_ratio, args.touch_ratio)
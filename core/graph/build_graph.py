@@ -1,6 +1,7 @@
 # Thêm import cho END từ langgraph.graph
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
+from typing import Optional
+from langgraph.checkpoint.base import BaseCheckpointSaver
 
 from core.graph.state import AgentState
 from core.graph.supervisor import Supervisor
@@ -9,42 +10,80 @@ from core.graph.enrollment_agent import EnrollmentAgent
 from core.graph.course_advisor_agent import CourseAdvisorAgent
 from core.graph.modify_agent import ModifyAgent
 from core.graph.escalation_agent import EscalationAgent
+from core.graph.history_manager import HistoryManager
+from core.graph.speculation import SpeculativeSupervisor, SPECULATIVE_ROUTING
+from core.graph.checkpointer import MeteredMemorySaver
 
-def create_main_graph() -> StateGraph:
+from log.logger_config import setup_logging
+
+logger = setup_logging(__name__)
+
+def create_main_graph(
+    async_nodes: bool = True,
+    speculative: bool = SPECULATIVE_ROUTING,
+    checkpointer: Optional[BaseCheckpointSaver] = None
+) -> StateGraph:
+    """
+    Xây dựng graph chính.
+
+    Args:
+        async_nodes (bool): True để dùng các node bất đồng bộ (`ainvoke`) cho `astream`/`ainvoke`;
+            False để dùng các node đồng bộ (cho `invoke`/`stream` như trong `test.py`).
+        speculative (bool): Chạy trước agent chuyên trách dự đoán song song với Supervisor
+            (xem `SpeculativeSupervisor`); chỉ áp dụng cho node bất đồng bộ.
+        checkpointer (Optional[BaseCheckpointSaver]): Checkpointer từ `open_checkpointer`;
+            mặc định `MeteredMemorySaver`.
+
+    Returns:
+        StateGraph: Graph đã compile kèm checkpointer.
+    """
     # Khởi tạo các agent
     course_advisor_agent = CourseAdvisorAgent()
     enrollment_agent = EnrollmentAgent()
     modify_agent = ModifyAgent()
     supervisor_chain = Supervisor()
     escalation_agent = EscalationAgent()
+    history_manager = HistoryManager()
+    
+    if async_nodes:
+        nodes = {
+            "history_manager": history_manager.acompact_node,
+            "supervisor": supervisor_chain.asupervisor_node,
+            "course_advisor_agent": course_advisor_agent.acourse_advisor_agent_node,
+            "enrollment_agent": enrollment_agent.aenrollment_agent_node,
+            "modify_agent": modify_agent.amodify_agent_node,
+            "escalation_agent": escalation_agent.aescalate_node,
+        }
+        if speculative:
+            speculative_supervisor = SpeculativeSupervisor(
+                supervisor_chain,
+                {
+                    "course_advisor_agent": course_advisor_agent,
+                    "enrollment_agent": enrollment_agent,
+                    "modify_agent": modify_agent,
+                }
+            )
+            nodes["supervisor"] = speculative_supervisor.asupervisor_node
+    else:
+        nodes = {
+            "history_manager": history_manager.compact_node,
+            "supervisor": supervisor_chain.supervisor_node,
+            "course_advisor_agent": course_advisor_agent.course_advisor_agent_node,
+            "enrollment_agent": enrollment_agent.enrollment_agent_node,
+            "modify_agent": modify_agent.modify_agent_node,
+            "escalation_agent": escalation_agent.escalate_node,
+        }
+        if speculative:
+            logger.warning("Chế độ chạy trước chỉ hỗ trợ node bất đồng bộ, bỏ qua")
     
     # Xây dựng graph
     workflow = StateGraph(AgentState)
-    workflow.add_node(
-        "supervisor", 
-        supervisor_chain.supervisor_node,
-    )
-    
-    workflow.add_node(
-        "course_advisor_agent", 
-        # Sửa lại tên hàm cho nhất quán
-        course_advisor_agent.course_advisor_agent_node, 
-    )
-    workflow.add_node(
-        "enrollment_agent", 
-        # Sửa lại tên hàm cho nhất quán
-        enrollment_agent.enrollment_agent_node,
-    )
-    workflow.add_node(
-        "modify_agent", 
-        modify_agent.modify_agent_node,
-    )
-    workflow.add_node(
-        "escalation_agent", 
-        escalation_agent.escalate_node
-    )
+    for name, node in nodes.items():
+        workflow.add_node(name, node)
     
-    workflow.set_entry_point("supervisor")
+    # Gộp lịch sử cũ vào bản tóm tắt trước khi Supervisor phân luồng
+    workflow.set_entry_point("history_manager")
+    workflow.add_edge("history_manager", "supervisor")
 
     # --- BẮT ĐẦU PHẦN THÊM MỚI ---
     
@@ -82,7 +121,6 @@ def create_main_graph() -> StateGraph:
 
     # --- KẾT THÚC PHẦN THÊM MỚI ---
 
-    memory = MemorySaver()
-    graph = workflow.compile(checkpointer=memory)
+    graph = workflow.compile(checkpointer=checkpointer or MeteredMemorySaver())
     
     return graph
\ No newline at end of file
@@ -0,0 +1,235 @@
+"""
+Chọn checkpointer của graph theo `CHECKPOINTER_BACKEND`:
+- "memory": `MemorySaver` trong process (mất khi restart, chỉ dùng được với 1 worker).
+- "sqlite": `AsyncSqliteSaver` trên một file (một node, test).
+- "postgres": `AsyncPostgresSaver` với pool kết nối psycopg (production, nhiều worker).
+
+Checkpoint được serialize bằng `JsonPlusSerializer` mặc định của LangGraph (msgpack nhị phân).
+Bảng của SQLite/Postgres có khóa chính bắt đầu bằng `thread_id`; Postgres tạo thêm index
+`thread_id` cho các bảng blob/writes trong `setup()`.
+
+Backend "memory" dùng `MeteredMemorySaver` để biết mỗi thread đang giữ bao nhiêu byte, phục vụ
+giới hạn bộ nhớ của `StateCleanupManager`, và để cắt bớt lịch sử checkpoint cũ của từng thread
+(chỉ giữ `CHECKPOINT_KEEP_LAST` checkpoint mới nhất).
+"""
+import os
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Any
+from dotenv import load_dotenv
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver, Checkpoint, CheckpointMetadata, ChannelVersions
+from langgraph.checkpoint.memory import MemorySaver
+
+from log.logger_config import setup_logging
+
+load_dotenv()
+
+logger = setup_logging(__name__)
+
+CHECKPOINTER_BACKEND = os.getenv("CHECKPOINTER_BACKEND", "memory")
+CHECKPOINTER_SQLITE_PATH = os.getenv("CHECKPOINTER_SQLITE_PATH", "data/checkpoints.sqlite")
+CHECKPOINTER_POSTGRES_URL = os.getenv("CHECKPOINTER_POSTGRES_URL")
+CHECKPOINTER_POOL_SIZE = int(os.getenv("CHECKPOINTER_POOL_SIZE", "10"))
+# Số checkpoint mới nhất giữ lại mỗi thread (1 = chỉ checkpoint hiện tại + pending writes, 0 = giữ tất cả)
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "2"))
+
+
+class MeteredMemorySaver(MemorySaver):
+    """
+    `MemorySaver` đếm số byte đã serialize (checkpoint, metadata, blob kênh, pending writes)
+    của từng thread. Số đếm là ước tính cộng dồn, không quét lại `storage`.
+
+    Các thread có checkpoint mới từ lần nén trước được đánh dấu để `prune_thread` chỉ phải
+    xử lý thread vừa hoạt động.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._bytes_lock = threading.Lock()
+        self._thread_bytes: dict[str, int] = {}
+        self._blob_keys: dict[str, set[tuple]] = {}
+        self._dirty_threads: set[str] = set()
+
+    def _add_bytes(self, thread_id: str, size: int):
+        with self._bytes_lock:
+            self._thread_bytes[thread_id] = max(0, self._thread_bytes.get(thread_id, 0) + size)
+
+    def _writes_size(self, key: tuple) -> int:
+        return sum(len(write[2][1]) for write in self.writes.get(key, {}).values())
+
+    def thread_bytes(self, thread_id: str) -> int:
+        """Số byte đang giữ cho `thread_id`."""
+        return self._thread_bytes.get(thread_id, 0)
+
+    @property
+    def total_bytes(self) -> int:
+        """Tổng số byte đang giữ của mọi thread."""
+        with self._bytes_lock:
+            return sum(self._thread_bytes.values())
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions
+    ) -> RunnableConfig:
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+
+        thread_id = next_config["configurable"]["thread_id"]
+        checkpoint_ns = next_config["configurable"]["checkpoint_ns"]
+        saved, saved_metadata, _ = self.storage[thread_id][checkpoint_ns][next_config["configurable"]["checkpoint_id"]]
+        size = len(saved[1]) + len(saved_metadata[1])
+        blob_keys = self._blob_keys.setdefault(thread_id, set())
+        for channel, version in new_versions.items():
+            key = (thread_id, checkpoint_ns, channel, version)
+            blob = self.blobs.get(key)
+            if blob:
+                size += len(blob[1])
+                blob_keys.add(key)
+        self._add_bytes(thread_id, size)
+        self._dirty_threads.add(thread_id)
+        return next_config
+
+    def put_writes(self, config: RunnableConfig, writes: Any, task_id: str, task_path: str = "") -> None:
+        configurable = config["configurable"]
+        key = (configurable["thread_id"], configurable.get("checkpoint_ns", ""), configurable["checkpoint_id"])
+        before = self._writes_size(key)
+        super().put_writes(config, writes, task_id, task_path)
+        self._add_bytes(configurable["thread_id"], self._writes_size(key) - before)
+
+    def delete_thread(self, thread_id: str) -> None:
+        # `MemorySaver.delete_thread` quét toàn bộ `writes`/`blobs` của mọi thread; ở đây chỉ xóa
+        # đúng các khóa của thread nhờ `storage` và chỉ mục blob theo thread
+        for checkpoint_ns, checkpoints in self.storage.pop(thread_id, {}).items():
+            for checkpoint_id in checkpoints:
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        for key in self._blob_keys.pop(thread_id, ()):
+            self.blobs.pop(key, None)
+        with self._bytes_lock:
+            self._thread_bytes.pop(thread_id, None)
+        self._dirty_threads.discard(thread_id)
+
+    def take_dirty_threads(self) -> list[str]:
+        """Lấy và xóa danh sách thread có checkpoint mới kể từ lần gọi trước."""
+        dirty, self._dirty_threads = self._dirty_threads, set()
+        return list(dirty)
+
+    def prune_thread(self, thread_id: str, keep_last: int = CHECKPOINT_KEEP_LAST) -> int:
+        """
+        Xóa checkpoint cũ của `thread_id`, chỉ giữ `keep_last` checkpoint mới nhất ở mỗi namespace
+        cùng pending writes của chúng. Namespace của subgraph (agent ReAct) mà checkpoint mới nhất
+        cũ hơn mọi checkpoint gốc được giữ thì bị xóa hẳn. Blob kênh không còn checkpoint nào
+        tham chiếu cũng bị xóa, nên `get_state` (checkpoint mới nhất) vẫn đầy đủ.
+
+        Args:
+            thread_id (str): Thread cần nén.
+            keep_last (int): Số checkpoint giữ lại (tối thiểu 1).
+
+        Returns:
+            int: Số byte đã giải phóng.
+        """
+        namespaces = self.storage.get(thread_id)
+        if not namespaces or keep_last < 1:
+            return 0
+
+        # checkpoint_id là uuid6 nên sắp xếp theo chuỗi cũng là theo thời gian
+        root_ids = sorted(namespaces.get("", {}), reverse=True)[:keep_last]
+        oldest_kept = root_ids[-1] if root_ids else None
+
+        reclaimed = 0
+        referenced: set[tuple] = set()
+        for checkpoint_ns in list(namespaces):
+            checkpoints = namespaces[checkpoint_ns]
+            ids = sorted(checkpoints, reverse=True)
+            if checkpoint_ns and oldest_kept and ids and ids[0] < oldest_kept:
+                dropped = ids
+            else:
+                dropped = ids[keep_last:]
+
+            for checkpoint_id in dropped:
+                saved, saved_metadata, _ = checkpoints.pop(checkpoint_id)
+                reclaimed += len(saved[1]) + len(saved_metadata[1])
+                reclaimed += self._writes_size((thread_id, checkpoint_ns, checkpoint_id))
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+            for saved, _, _ in checkpoints.values():
+                versions = self.serde.loads_typed(saved)["channel_versions"]
+                referenced.update((thread_id, checkpoint_ns, channel, version) for channel, version in versions.items())
+
+            if not checkpoints:
+                del namespaces[checkpoint_ns]
+
+        blob_keys = self._blob_keys.get(thread_id, set())
+        for key in blob_keys - referenced:
+            blob = self.blobs.pop(key, None)
+            if blob:
+                reclaimed += len(blob[1])
+        blob_keys &= referenced
+
+        self._add_bytes(thread_id, -reclaimed)
+        return reclaimed
+
+
+@asynccontextmanager
+async def _sqlite_checkpointer(path: str) -> AsyncIterator[BaseCheckpointSaver]:
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    async with aiosqlite.connect(path) as conn:
+        # WAL: đọc không chặn ghi; NORMAL đủ an toàn với WAL và giảm fsync mỗi checkpoint
+        await conn.execute("PRAGMA journal_mode=WAL")
+        await conn.execute("PRAGMA synchronous=NORMAL")
+        saver = AsyncSqliteSaver(conn)
+        await saver.setup()
+        yield saver
+
+
+@asynccontextmanager
+async def _postgres_checkpointer(url: str, pool_size: int) -> AsyncIterator[BaseCheckpointSaver]:
+    from psycopg.rows import dict_row
+    from psycopg_pool import AsyncConnectionPool
+    from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+
+    async with AsyncConnectionPool(
+        conninfo=url,
+        min_size=1,
+        max_size=pool_size,
+        open=False,
+        kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row}
+    ) as pool:
+        saver = AsyncPostgresSaver(pool)
+        await saver.setup()
+        yield saver
+
+
+@asynccontextmanager
+async def open_checkpointer(backend: str = CHECKPOINTER_BACKEND) -> AsyncIterator[BaseCheckpointSaver]:
+    """
+    Mở checkpointer theo `backend` và đóng kết nối khi thoát, dùng trong lifespan của app.
+    Các backend bền vững chỉ hỗ trợ API bất đồng bộ (`ainvoke`/`astream`).
+
+    Args:
+        backend (str): "memory", "sqlite" hoặc "postgres".
+
+    Yields:
+        BaseCheckpointSaver: Checkpointer truyền vào `create_main_graph`.
+    """
+    if backend == "memory":
+        yield MeteredMemorySaver()
+    elif backend == "sqlite":
+        async with _sqlite_checkpointer(CHECKPOINTER_SQLITE_PATH) as saver:
+            logger.info(f"Dùng checkpointer SQLite tại {CHECKPOINTER_SQLITE_PATH}")
+            yield saver
+    elif backend == "postgres":
+        if not CHECKPOINTER_POSTGRES_URL:
+            raise ValueError("CHECKPOINTER_POSTGRES_URL must be set when CHECKPOINTER_BACKEND=postgres.")
+        async with _postgres_checkpointer(CHECKPOINTER_POSTGRES_URL, CHECKPOINTER_POOL_SIZE) as saver:
+            logger.info(f"Dùng checkpointer Postgres (pool tối đa {CHECKPOINTER_POOL_SIZE} kết nối)")
+            yield saver
+    else:
+        raise ValueError(f"Unknown CHECKPOINTER_BACKEND: {backend}")
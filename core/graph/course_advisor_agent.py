@@ -4,8 +4,11 @@ from langchain_core.messages import AIMessage
 from langgraph.prebuilt import create_react_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
-from core.tools import course_toolbox
-from database.connection import specialist_llm 
+from core.tools import course_toolbox, toolbox_for
+from core.utils.tool_function import direct_reply, needs_llm_reply
+from database.model_router import model_router
+from core.graph.history_manager import token_budget_hook
+from core.utils.prompt_context import compact_context
 
 from log.logger_config import setup_logging
 
@@ -27,13 +30,31 @@ class CourseAdvisorAgent:
             MessagesPlaceholder(variable_name="messages")
         ])
         
+        tools = toolbox_for("course_advisor_agent", course_toolbox)
         self.agent = create_react_agent(
-            model=specialist_llm,
-            tools=course_toolbox,
-            prompt=self.prompt,
+            model=model_router.for_agent("course_advice", tools),
+            tools=tools,
+            prompt=compact_context | self.prompt,
+            pre_model_hook=token_budget_hook("course_advisor_agent"),
             state_schema=AgentState
         )
 
+    def _to_command(self, result: dict) -> Command:
+        content = direct_reply(result["messages"]) or result["messages"][-1].content
+        
+        update = {
+            "messages": [AIMessage(content=content, name="course_advisor_agent")],
+            "next": "__end__"
+        }
+        
+        if result.get("seen_products", None) is not None:
+                update["seen_products"] = result["seen_products"]
+                        
+        return Command(
+            update=update,
+            goto="__end__"
+        )
+
     def course_advisor_agent_node(self, state: AgentState) -> Command:
         """
         Xử lý các yêu cầu liên quan đến khóa học bằng công cụ `course_toolbox`.
@@ -46,21 +67,24 @@ class CourseAdvisorAgent:
         """
         try:
             result = self.agent.invoke(state)
-            content = result["messages"][-1].content
-            
-            update = {
-                "messages": [AIMessage(content=content, name="course_advisor_agent")],
-                "next": "__end__"
-            }
+            if needs_llm_reply(result):
+                result = self.agent.invoke(result)
+            return self._to_command(result)
             
-            if result.get("seen_products", None) is not None:
-                    update["seen_products"] = result["seen_products"]
-                            
-            return Command(
-                update=update,
-                goto="__end__"
-            )
+        except Exception as e:
+            logger.error(f"Lỗi: {e}")
+            raise
+
+    async def acourse_advisor_agent_node(self, state: AgentState) -> Command:
+        """
+        Phiên bản bất đồng bộ của `course_advisor_agent_node`, dùng `ainvoke`.
+        """
+        try:
+            result = await self.agent.ainvoke(state)
+            if needs_llm_reply(result):
+                result = await self.agent.ainvoke(result)
+            return self._to_command(result)
             
         except Exception as e:
             logger.error(f"Lỗi: {e}")
-            raise
\ No newline at end of file
+            raise
@@ -3,9 +3,12 @@ from langgraph.prebuilt import create_react_agent
 from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
-from core.tools import enrollment_toolbox
+from core.tools import enrollment_toolbox, toolbox_for
+from core.utils.tool_function import direct_reply, needs_llm_reply
 from core.graph.state import AgentState
-from database.connection import specialist_llm
+from database.model_router import model_router
+from core.graph.history_manager import token_budget_hook
+from core.utils.prompt_context import compact_context
 
 from log.logger_config import setup_logging
 
@@ -32,13 +35,35 @@ class EnrollmentAgent:
             MessagesPlaceholder(variable_name="messages")
         ])
         
+        tools = toolbox_for("enrollment_agent", enrollment_toolbox)
         self.agent = create_react_agent(
-            model=specialist_llm,
-            tools=enrollment_toolbox,
-            prompt=self.prompt,
+            model=model_router.for_agent("enrollment", tools),
+            tools=tools,
+            prompt=compact_context | self.prompt,
+            pre_model_hook=token_budget_hook("enrollment_agent"),
             state_schema=AgentState
         )
     
+    def _to_command(self, result: dict) -> Command:
+        content = direct_reply(result["messages"]) or result["messages"][-1].content
+        
+        update = {
+            "messages": [AIMessage(content=content, name="enrollment_agent")],
+            "next": "__end__"
+        }
+        
+        for key in ([
+            "student_id", "name", "phone_number", "email", 
+            "payment", "seen_products", "cart", "order"
+        ]):
+            if result.get(key, None) is not None:
+                update[key] = result[key]
+        
+        return Command(
+            update=update,
+            goto="__end__"
+        )
+    
     def enrollment_agent_node(self, state: AgentState) -> Command:
         """
         Xử lý các yêu cầu liên quan đến đơn hàng (lên đơn, ....) bằng `enrollment_toolbox`.
@@ -51,25 +76,24 @@ class EnrollmentAgent:
         """
         try:
             result = self.agent.invoke(state)
-            content = result["messages"][-1].content
-            
-            update = {
-                "messages": [AIMessage(content=content, name="enrollment_agent")],
-                "next": "__end__"
-            }
-            
-            for key in ([
-                "student_id", "name", "phone_number", "email", 
-                "payment", "seen_products", "cart", "order"
-            ]):
-                if result.get(key, None) is not None:
-                    update[key] = result[key]
+            if needs_llm_reply(result):
+                result = self.agent.invoke(result)
+            return self._to_command(result)
             
-            return Command(
-                update=update,
-                goto="__end__"
-            )
+        except Exception as e:
+            logger.error(f"Lỗi: {e}")
+            raise
+
+    async def aenrollment_agent_node(self, state: AgentState) -> Command:
+        """
+        Phiên bản bất đồng bộ của `enrollment_agent_node`, dùng `ainvoke`.
+        """
+        try:
+            result = await self.agent.ainvoke(state)
+            if needs_llm_reply(result):
+                result = await self.agent.ainvoke(result)
+            return self._to_command(result)
             
         except Exception as e:
             logger.error(f"Lỗi: {e}")
-            raise
\ No newline at end of file
+            raise
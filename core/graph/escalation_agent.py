@@ -6,14 +6,16 @@ from core.tools.notification_tool import send_cskh_notification_tool
 from core.utils.save_complaint import save_complaint_to_db 
 from core.tools.email_tool import send_escalation_email_tool
 from connection.google_connect import SheetLogger
-from database.connection import summarization_llm
+from database.lazy_client import LazyClient
+from database.model_router import model_router
 from langchain_core.messages import AIMessage, SystemMessage, HumanMessage
 import os
+import asyncio
 from dotenv import load_dotenv
 import logging
 load_dotenv()
-# Khởi tạo logger cho Google Sheets
-sheet_logger = SheetLogger()
+# Logger cho Google Sheets, chỉ kết nối ở lần ghi đầu tiên
+sheet_logger = LazyClient(SheetLogger)
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -30,9 +32,7 @@ def _get_chat_histories(chat_histories: list) -> list:
     return formatted_histories
 
 class EscalationAgent:
-    def escalate_node(self, state: AgentState) -> Command:
-        customer_name = state.get("name")
-        customer_phone = state.get("phone_number")
+    def _summary_prompt(self, state: AgentState) -> list:
         user_input = state.get("user_input")
         chat_history = state.get("messages", [])
         
@@ -40,12 +40,18 @@ class EscalationAgent:
         history_str = "\n".join([f"{msg.type}: {msg.content}" for msg in chat_history])
 
         # 2. Tạo prompt và gọi LLM tóm tắt
-        prompt = [
+        return [
             SystemMessage(content="You are an expert in customer support. Summarize the following conversation into a professional and concise issue summary in Vietnamese. Focus on the main problem and the customer's request."),
             HumanMessage(content=f"Here is the conversation history:\n{history_str}\n\nLast user message: {user_input}")
         ]
-        summary_response = summarization_llm.invoke(prompt)
-        issue_summary = summary_response.content
+
+    def _record_and_notify(self, state: AgentState, issue_summary: str):
+        """
+        Lưu khiếu nại, ghi Google Sheet và gửi thông báo CSKH (các lời gọi I/O đồng bộ).
+        """
+        customer_name = state.get("name")
+        customer_phone = state.get("phone_number")
+        user_input = state.get("user_input")
         
         # 1. Lưu lại toàn bộ thông tin cuộc trò chuyện
         save_complaint_to_db(state)
@@ -91,7 +97,11 @@ class EscalationAgent:
         #     })
         # else:
         #     logger.warning("RECIPIENT_EMAIL chưa được cấu hình, bỏ qua bước gửi mail.")
-        # # 4. Tạo phản hồi cho khách hàng
+
+    def _reply(self, state: AgentState) -> Command:
+        user_input = state.get("user_input")
+        
+        # 4. Tạo phản hồi cho khách hàng
         if "công ty" in user_input.lower() or "doanh nghiệp" in user_input.lower():
              response_message = "Dạ cảm ơn anh/chị. Với nhu cầu đào tạo cho doanh nghiệp, em đã chuyển yêu cầu của anh/chị đến bộ phận chuyên trách. Chuyên viên sẽ liên hệ với mình trong vòng 30 phút nữa ạ."
         else:
@@ -103,4 +113,20 @@ class EscalationAgent:
                 "next": "__end__" 
             },
             goto="__end__"
-        )
\ No newline at end of file
+        )
+
+    def escalate_node(self, state: AgentState) -> Command:
+        summary_response = model_router.select("summarization").invoke(self._summary_prompt(state))
+        self._record_and_notify(state, summary_response.content)
+        
+        return self._reply(state)
+
+    async def aescalate_node(self, state: AgentState) -> Command:
+        """
+        Phiên bản bất đồng bộ của `escalate_node`: tóm tắt bằng `ainvoke`, các bước
+        lưu DB / Google Sheet / thông báo chạy trong thread riêng để không chặn event loop.
+        """
+        summary_response = await model_router.select("summarization").ainvoke(self._summary_prompt(state))
+        await asyncio.to_thread(self._record_and_notify, state, summary_response.content)
+        
+        return self._reply(state)
\ No newline at end of file
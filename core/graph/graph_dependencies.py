@@ -1,5 +1,73 @@
+import time
+import threading
+import tracemalloc
+from typing import Optional
+
 from fastapi import Request
 from langgraph.graph import StateGraph
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+from core.graph.build_graph import create_main_graph
+from state_management.state_cleanup_manager import StateCleanupManager
+from log.logger_config import setup_logging
+
+logger = setup_logging(__name__)
+
+# Graph dùng chung cho toàn bộ process (v1, v2, v3 cùng một checkpointer)
+_graph: Optional[StateGraph] = None
+_graph_lock = threading.Lock()
+graph_build_stats: dict = {}
+
+
+def init_graph(checkpointer: Optional[BaseCheckpointSaver] = None) -> StateGraph:
+    """
+    Khởi tạo graph chính đúng một lần cho mỗi process và ghi lại chi phí khởi động.
+    Graph được gắn `cleanup_manager` để dọn state theo TTL/LRU (task nền khởi động trong lifespan).
+
+    Args:
+        checkpointer (Optional[BaseCheckpointSaver]): Checkpointer đã mở trong lifespan.
+
+    Returns:
+        StateGraph: Graph đã compile, dùng chung cho mọi router.
+    """
+    global _graph
+
+    with _graph_lock:
+        if _graph is not None:
+            return _graph
+
+        # Chỉ bật tracemalloc nếu chưa có ai bật trước đó
+        own_tracing = not tracemalloc.is_tracing()
+        if own_tracing:
+            tracemalloc.start()
+        mem_before, _ = tracemalloc.get_traced_memory()
+        started = time.perf_counter()
+
+        _graph = create_main_graph(checkpointer=checkpointer)
+        _graph.cleanup_manager = StateCleanupManager(_graph)
+
+        build_seconds = time.perf_counter() - started
+        mem_after, mem_peak = tracemalloc.get_traced_memory()
+        if own_tracing:
+            tracemalloc.stop()
+
+        graph_build_stats.update({
+            "build_seconds": round(build_seconds, 3),
+            "memory_mb": round((mem_after - mem_before) / 1024 / 1024, 2),
+            "peak_memory_mb": round((mem_peak - mem_before) / 1024 / 1024, 2),
+        })
+        logger.info(
+            "Khởi tạo graph dùng chung: "
+            f"{graph_build_stats['build_seconds']}s | "
+            f"bộ nhớ {graph_build_stats['memory_mb']} MB "
+            f"(đỉnh {graph_build_stats['peak_memory_mb']} MB)"
+        )
+
+        return _graph
+
 
 def get_graph(request: Request) -> StateGraph:
-    return request.app.state.graph
\ No newline at end of file
+    """
+    Dependency của FastAPI trả về graph đã được khởi tạo trong lifespan.
+    """
+    return request.app.state.graph
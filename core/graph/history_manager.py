@@ -0,0 +1,291 @@
+import os
+import time
+from typing import Callable, Optional
+from dotenv import load_dotenv
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+    ToolMessage,
+    trim_messages
+)
+from langchain_core.messages.utils import count_tokens_approximately
+
+from core.graph.state import AgentState
+from core.utils.metrics import metrics
+from database.model_router import model_router
+
+from log.logger_config import setup_logging
+
+load_dotenv()
+
+logger = setup_logging(__name__)
+
+# Số lượt (bắt đầu bằng tin nhắn của khách) gần nhất được giữ nguyên văn
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "6"))
+# Chỉ tóm tắt khi số lượt vượt ngưỡng này, để không gọi LLM tóm tắt ở mọi lượt
+HISTORY_SUMMARY_TRIGGER_TURNS = int(os.getenv("HISTORY_SUMMARY_TRIGGER_TURNS", "10"))
+# Ngân sách token cho lịch sử đưa vào từng agent, dạng "agent:token,agent:token"
+AGENT_TOKEN_BUDGETS = os.getenv(
+    "AGENT_TOKEN_BUDGETS",
+    "supervisor:2000,course_advisor_agent:6000,enrollment_agent:6000,modify_agent:6000"
+)
+DEFAULT_TOKEN_BUDGET = 6000
+
+# Tiền tố của các message ngữ cảnh mà ModifyAgent từng chèn thẳng vào `messages`
+INJECTED_CONTEXT_PREFIX = "Đây là các thông tin bạn nhận được:"
+
+SUMMARY_PROMPT = (
+    "Bạn là trợ lý ghi chú của trung tâm đào tạo. Hãy cập nhật bản tóm tắt cuộc hội thoại "
+    "giữa khách và chatbot bằng tiếng Việt, ngắn gọn, dạng gạch đầu dòng. Giữ lại: thông tin "
+    "liên hệ khách đã cung cấp, các khóa học khách quan tâm, giỏ hàng/đơn hàng và các yêu cầu "
+    "còn dang dở. Bỏ qua lời chào và nội dung lặp lại."
+)
+
+
+def _parse_budgets(raw: str) -> dict[str, int]:
+    budgets = {}
+    for part in raw.split(","):
+        if ":" not in part:
+            continue
+        agent, tokens = part.split(":", 1)
+        try:
+            budgets[agent.strip()] = int(tokens)
+        except ValueError:
+            logger.error(f"Ngân sách token không hợp lệ: {part}")
+    return budgets
+
+
+TOKEN_BUDGETS = _parse_budgets(AGENT_TOKEN_BUDGETS)
+
+
+def is_injected_context(message: BaseMessage) -> bool:
+    return (
+        isinstance(message, HumanMessage)
+        and isinstance(message.content, str)
+        and message.content.startswith(INJECTED_CONTEXT_PREFIX)
+    )
+
+
+def _turn_starts(messages: list[BaseMessage]) -> list[int]:
+    return [
+        i for i, message in enumerate(messages)
+        if isinstance(message, HumanMessage) and not is_injected_context(message)
+    ]
+
+
+def _is_tool_traffic(message: BaseMessage) -> bool:
+    return isinstance(message, ToolMessage) or (isinstance(message, AIMessage) and bool(message.tool_calls))
+
+
+def _render_transcript(messages: list[BaseMessage]) -> str:
+    return "\n".join(
+        f"{message.type}: {message.content}"
+        for message in messages
+        if not _is_tool_traffic(message) and message.content
+    )
+
+
+def with_ephemeral_context(messages: list[BaseMessage], context: Optional[str]) -> list[BaseMessage]:
+    """
+    Chèn ngữ cảnh của lượt hiện tại ngay sau tin nhắn gần nhất của khách, chỉ trong input gửi LLM.
+    """
+    if not context:
+        return messages
+
+    starts = _turn_starts(messages)
+    position = starts[-1] + 1 if starts else len(messages)
+    return [*messages[:position], HumanMessage(content=context), *messages[position:]]
+
+
+def history_for_model(
+    messages: list[BaseMessage],
+    summary: Optional[str],
+    max_tokens: int,
+    context: Optional[str] = None
+) -> list[BaseMessage]:
+    """
+    Cắt lịch sử theo ngân sách token (giữ phần cuối, bắt đầu từ tin nhắn của khách),
+    chèn bản tóm tắt các lượt cũ ở đầu và ngữ cảnh tạm thời của lượt hiện tại.
+
+    Args:
+        messages (list[BaseMessage]): Lịch sử hiện tại.
+        summary (Optional[str]): Bản tóm tắt các lượt đã được gộp.
+        max_tokens (int): Ngân sách token cho lịch sử.
+        context (Optional[str]): Ngữ cảnh chỉ dùng cho lần gọi LLM này, không ghi vào state.
+
+    Returns:
+        list[BaseMessage]: Danh sách message đưa vào LLM.
+    """
+    messages = [message for message in messages if not is_injected_context(message)]
+    trimmed = trim_messages(
+        messages,
+        max_tokens=max_tokens,
+        strategy="last",
+        token_counter=count_tokens_approximately,
+        start_on="human",
+        allow_partial=False
+    )
+
+    if not trimmed and messages:
+        # Lượt hiện tại đã vượt ngân sách: vẫn giữ nguyên lượt này để không làm hỏng cặp tool call
+        starts = _turn_starts(messages)
+        trimmed = messages[starts[-1]:] if starts else messages
+
+    if len(trimmed) < len(messages):
+        metrics.incr("history.trimmed_messages", len(messages) - len(trimmed))
+
+    trimmed = with_ephemeral_context(trimmed, context)
+
+    if summary:
+        return [SystemMessage(content=f"Tóm tắt hội thoại trước đó:\n{summary}"), *trimmed]
+    return trimmed
+
+
+def token_budget_hook(
+    agent_name: str,
+    context: Optional[Callable[[AgentState], Optional[str]]] = None
+) -> Callable[[AgentState], dict]:
+    """
+    Tạo `pre_model_hook` cho `create_react_agent`: áp ngân sách token của `agent_name`
+    lên lịch sử mà không ghi đè `messages` trong state.
+
+    Args:
+        agent_name (str): Tên agent để tra ngân sách trong `AGENT_TOKEN_BUDGETS`.
+        context (Optional[Callable]): Hàm tạo ngữ cảnh tạm thời từ state cho mỗi lần gọi LLM.
+    """
+    max_tokens = TOKEN_BUDGETS.get(agent_name, DEFAULT_TOKEN_BUDGET)
+
+    def hook(state: AgentState) -> dict:
+        return {
+            "llm_input_messages": history_for_model(
+                state["messages"],
+                state.get("summary"),
+                max_tokens,
+                context(state) if context else None
+            )
+        }
+
+    return hook
+
+
+def trim_prompt_input(agent_name: str) -> Callable[[dict], dict]:
+    """
+    Tương tự `token_budget_hook` nhưng dùng cho chain prompt thường (Supervisor).
+    """
+    max_tokens = TOKEN_BUDGETS.get(agent_name, DEFAULT_TOKEN_BUDGET)
+
+    def trim(state: dict) -> dict:
+        return {
+            **state,
+            "messages": history_for_model(state.get("messages") or [], state.get("summary"), max_tokens)
+        }
+
+    return trim
+
+
+class HistoryManager:
+    """
+    Node chạy đầu mỗi lượt: gộp các lượt cũ vào `summary` bằng model của tác vụ "summarization",
+    xóa chúng khỏi `messages` và bỏ các message tool / ngữ cảnh chèn cũ của những lượt trước.
+    """
+
+    def __init__(
+        self,
+        keep_turns: int = HISTORY_KEEP_TURNS,
+        trigger_turns: int = HISTORY_SUMMARY_TRIGGER_TURNS
+    ):
+        self.keep_turns = keep_turns
+        self.trigger_turns = max(trigger_turns, keep_turns)
+
+    def _plan(self, state: AgentState) -> tuple[list[BaseMessage], list[BaseMessage]]:
+        """
+        Returns:
+            tuple[list, list]: (các message cần gộp vào tóm tắt, các message tool cũ cần bỏ).
+        """
+        messages = state.get("messages") or []
+        starts = _turn_starts(messages)
+
+        to_fold: list[BaseMessage] = []
+        if len(starts) > self.trigger_turns:
+            cut = starts[-self.keep_turns] if self.keep_turns else len(messages)
+            to_fold = messages[:cut]
+
+        folded_ids = {message.id for message in to_fold}
+        stale_tools = [
+            message for message in messages
+            if message.id not in folded_ids
+            and (_is_tool_traffic(message) or is_injected_context(message))
+        ]
+        return to_fold, stale_tools
+
+    def _summary_prompt(self, summary: Optional[str], to_fold: list[BaseMessage]) -> list[BaseMessage]:
+        return [
+            SystemMessage(content=SUMMARY_PROMPT),
+            HumanMessage(content=(
+                f"Bản tóm tắt hiện tại:\n{summary or 'chưa có'}\n\n"
+                f"Các lượt cần gộp thêm:\n{_render_transcript(to_fold)}"
+            ))
+        ]
+
+    def _update(
+        self,
+        to_fold: list[BaseMessage],
+        stale_tools: list[BaseMessage],
+        summary: Optional[str]
+    ) -> dict:
+        removed = [RemoveMessage(id=message.id) for message in [*to_fold, *stale_tools]]
+        if removed:
+            metrics.incr("history.removed_messages", len(removed))
+        update = {"messages": removed}
+        if to_fold:
+            update["summary"] = summary
+        return update
+
+    def compact_node(self, state: AgentState) -> dict:
+        """
+        Gộp lịch sử cũ vào `summary` trước khi Supervisor xử lý lượt mới.
+
+        Args:
+            state (AgentState): Trạng thái hội thoại hiện tại.
+
+        Returns:
+            dict: Cập nhật `messages` (RemoveMessage) và `summary` nếu có gộp.
+        """
+        to_fold, stale_tools = self._plan(state)
+        summary = state.get("summary")
+
+        if to_fold:
+            started = time.perf_counter()
+            try:
+                summary = model_router.select("summarization").invoke(self._summary_prompt(summary, to_fold)).content
+                metrics.observe("history.summarize", time.perf_counter() - started)
+                logger.info(f"Gộp {len(to_fold)} message cũ vào bản tóm tắt")
+            except Exception as e:
+                # Không chặn lượt chat vì lỗi tóm tắt; thử lại ở lượt sau
+                logger.error(f"Lỗi tóm tắt lịch sử: {e}")
+                to_fold = []
+
+        return self._update(to_fold, stale_tools, summary)
+
+    async def acompact_node(self, state: AgentState) -> dict:
+        """
+        Phiên bản bất đồng bộ của `compact_node`, dùng `ainvoke`.
+        """
+        to_fold, stale_tools = self._plan(state)
+        summary = state.get("summary")
+
+        if to_fold:
+            started = time.perf_counter()
+            try:
+                summary = (await model_router.select("summarization").ainvoke(self._summary_prompt(summary, to_fold))).content
+                metrics.observe("history.summarize", time.perf_counter() - started)
+                logger.info(f"Gộp {len(to_fold)} message cũ vào bản tóm tắt")
+            except Exception as e:
+                # Không chặn lượt chat vì lỗi tóm tắt; thử lại ở lượt sau
+                logger.error(f"Lỗi tóm tắt lịch sử: {e}")
+                to_fold = []
+
+        return self._update(to_fold, stale_tools, summary)
@@ -0,0 +1,376 @@
+"""
+Bộ định tuyến cục bộ chạy trước LLM của Supervisor.
+
+Quyết định nhanh cho các ý định phổ biến bằng bảng luật (từ khóa/regex) và, nếu có,
+một bộ phân loại n-gram ký tự huấn luyện offline từ log định tuyến của Supervisor.
+Chỉ khi độ tin cậy thấp mới gọi LLM.
+
+Huấn luyện / đánh giá:
+    python -m core.graph.intent_router train --log logs/routes.jsonl --out models/intent_router.json
+    python -m core.graph.intent_router eval --log logs/routes.jsonl --model models/intent_router.json
+"""
+import os
+import re
+import json
+import math
+import time
+import argparse
+import threading
+import unicodedata
+from dataclasses import dataclass
+from typing import Callable, Optional
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessage
+
+from core.utils.metrics import metrics
+from log.logger_config import setup_logging
+
+load_dotenv()
+
+logger = setup_logging(__name__)
+
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", "models/intent_router.json")
+INTENT_CLASSIFIER_THRESHOLD = float(os.getenv("INTENT_CLASSIFIER_THRESHOLD", "0.9"))
+ROUTE_LOG_PATH = os.getenv("ROUTE_LOG_PATH")
+
+ROUTES = ["course_advisor_agent", "enrollment_agent", "modify_agent", "escalation_agent"]
+
+
+def normalize(text: str) -> str:
+    """
+    Chuẩn hóa câu tiếng Việt: chữ thường, bỏ dấu, gộp khoảng trắng.
+
+    Args:
+        text (str): Câu gốc.
+
+    Returns:
+        str: Câu đã chuẩn hóa, ví dụ "Hủy  đơn!" -> "huy don!".
+    """
+    text = unicodedata.normalize("NFD", text.lower().replace("đ", "d"))
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def last_agent(state: dict) -> Optional[str]:
+    for message in reversed(state.get("messages") or []):
+        if isinstance(message, AIMessage) and message.name:
+            return message.name
+    return None
+
+
+@dataclass
+class RouteDecision:
+    next: str
+    confidence: float
+    source: str
+
+
+@dataclass
+class _Rule:
+    name: str
+    route: str
+    pattern: re.Pattern
+    when: Callable[[dict], bool]
+
+
+def _always(state: dict) -> bool:
+    return True
+
+
+def _has_cart(state: dict) -> bool:
+    return bool(state.get("cart"))
+
+
+def _only_order(state: dict) -> bool:
+    return not state.get("cart") and bool(state.get("order"))
+
+
+def _no_cart(state: dict) -> bool:
+    return not state.get("cart")
+
+
+def _no_cart_or_order(state: dict) -> bool:
+    return not state.get("cart") and not state.get("order")
+
+
+def _awaiting_contact(route: str) -> Callable[[dict], bool]:
+    return lambda state: last_agent(state) == route
+
+
+_PHONE_OR_EMAIL = r"^\s*(?:(?:\+?84|0)\d{9}|[\w.+-]+@[\w-]+\.[\w.]+)\s*$"
+_CONFIRM = r"(ok|oke|okay|dung roi|xac nhan|chot( don)?|tien hanh dang ky|dang ky luon)"
+
+# Thứ tự luật bám theo cây quyết định trong `supervisor_prompt.md`: khiếu nại / B2B trước,
+# sau đó đến các luật phụ thuộc giỏ hàng và đơn hàng.
+RULES: list[_Rule] = [
+    _Rule(
+        "b2b", "escalation_agent",
+        re.compile(r"\b(cong ty|doanh nghiep|hoa don do|so luong lon|\d{2,} (nguoi|nhan vien|hoc vien))\b"),
+        _always
+    ),
+    _Rule(
+        "complaint", "escalation_agent",
+        re.compile(r"\b(khieu nai|that vong|chat luong kem|lua dao|qua te|te qua)\b"),
+        _always
+    ),
+    _Rule(
+        "contact_reply_enrollment", "enrollment_agent",
+        re.compile(_PHONE_OR_EMAIL),
+        _awaiting_contact("enrollment_agent")
+    ),
+    _Rule(
+        "contact_reply_modify", "modify_agent",
+        re.compile(_PHONE_OR_EMAIL),
+        _awaiting_contact("modify_agent")
+    ),
+    _Rule(
+        "confirm_cart", "enrollment_agent",
+        # Chỉ câu xác nhận ngắn: "ok còn khóa TOEIC thì sao" phải để LLM quyết định
+        re.compile(rf"^{_CONFIRM}([ ,]+({_CONFIRM}|em|nhe|nha|a|luon|di|shop|ad|admin))*[ !.]*$"),
+        _has_cart
+    ),
+    _Rule(
+        "modify_order", "modify_agent",
+        re.compile(r"\b(huy don|huy dang ky|huy khoa|doi lich|doi khoa|doi ca|thay doi|chinh sua|cap nhat don)\b"),
+        _no_cart
+    ),
+    _Rule(
+        "order_question", "modify_agent",
+        re.compile(r"\b(don (hang|cua (anh|chi|em|minh|toi))|trang thai don)\b"),
+        _only_order
+    ),
+    _Rule(
+        "promotion_or_info", "course_advisor_agent",
+        re.compile(r"\b(khuyen mai|uu dai|giam gia|hoc phi|lich khai giang|lich hoc|co nhung khoa|khoa hoc nao|tu van)\b"),
+        # Khi đã có giỏ hàng / đơn hàng, "lịch học", "học phí"... có thể hỏi về chính đơn đó
+        _no_cart_or_order
+    ),
+    _Rule(
+        "greeting", "course_advisor_agent",
+        re.compile(r"^(xin chao|chao|hello|hi|alo)( (em|shop|ad|admin|ban|trung tam))?[ !.]*$"),
+        _always
+    ),
+]
+
+
+class NgramClassifier:
+    """
+    Naive Bayes trên n-gram ký tự của câu đã chuẩn hóa, kèm đặc trưng trạng thái giỏ hàng/đơn hàng.
+    """
+
+    def __init__(self, labels: dict, vocab_size: int, n: int = 3):
+        self.labels = labels
+        self.vocab_size = vocab_size
+        self.n = n
+        self._total_docs = sum(label["docs"] for label in labels.values())
+
+    @staticmethod
+    def features(text: str, has_cart: bool, has_order: bool, n: int = 3) -> list[str]:
+        padded = f" {normalize(text)} "
+        grams = [padded[i:i + n] for i in range(max(1, len(padded) - n + 1))]
+        grams.append("__cart__" if has_cart else "__nocart__")
+        grams.append("__order__" if has_order else "__noorder__")
+        return grams
+
+    @classmethod
+    def train(cls, samples: list[dict], n: int = 3) -> "NgramClassifier":
+        labels: dict = {}
+        vocab = set()
+        for sample in samples:
+            label = labels.setdefault(sample["next"], {"docs": 0, "total": 0, "grams": {}})
+            label["docs"] += 1
+            for gram in cls.features(sample["user_input"], sample.get("cart", False), sample.get("order", False), n):
+                label["grams"][gram] = label["grams"].get(gram, 0) + 1
+                label["total"] += 1
+                vocab.add(gram)
+        return cls(labels, len(vocab), n)
+
+    @classmethod
+    def load(cls, path: str) -> "NgramClassifier":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["labels"], data["vocab_size"], data.get("n", 3))
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"labels": self.labels, "vocab_size": self.vocab_size, "n": self.n}, f, ensure_ascii=False)
+
+    def predict(self, text: str, has_cart: bool, has_order: bool) -> tuple[str, float]:
+        """
+        Returns:
+            tuple[str, float]: (route dự đoán, xác suất hậu nghiệm của route đó).
+        """
+        grams = self.features(text, has_cart, has_order, self.n)
+        scores = {}
+        for route, label in self.labels.items():
+            score = math.log(label["docs"] / self._total_docs)
+            denominator = label["total"] + self.vocab_size
+            for gram in grams:
+                score += math.log((label["grams"].get(gram, 0) + 1) / denominator)
+            scores[route] = score
+
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        normalizer = sum(math.exp(score - top) for score in scores.values())
+        return best, 1 / normalizer
+
+
+class IntentRouter:
+    """
+    Tầng định tuyến cục bộ: luật trước, bộ phân loại sau, còn lại trả về None để gọi LLM.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        model_path: Optional[str] = None,
+        threshold: float = 0.9,
+        route_log_path: Optional[str] = None
+    ):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.route_log_path = route_log_path
+        self.classifier: Optional[NgramClassifier] = None
+        self._log_lock = threading.Lock()
+        self._llm_latency: Optional[float] = None
+        self.latency_saved = 0.0
+
+        if model_path and os.path.exists(model_path):
+            try:
+                self.classifier = NgramClassifier.load(model_path)
+                logger.info(f"Đã nạp bộ phân loại ý định từ {model_path}")
+            except Exception as e:
+                logger.error(f"Lỗi nạp bộ phân loại ý định {model_path}: {e}")
+
+    def route(self, state: dict) -> Optional[RouteDecision]:
+        """
+        Quyết định agent tiếp theo nếu đủ tự tin.
+
+        Args:
+            state (dict): Trạng thái hội thoại hiện tại (dùng `user_input`, `cart`, `order`, `messages`).
+
+        Returns:
+            Optional[RouteDecision]: Quyết định cục bộ, hoặc None nếu cần gọi LLM.
+        """
+        if not self.enabled:
+            return None
+
+        text = normalize(state.get("user_input") or "")
+        if not text:
+            return None
+
+        decision = None
+        for rule in RULES:
+            if rule.pattern.search(text) and rule.when(state):
+                decision = RouteDecision(next=rule.route, confidence=1.0, source=f"rule:{rule.name}")
+                break
+
+        if decision is None and self.classifier is not None:
+            route, confidence = self.classifier.predict(text, bool(state.get("cart")), bool(state.get("order")))
+            if confidence >= self.threshold and route in ROUTES:
+                decision = RouteDecision(next=route, confidence=confidence, source="classifier")
+
+        if decision is None:
+            metrics.incr("router.llm_fallback")
+            return None
+
+        metrics.incr("router.rule_hit" if decision.source.startswith("rule") else "router.classifier_hit")
+        if self._llm_latency is not None:
+            self.latency_saved += self._llm_latency
+        logger.info(f"Định tuyến cục bộ ({decision.source}, {decision.confidence:.2f}): {decision.next}")
+        return decision
+
+    def guess(self, state: dict) -> Optional[RouteDecision]:
+        """
+        Dự đoán của bộ phân loại kể cả khi dưới ngưỡng; dùng làm tín hiệu rẻ cho việc chạy
+        trước agent chuyên trách, không dùng để định tuyến.
+
+        Returns:
+            Optional[RouteDecision]: Dự đoán, hoặc None nếu chưa có bộ phân loại.
+        """
+        text = normalize(state.get("user_input") or "")
+        if not self.enabled or self.classifier is None or not text:
+            return None
+        route, confidence = self.classifier.predict(text, bool(state.get("cart")), bool(state.get("order")))
+        return RouteDecision(next=route, confidence=confidence, source="classifier")
+
+    def observe_llm(self, state: dict, next_node: str, seconds: float):
+        """
+        Ghi nhận một lần định tuyến bằng LLM: cập nhật độ trễ trung bình và ghi log huấn luyện.
+        """
+        self._llm_latency = seconds if self._llm_latency is None else 0.9 * self._llm_latency + 0.1 * seconds
+        metrics.observe("router.llm_latency", seconds)
+
+        if not self.route_log_path:
+            return
+
+        record = {
+            "user_input": state.get("user_input"),
+            "cart": bool(state.get("cart")),
+            "order": bool(state.get("order")),
+            "next": next_node,
+        }
+        try:
+            with self._log_lock:
+                os.makedirs(os.path.dirname(self.route_log_path) or ".", exist_ok=True)
+                with open(self.route_log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except Exception as e:
+            logger.error(f"Lỗi ghi log định tuyến: {e}")
+
+    def hit_rate(self) -> float:
+        hits = metrics.counter("router.rule_hit") + metrics.counter("router.classifier_hit")
+        total = hits + metrics.counter("router.llm_fallback")
+        return round(hits / total, 4) if total else 0.0
+
+
+intent_router = IntentRouter(
+    enabled=INTENT_ROUTER_ENABLED,
+    model_path=INTENT_MODEL_PATH,
+    threshold=INTENT_CLASSIFIER_THRESHOLD,
+    route_log_path=ROUTE_LOG_PATH
+)
+
+metrics.register_gauge("router.hit_rate", intent_router.hit_rate)
+metrics.register_gauge("router.latency_saved_seconds", lambda: round(intent_router.latency_saved, 3))
+
+
+def _read_log(path: str) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _evaluate(classifier: NgramClassifier, samples: list[dict], threshold: float):
+    covered = correct = 0
+    for sample in samples:
+        route, confidence = classifier.predict(sample["user_input"], sample.get("cart", False), sample.get("order", False))
+        if confidence >= threshold:
+            covered += 1
+            correct += route == sample["next"]
+    total = len(samples) or 1
+    print(f"Mẫu: {len(samples)} | Ngưỡng: {threshold}")
+    print(f"Tỉ lệ quyết định cục bộ: {covered / total:.1%}")
+    print(f"Độ chính xác trên phần quyết định: {correct / (covered or 1):.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["train", "eval"])
+    parser.add_argument("--log", required=True, help="File JSONL do Supervisor ghi (ROUTE_LOG_PATH)")
+    parser.add_argument("--out", default=INTENT_MODEL_PATH)
+    parser.add_argument("--model", default=INTENT_MODEL_PATH)
+    parser.add_argument("--threshold", type=float, default=INTENT_CLASSIFIER_THRESHOLD)
+    args = parser.parse_args()
+
+    samples = [sample for sample in _read_log(args.log) if sample.get("next") in ROUTES]
+
+    if args.command == "train":
+        started = time.perf_counter()
+        classifier = NgramClassifier.train(samples)
+        classifier.save(args.out)
+        print(f"Đã huấn luyện trên {len(samples)} mẫu trong {time.perf_counter() - started:.2f}s -> {args.out}")
+        _evaluate(classifier, samples, args.threshold)
+    else:
+        _evaluate(NgramClassifier.load(args.model), samples, args.threshold)
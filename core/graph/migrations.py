@@ -0,0 +1,82 @@
+"""
+Các bước dọn dữ liệu checkpoint của graph.
+
+Chạy:
+    python -m core.graph.migrations strip-injected-context [--dry-run]
+
+Dùng checkpointer theo `CHECKPOINTER_BACKEND` (với "memory" chỉ có ý nghĩa khi gọi trong process).
+"""
+import asyncio
+import argparse
+from typing import Any
+
+from langchain_core.messages import RemoveMessage
+
+from core.graph.history_manager import is_injected_context
+
+from log.logger_config import setup_logging
+
+logger = setup_logging(__name__)
+
+
+async def _thread_ids(graph: Any) -> list[str]:
+    thread_ids = []
+    seen = set()
+    async for checkpoint in graph.checkpointer.alist(None):
+        thread_id = checkpoint.config["configurable"]["thread_id"]
+        if thread_id not in seen:
+            seen.add(thread_id)
+            thread_ids.append(thread_id)
+    return thread_ids
+
+
+async def strip_injected_context(graph: Any, dry_run: bool = False) -> dict:
+    """
+    Xóa các HumanMessage ngữ cảnh mà ModifyAgent từng chèn vào `messages` khỏi checkpoint mới nhất
+    của mọi thread.
+
+    Args:
+        graph (Any): Graph đã compile kèm checkpointer.
+        dry_run (bool): Chỉ đếm, không ghi.
+
+    Returns:
+        dict: Số thread đã quét, số thread được sửa và số message đã xóa.
+    """
+    stats = {"threads": 0, "updated": 0, "removed": 0}
+
+    for thread_id in await _thread_ids(graph):
+        stats["threads"] += 1
+        config = {"configurable": {"thread_id": thread_id}}
+        snapshot = await graph.aget_state(config)
+        injected = [m for m in (snapshot.values or {}).get("messages", []) if is_injected_context(m)]
+        if not injected:
+            continue
+
+        stats["updated"] += 1
+        stats["removed"] += len(injected)
+        if not dry_run:
+            await graph.aupdate_state(
+                config,
+                {"messages": [RemoveMessage(id=message.id) for message in injected]},
+                as_node="history_manager"
+            )
+
+    logger.info(f"Dọn ngữ cảnh chèn trong checkpoint: {stats}")
+    return stats
+
+
+async def _main(dry_run: bool) -> dict:
+    from core.graph.build_graph import create_main_graph
+    from core.graph.checkpointer import open_checkpointer
+
+    async with open_checkpointer() as checkpointer:
+        return await strip_injected_context(create_main_graph(checkpointer=checkpointer), dry_run=dry_run)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["strip-injected-context"])
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    print(asyncio.run(_main(args.dry_run)))
@@ -1,11 +1,15 @@
 from langgraph.types import Command
-from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages import AIMessage
 from langgraph.prebuilt import create_react_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
 from core.graph.state import AgentState
-from core.tools import modify_toolbox
-from database.connection import specialist_llm
+from core.tools import modify_toolbox, toolbox_for
+from core.utils.tool_function import direct_reply, needs_llm_reply
+from database.model_router import model_router
+from core.graph.history_manager import token_budget_hook, INJECTED_CONTEXT_PREFIX
+from core.utils.prompt_context import compact_context, render_seen_products, render_order
+from core.utils.course_catalog import course_catalog
 
 from log.logger_config import setup_logging
 
@@ -31,13 +35,48 @@ class ModifyAgent:
             MessagesPlaceholder(variable_name="messages")
         ])
         
+        tools = toolbox_for("modify_agent", modify_toolbox)
         self.agent = create_react_agent(
-            model=specialist_llm,
-            tools=modify_toolbox,
-            prompt=self.prompt,
+            model=model_router.for_agent("order_editing", tools),
+            tools=tools,
+            prompt=compact_context | self.prompt,
+            pre_model_hook=token_budget_hook("modify_agent", context=self._context),
             state_schema=AgentState
         )
     
+    def _context(self, state: AgentState) -> str:
+        """
+        Ngữ cảnh của lượt hiện tại, chỉ đưa vào input của LLM qua `pre_model_hook`
+        (không ghi vào `messages`).
+        """
+        return (
+            f"{INJECTED_CONTEXT_PREFIX}\n"
+            f"- seen_products:\n{render_seen_products(state["seen_products"])}\n"
+            f"- order:\n{render_order(state["order"])}\n" 
+            f"- name: {state["name"]}\n"
+            f"- phone_number: {state["phone_number"]}\n"
+            f"- email: {state["email"]}\n"
+            "Hãy dựa vào đây là quyết định gọi "
+            "tool hay không."            
+        )
+
+    def _to_command(self, result: dict) -> Command:
+        content = direct_reply(result["messages"]) or result["messages"][-1].content
+        
+        update = {
+            "messages": [AIMessage(content=content, name="modify_agent")],
+            "next": "__end__"
+        }
+        
+        for key in ["student_id", "name", "phone_number", "email", "seen_products", "order"]:
+            if result.get(key, None) is not None:
+                update[key] = result[key]
+        
+        return Command(
+            update=update,
+            goto="__end__"
+        )
+    
     def modify_agent_node(self, state: AgentState) -> Command:
         """
         Xử lý các yêu cầu chỉnh sửa đơn hàng: thay đổi người nhận, thay đổi/xóa sản phẩm,
@@ -50,36 +89,27 @@ class ModifyAgent:
             Command: Lệnh cập nhật `messages`, `order`, và điều hướng kết thúc luồng.
         """
         try:
-            state["messages"].append(
-                HumanMessage(content=(
-                        "Đây là các thông tin bạn nhận được:\n"
-                        f"- seen_products: {state["seen_products"]}\n"
-                        f"- order: {state["order"]}\n" 
-                        f"- name: {state["name"]}\n"
-                        f"- phone_number: {state["phone_number"]}\n"
-                        f"- email: {state["email"]}\n"
-                        "Hãy dựa vào đây là quyết định gọi "
-                        "tool hay không."            
-                    )
-                )
-            )
             result = self.agent.invoke(state)
-            content = result["messages"][-1].content
+            if needs_llm_reply(result):
+                result = self.agent.invoke(result)
+            return self._to_command(result)
             
-            update = {
-                "messages": [AIMessage(content=content, name="modify_agent")],
-                "next": "__end__"
-            }
-            
-            for key in ["student_id", "name", "phone_number", "email", "seen_products", "order"]:
-                if result.get(key, None) is not None:
-                    update[key] = result[key]
-            
-            return Command(
-                update=update,
-                goto="__end__"
-            )
+        except Exception as e:
+            logger.error(f"Lỗi: {e}")
+            raise
+
+    async def amodify_agent_node(self, state: AgentState) -> Command:
+        """
+        Phiên bản bất đồng bộ của `modify_agent_node`, dùng `ainvoke`.
+        """
+        try:
+            # Nạp trước khóa học cho `_context` (hook đồng bộ) mà không chặn event loop
+            await course_catalog.aresolve(state["seen_products"])
+            result = await self.agent.ainvoke(state)
+            if needs_llm_reply(result):
+                result = await self.agent.ainvoke(result)
+            return self._to_command(result)
             
         except Exception as e:
             logger.error(f"Lỗi: {e}")
-            raise
\ No newline at end of file
+            raise
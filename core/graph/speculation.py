@@ -0,0 +1,172 @@
+import os
+import time
+import asyncio
+from typing import Any, Optional
+from dotenv import load_dotenv
+from langgraph.types import Command
+from langchain_core.messages import HumanMessage
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
+
+from core.graph.state import AgentState
+from core.graph.supervisor import Supervisor, _aget_or_create_customer
+from core.graph.intent_router import intent_router, last_agent
+from core.utils.metrics import metrics
+from core.utils.tool_function import needs_llm_reply
+
+from log.logger_config import setup_logging
+
+load_dotenv()
+
+logger = setup_logging(__name__)
+
+SPECULATIVE_ROUTING = os.getenv("SPECULATIVE_ROUTING", "false").lower() == "true"
+# Chỉ chạy trước các agent có tool chỉ đọc; kết quả bị hủy không được để lại tác dụng phụ
+SPECULATIVE_AGENTS = [
+    agent.strip()
+    for agent in os.getenv("SPECULATIVE_AGENTS", "course_advisor_agent").split(",")
+    if agent.strip()
+]
+# Độ tin cậy tối thiểu của bộ phân loại để dùng dự đoán của nó thay cho agent lượt trước
+SPECULATION_MIN_CONFIDENCE = float(os.getenv("SPECULATION_MIN_CONFIDENCE", "0.5"))
+
+
+def _total_tokens(handler: UsageMetadataCallbackHandler) -> int:
+    # Usage chỉ được ghi khi lời gọi LLM kết thúc: lời gọi đang chạy dở lúc bị hủy không được tính
+    return sum(usage.get("total_tokens", 0) for usage in handler.usage_metadata.values())
+
+
+def _drain(task: asyncio.Task):
+    # Lấy lỗi của task bị bỏ để asyncio không cảnh báo "exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+class SpeculativeSupervisor:
+    """
+    Node Supervisor chạy trước agent chuyên trách có khả năng cao nhất song song với LLM điều phối.
+
+    Agent dự đoán lấy từ bộ phân loại ý định (nếu đủ tin cậy), nếu không thì agent đã trả lời
+    lượt trước. Nếu Supervisor chọn đúng agent đó, kết quả chạy trước được ghi luôn và lượt
+    kết thúc tại đây; nếu chọn khác, task chạy trước bị hủy và lượt đi tiếp như bình thường.
+    Agent chạy trước kế thừa callback của node (tracing) và thêm một handler đếm token; token của nó
+    không tới khách vì `stream_tokens` chỉ stream token của node chuyên trách, không phải supervisor.
+    `speculation.wasted_tokens` là cận dưới: token của lời gọi LLM bị hủy giữa chừng không được đếm.
+    """
+
+    def __init__(
+        self,
+        supervisor: Supervisor,
+        agents: dict[str, Any],
+        speculative_agents: list[str] = SPECULATIVE_AGENTS,
+        min_confidence: float = SPECULATION_MIN_CONFIDENCE
+    ):
+        self.supervisor = supervisor
+        self.agents = {name: agents[name] for name in speculative_agents if name in agents}
+        self.min_confidence = min_confidence
+
+    def predict(self, state: AgentState) -> Optional[str]:
+        """
+        Dự đoán agent chuyên trách của lượt này từ tín hiệu cục bộ.
+
+        Returns:
+            Optional[str]: Tên agent nếu được phép chạy trước, ngược lại None.
+        """
+        guess = intent_router.guess(state)
+        if guess and guess.confidence >= self.min_confidence:
+            predicted = guess.next
+        else:
+            predicted = last_agent(state)
+        return predicted if predicted in self.agents else None
+
+    async def asupervisor_node(self, state: AgentState, config: RunnableConfig) -> Command:
+        """
+        Phiên bản chạy trước của `Supervisor.asupervisor_node`.
+
+        Args:
+            state (AgentState): Trạng thái hội thoại hiện tại.
+            config (RunnableConfig): Config của node, do LangGraph truyền vào.
+
+        Returns:
+            Command: Kết quả của agent đã chạy trước (goto `__end__`) nếu dự đoán đúng,
+                ngược lại là lệnh điều hướng của Supervisor.
+        """
+        supervisor = self.supervisor
+        try:
+            customer = None
+            if not state["student_id"]:
+                customer = await _aget_or_create_customer(chat_id=state["chat_id"])
+            update = supervisor._customer_update(state, customer)
+
+            result = supervisor._local_route(state)
+            predicted = None if result else self.predict(state)
+            if result or not predicted:
+                if not result:
+                    metrics.incr("speculation.skipped")
+                    result = await supervisor._allm_route(state)
+                return supervisor._route_command(state, result, update)
+
+            human = HumanMessage(content=state["user_input"])
+            handler = UsageMetadataCallbackHandler()
+            # Gộp handler vào callback của node thay vì thay thế, để tracing vẫn theo dõi agent
+            speculative_config = merge_configs(config, {"callbacks": [handler]})
+            started = time.perf_counter()
+            task = asyncio.create_task(self.agents[predicted].agent.ainvoke(
+                {**state, **update, "messages": [*state["messages"], human]},
+                config=speculative_config
+            ))
+            task.add_done_callback(_drain)
+
+            try:
+                result = await supervisor._allm_route(state)
+            except Exception:
+                task.cancel()
+                raise
+
+            if result.next != predicted:
+                task.cancel()
+                metrics.incr("speculation.miss")
+                metrics.incr("speculation.wasted_tokens", _total_tokens(handler))
+                logger.info(f"Chạy trước {predicted} bị hủy, Supervisor chọn {result.next}")
+                return supervisor._route_command(state, result, update)
+
+            try:
+                speculative = await task
+                if needs_llm_reply(speculative):
+                    speculative = await self.agents[predicted].agent.ainvoke(
+                        speculative,
+                        config=speculative_config
+                    )
+            except Exception as e:
+                # Agent chạy trước lỗi: để node chuyên trách chạy lại theo luồng thường
+                logger.error(f"Lỗi khi chạy trước {predicted}: {e}")
+                metrics.incr("speculation.failed")
+                return supervisor._route_command(state, result, update)
+
+            metrics.incr("speculation.hit")
+            metrics.observe("speculation.latency", time.perf_counter() - started)
+            logger.info(f"Dùng kết quả chạy trước của {predicted}")
+
+            command = self.agents[predicted]._to_command(speculative)
+            return Command(
+                update={
+                    **update,
+                    **command.update,
+                    "messages": [human, *command.update["messages"]]
+                },
+                goto="__end__"
+            )
+
+        except Exception as e:
+            logger.error(f"Lỗi: {e}")
+            raise
+
+
+def win_rate() -> float:
+    hits = metrics.counter("speculation.hit")
+    total = hits + metrics.counter("speculation.miss")
+    return round(hits / total, 4) if total else 0.0
+
+
+metrics.register_gauge("speculation.win_rate", win_rate)
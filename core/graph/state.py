@@ -6,6 +6,17 @@ from langgraph.prebuilt.chat_agent_executor import AgentState as Origin_AgentSta
 def _remain_dict(old: dict, new: dict | None):
     return new if new is not None else old
 
+def _merge_dict(old: dict | None, new: dict | None):
+    """
+    Gộp các cập nhật dict theo khóa, áp dụng theo thứ tự ghi (thứ tự tool call trong AIMessage)
+    nên kết quả của các tool chạy song song luôn xác định. `{}` nghĩa là xóa toàn bộ.
+    """
+    if new is None:
+        return old
+    if not new:
+        return {}
+    return {**(old or {}), **new}
+
 def _remain_value(old: Optional[Any], new: Optional[Any]) -> Optional[Any]:
     return new if new is not None else old
 
@@ -21,6 +32,11 @@ class SeenProducts(TypedDict):
     minutes_per_session: int
     instructor_name: str
     
+class CourseRef(TypedDict):
+    # Tham chiếu tới bản ghi trong `core.utils.course_catalog`
+    course_id: int
+    version: str
+
 class Cart(TypedDict):
     course_id: int # Đổi từ product_des_id
     price: int
@@ -63,9 +79,10 @@ class AgentState(Origin_AgentState):
     phone_number: Annotated[Optional[str], _remain_value]
     email: Annotated[Optional[str], _remain_value]
     payment: Annotated[Optional[str], _remain_value]
-    seen_products: Annotated[Optional[dict[int, SeenProducts]], _remain_dict]
+    seen_products: Annotated[Optional[dict[int, CourseRef]], _merge_dict]
     cart: Annotated[Optional[dict[int, Cart]], _remain_dict]
     order: Annotated[Optional[dict[int, Order]], _remain_dict]
+    summary: Annotated[Optional[str], _remain_value]
     
 def init_state() -> AgentState:
     return AgentState(
@@ -80,5 +97,6 @@ def init_state() -> AgentState:
         payment=None,
         seen_products=None,
         cart=None,
-        order=None
+        order=None,
+        summary=None
     )
\ No newline at end of file
@@ -1,17 +1,32 @@
+import os
+import time
+import threading
+from cachetools import TTLCache
+from dotenv import load_dotenv
 from langgraph.types import Command
 from typing import Literal, Optional
 from pydantic import BaseModel, Field
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableLambda
 
 from core.graph.state import AgentState 
-from database.connection import supabase_client
-from database.connection import orchestrator_llm
+from core.graph.intent_router import intent_router, normalize, last_agent
+from core.utils.metrics import metrics
+from core.utils.prompt_context import compact_context
+from core.graph.history_manager import trim_prompt_input
+from database.session_store import resolve_session, aresolve_session
+from database.model_router import model_router
 
 from log.logger_config import setup_logging
 
+load_dotenv()
+
 logger = setup_logging(__name__)
 
+ROUTE_CACHE_TTL_SECONDS = int(os.getenv("ROUTE_CACHE_TTL_SECONDS", "3600"))
+ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", "5000"))
+
 class Route(BaseModel):
     """Chọn agent tiếp theo để xử lý yêu cầu."""
     next: Literal["course_advisor_agent", "enrollment_agent", "modify_agent", "escalation_agent", "__end__"] = Field(
@@ -29,18 +44,82 @@ class Route(BaseModel):
     )
 
 def _get_or_create_customer(chat_id: str) -> Optional[dict]:
-    response = (
-        supabase_client.table("students")
-        .upsert(
-            {"chat_id": chat_id},
-            on_conflict="chat_id"
-        )
-        .execute()
-    )
+    customer = resolve_session(chat_id=chat_id)
     
-    logger.info(f"Tạo mới hoặc lấy thông tin khách: {response.data[0]}")
+    logger.info(f"Tạo mới hoặc lấy thông tin khách: {customer}")
     
-    return response.data[0] if response.data else None
+    return customer
+
+async def _aget_or_create_customer(chat_id: str) -> Optional[dict]:
+    customer = await aresolve_session(chat_id=chat_id)
+    
+    logger.info(f"Tạo mới hoặc lấy thông tin khách: {customer}")
+    
+    return customer
+
+class RouteCache:
+    """
+    Cache quyết định `Route` của LLM theo câu đã chuẩn hóa và chữ ký trạng thái thô
+    (giỏ hàng/đơn hàng có rỗng không, agent trả lời gần nhất).
+    Không lưu `__end__` vì lời chào kết thúc phụ thuộc ngữ cảnh của lượt trước.
+    """
+
+    def __init__(self, ttl_seconds: int, maxsize: int):
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl_seconds)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(state: AgentState) -> tuple:
+        return (
+            normalize(state["user_input"] or ""),
+            bool(state.get("cart")),
+            bool(state.get("order")),
+            last_agent(state)
+        )
+
+    def get(self, state: AgentState) -> Optional[Route]:
+        with self._lock:
+            route = self._cache.get(self.key(state))
+        metrics.incr("supervisor.route_cache_hit" if route else "supervisor.route_cache_miss")
+        return route
+
+    def put(self, state: AgentState, route: Route):
+        if route.next == "__end__":
+            return
+        with self._lock:
+            self._cache[self.key(state)] = route
+
+    def flush(self) -> int:
+        """
+        Xóa toàn bộ cache (ví dụ sau khi sửa prompt điều phối).
+
+        Returns:
+            int: Số mục đã xóa.
+        """
+        with self._lock:
+            size = len(self._cache)
+            self._cache.clear()
+        logger.info(f"Đã xóa {size} quyết định định tuyến trong cache")
+        return size
+
+    @property
+    def size(self) -> int:
+        return len(self._cache)
+
+    def hit_ratio(self) -> float:
+        hits = metrics.counter("supervisor.route_cache_hit")
+        total = hits + metrics.counter("supervisor.route_cache_miss")
+        return round(hits / total, 4) if total else 0.0
+
+
+route_cache = RouteCache(ttl_seconds=ROUTE_CACHE_TTL_SECONDS, maxsize=ROUTE_CACHE_SIZE)
+
+metrics.register_gauge("supervisor.route_cache_size", lambda: route_cache.size)
+metrics.register_gauge("supervisor.route_cache_hit_ratio", route_cache.hit_ratio)
+
+def flush_route_cache() -> int:
+    """Hook xóa cache định tuyến của Supervisor."""
+    return route_cache.flush()
 
 class Supervisor:
     def __init__(self):
@@ -59,11 +138,89 @@ class Supervisor:
             ("human", "{user_input}")
         ])
         
-        self.chain = self.prompt | orchestrator_llm.with_structured_output(Route)
+        self.chain = (
+            compact_context
+            | RunnableLambda(trim_prompt_input("supervisor"))
+            | self.prompt
+            | model_router.runnable("routing", lambda llm: llm.with_structured_output(Route))
+        )
+        
+    def _customer_update(self, state: AgentState, customer: Optional[dict]) -> dict:
+        """
+        Tạo phần cập nhật thông tin khách cho state (chỉ khi state chưa có `student_id`).
+        """
+        update = {}
+        if not state["student_id"]:
+            if not customer:
+                logger.error("Lỗi không lấy được thông tin khách")
+            else:
+                update.update({
+                    "student_id": customer.get("student_id"),
+                    "name": customer.get("name"),
+                    "phone_number": customer.get("phone_number"),
+                    "email": customer.get("email")
+                })
+        else:
+            logger.info(
+                "Thông tin của khách: "
+                f"- Tên: {state["name"]} | "
+                f"- Số điện thoại: {state["phone_number"]} | "
+                f"- Email: {state["email"]}"
+            )
+        
+        logger.info(f"Yêu cầu của khách: {state["user_input"]}")
+        
+        return update
+
+    def _route_command(self, state: AgentState, result: Route, update: dict) -> Command:
+        """
+        Chuyển quyết định `Route` của LLM thành `Command` điều hướng.
+        """
+        next_node = result.next
+        update["next"] = next_node
+        if next_node == "__end__":
+            # Nếu Supervisor quyết định kết thúc, sử dụng lời chào do LLM tạo ra
+            final_message = result.final_response or "Cảm ơn anh/chị đã quan tâm ạ. Hẹn gặp lại anh/chị sau!"
+            update["messages"] = [AIMessage(content=final_message, name="supervisor")]
+        else:
+            # Nếu tiếp tục, chỉ thêm tin nhắn của người dùng như cũ
+            update["messages"] = [HumanMessage(content=state["user_input"])]
+        
+        logger.info(f"Agent tiếp theo: {next_node}")
+
+        return Command(
+            update=update,
+            goto=next_node
+        )
+
+    def _local_route(self, state: AgentState) -> Optional[Route]:
+        """
+        Quyết định định tuyến không cần LLM: `intent_router` trước, sau đó `route_cache`.
+        """
+        decision = intent_router.route(state)
+        if decision:
+            return Route(next=decision.next)
+        return route_cache.get(state)
+
+    def _llm_route(self, state: AgentState) -> Route:
+        started = time.perf_counter()
+        result = self.chain.invoke(state)
+        intent_router.observe_llm(state, result.next, time.perf_counter() - started)
+        route_cache.put(state, result)
+        return result
+
+    async def _allm_route(self, state: AgentState) -> Route:
+        started = time.perf_counter()
+        result = await self.chain.ainvoke(state)
+        intent_router.observe_llm(state, result.next, time.perf_counter() - started)
+        route_cache.put(state, result)
+        return result
         
     def supervisor_node(self, state: AgentState) -> Command:
         """
         Phân luồng yêu cầu của khách tới agent phù hợp dựa trên `state` và prompt điều phối.
+        Các ý định rõ ràng được `intent_router` quyết định cục bộ; câu đã gặp với cùng
+        chữ ký trạng thái dùng lại quyết định trong `route_cache`, không cần gọi LLM.
 
         Args:
             state (AgentState): Trạng thái hội thoại hiện tại.
@@ -71,50 +228,34 @@ class Supervisor:
         Returns:
             Command: Lệnh cập nhật `messages`, trường `next` và điều hướng `goto` tới node tiếp theo.
         """
-        update = {}
         try:
+            customer = None
             if not state["student_id"]:
                 customer = _get_or_create_customer(chat_id=state["chat_id"])
-
-                if not customer:
-                    logger.error("Lỗi không lấy được thông tin khách")
-                else:
-                    update.update({
-                        "student_id": customer.get("student_id"),
-                        "name": customer.get("name"),
-                        "phone_number": customer.get("phone_number"),
-                        "email": customer.get("email")
-                    })
-            else:
-                logger.info(
-                    "Thông tin của khách: "
-                    f"- Tên: {state["name"]} | "
-                    f"- Số điện thoại: {state["phone_number"]} | "
-                    f"- Email: {state["email"]}"
-                )
+            update = self._customer_update(state, customer)
             
-            logger.info(f"Yêu cầu của khách: {state["user_input"]}")
+            result = self._local_route(state) or self._llm_route(state)
             
-            result = self.chain.invoke(state)
+            return self._route_command(state, result, update)
+        
+        except Exception as e:
+            logger.error(f"Lỗi: {e}")
+            raise
+
+    async def asupervisor_node(self, state: AgentState) -> Command:
+        """
+        Phiên bản bất đồng bộ của `supervisor_node`, dùng `ainvoke` để không chặn event loop.
+        """
+        try:
+            customer = None
+            if not state["student_id"]:
+                customer = await _aget_or_create_customer(chat_id=state["chat_id"])
+            update = self._customer_update(state, customer)
             
-            next_node = result.next
-            update["next"] = next_node
-            if next_node == "__end__":
-                # Nếu Supervisor quyết định kết thúc, sử dụng lời chào do LLM tạo ra
-                final_message = result.final_response or "Cảm ơn anh/chị đã quan tâm ạ. Hẹn gặp lại anh/chị sau!"
-                update["messages"] = [AIMessage(content=final_message)]
-            else:
-                # Nếu tiếp tục, chỉ thêm tin nhắn của người dùng như cũ
-                update["messages"] = [HumanMessage(content=state["user_input"])]
+            result = self._local_route(state) or await self._allm_route(state)
             
-            logger.info(f"Agent tiếp theo: {next_node}")
-    
-            return Command(
-                update=update,
-                goto=next_node
-            )
+            return self._route_command(state, result, update)
         
         except Exception as e:
             logger.error(f"Lỗi: {e}")
             raise
-        
\ No newline at end of file
@@ -1,3 +1,7 @@
+import os
+from dotenv import load_dotenv
+from langchain_core.tools import BaseTool
+
 from core.tools.product_search_tool import get_courses_tool, get_qna_tool, get_schedule_tool, get_promotions_tool
 from core.tools.cart_tool import add_item_cart_tool, cancel_item_cart_tool
 from core.tools.customer_tool import modify_customer_tool
@@ -33,4 +37,43 @@ modify_toolbox = [
     get_schedule_tool, 
     alter_admission_day_tool,
     alter_item_order_tool
-]
\ No newline at end of file
+]
+
+load_dotenv()
+
+# Các tool trả thẳng `artifact` cho khách và kết thúc lượt, dạng "agent:tool,agent:tool";
+# dùng "*:tool" (hoặc chỉ "tool") để áp dụng cho mọi agent.
+DIRECT_RETURN_TOOLS = os.getenv("DIRECT_RETURN_TOOLS", "")
+
+
+def _parse_direct_return(raw: str) -> dict[str, set[str]]:
+    config: dict[str, set[str]] = {}
+    for part in raw.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        agent, _, tool_name = part.rpartition(":")
+        config.setdefault(agent.strip() or "*", set()).add(tool_name.strip())
+    return config
+
+
+DIRECT_RETURN = _parse_direct_return(DIRECT_RETURN_TOOLS)
+
+
+def toolbox_for(agent_name: str, toolbox: list[BaseTool]) -> list[BaseTool]:
+    """
+    Trả về toolbox của `agent_name`, trong đó các tool được cấu hình ở `DIRECT_RETURN_TOOLS`
+    được thay bằng bản sao `return_direct=True` (tool gốc dùng chung giữa các agent giữ nguyên).
+
+    Args:
+        agent_name (str): Tên agent, ví dụ "enrollment_agent".
+        toolbox (list[BaseTool]): Toolbox gốc.
+
+    Returns:
+        list[BaseTool]: Toolbox dùng cho `create_react_agent`.
+    """
+    names = DIRECT_RETURN.get(agent_name, set()) | DIRECT_RETURN.get("*", set())
+    return [
+        tool.model_copy(update={"return_direct": True}) if tool.name in names else tool
+        for tool in toolbox
+    ]
@@ -5,6 +5,7 @@ from langchain_core.tools import tool, InjectedToolCallId
 
 from core.utils.tool_function import build_update
 from core.graph.state import AgentState, Cart, SeenProducts
+from core.utils.course_catalog import course_catalog
 
 from log.logger_config import setup_logging
 
@@ -36,11 +37,21 @@ def _return_cart(
     index = 1
     
     for item in cart.values():
-        product = seen_products[item['course_id']]
+        product = seen_products.get(item['course_id'])
         
         # Sửa lỗi: Cộng dồn subtotal vào order_total
         order_total += item['subtotal']
 
+        if product is None:
+            # Khóa học không còn trong danh mục: chỉ hiển thị thông tin lưu trong giỏ
+            cart_detail += (
+                f"STT: {index}\n"
+                f"Mã khóa học: {item['course_id']}.\n"
+                f"Học phí: {item['price']:,.0f} VNĐ.\n\n"
+            )
+            index += 1
+            continue
+
         course_id = product["course_id"]
         course_name = product["name"]
         
@@ -83,6 +94,29 @@ def _return_cart(
     
     return cart_detail
 
+def _cart_reply(title: str, cart_detail: str, state: AgentState) -> str:
+    """
+    Câu trả lời hoàn chỉnh cho khách sau khi giỏ hàng thay đổi, dùng khi tool trả về trực tiếp.
+
+    Args:
+        title (str): Câu mở đầu, ví dụ "Dạ, em đã thêm khóa học ... vào giỏ hàng ạ.".
+        cart_detail (str): Chi tiết giỏ hàng từ `_return_cart`.
+        state (AgentState): Trạng thái hiện tại để xác định thông tin liên hệ còn thiếu.
+
+    Returns:
+        str: Câu trả lời gửi cho khách.
+    """
+    missing = [
+        label for key, label in (("name", "họ tên"), ("phone_number", "số điện thoại"), ("email", "email"))
+        if not state.get(key)
+    ]
+    reply = f"{title} Đây là giỏ hàng hiện tại của anh/chị:\n\n{cart_detail}\n"
+    if missing:
+        reply += f"Để em lên đơn, anh/chị cho em xin {', '.join(missing)} được không ạ?"
+    else:
+        reply += "Anh/chị kiểm tra giúp em, nếu thông tin đã đúng em sẽ lên đơn ngay ạ."
+    return reply
+
 @tool
 def add_item_cart_tool(
     course_id: Annotated[Optional[int], (
@@ -122,8 +156,18 @@ def add_item_cart_tool(
     
     try:
         logger.info("seen_products có sản phẩm và xác định được course_id")
+        seen_products = course_catalog.resolve(state["seen_products"])
+        if course_id not in seen_products:
+            logger.info(f"Không tìm thấy khóa học {course_id} trong seen_products")
+            return Command(
+                update=build_update(
+                    content="Không thể xác định được sản phẩm khách muốn mua, hỏi lại khách",
+                    tool_call_id=tool_call_id
+                )
+            )
+
         cart = state["cart"].copy() if state["cart"] is not None else {}
-        price = state["seen_products"][course_id]["price"]
+        price = seen_products[course_id]["price"]
         
         cart[course_id] = Cart(
             course_id=course_id,
@@ -132,7 +176,7 @@ def add_item_cart_tool(
         )
         
         cart_detail = _return_cart(
-            seen_products=state["seen_products"],
+            seen_products=seen_products,
             cart=cart,
             name=state["name"],
             phone_number=state["phone_number"],
@@ -154,6 +198,11 @@ def add_item_cart_tool(
                     "tool nào nữa và phải dừng lại và tạo phản hồi để khách xác nhận.\n"
                 ),
                 tool_call_id=tool_call_id,
+                artifact=_cart_reply(
+                    f"Dạ, em đã thêm khóa học {seen_products[course_id]['name']} vào giỏ hàng ạ.",
+                    cart_detail,
+                    state
+                ),
                 cart=cart
             )
         )
@@ -211,6 +260,7 @@ def cancel_item_cart_tool(
     
     try:
         logger.info("Đã có đầy đủ thông tin để xoá sản phẩm khỏi giỏ hàng")
+        seen_products = course_catalog.resolve(state["seen_products"])
         del cart[course_id]
         
         if not cart:
@@ -219,12 +269,13 @@ def cancel_item_cart_tool(
                 update=build_update(
                     content="Xoá sản phẩm khỏi giỏ hàng thành công. Giỏ hàng hiện tại trống. Hỏi khách có muốn xem sản phẩm nào không",
                     tool_call_id=tool_call_id,
+                    artifact="Dạ, em đã xoá khóa học khỏi giỏ hàng, giỏ hàng của anh/chị hiện đang trống ạ. Anh/chị có muốn em tư vấn thêm khóa học nào không ạ?",
                     cart=cart
                 )
             )
         
         cart_detail = _return_cart(
-            seen_products=state["seen_products"],
+            seen_products=seen_products,
             cart=cart,
             name=state["name"],
             phone_number=state["phone_number"],
@@ -244,6 +295,11 @@ def cancel_item_cart_tool(
                     "tool nào nữa và phải dừng lại và tạo phản hồi để khách xác nhận.\n"
                 ),
                 tool_call_id=tool_call_id,
+                artifact=_cart_reply(
+                    f"Dạ, em đã xoá khóa học {seen_products.get(course_id, {}).get('name', course_id)} khỏi giỏ hàng ạ.",
+                    cart_detail,
+                    state
+                ),
                 cart=cart
             )
         )
@@ -301,7 +357,17 @@ def alter_item_cart_tool(
     
     try:
         logger.info("Đã có đầy đủ thông tin để thay đổi sản phẩm trong giỏ hàng")
-        price = state["seen_products"][course_id]["price"]
+        seen_products = course_catalog.resolve(state["seen_products"])
+        if course_id not in seen_products:
+            logger.info(f"Không tìm thấy khóa học {course_id} trong seen_products")
+            return Command(
+                update=build_update(
+                    content="Không xác định được sản phẩm khách muốn thay đổi trong giỏ hàng, nói khách miêu tả rõ hơn",
+                    tool_call_id=tool_call_id
+                )
+            )
+
+        price = seen_products[course_id]["price"]
         
         cart[course_id] = Cart(
             course_id=course_id,
@@ -310,7 +376,7 @@ def alter_item_cart_tool(
         )
         
         cart_detail = _return_cart(
-            seen_products=state["seen_products"],
+            seen_products=seen_products,
             cart=cart,
             name=state["name"],
             phone_number=state["phone_number"],
@@ -367,7 +433,7 @@ def alter_cart_tool(
     try:
         logger.info("Đã có giỏ hàng để thay đổi")
         cart_detail = _return_cart(
-            seen_products=state["seen_products"],
+            seen_products=course_catalog.resolve(state["seen_products"]),
             cart=cart,
             name=state["name"],
             phone_number=state["phone_number"],
@@ -6,6 +6,7 @@ from typing import Annotated, Optional
 
 from core.graph.state import AgentState
 from database.connection import supabase_client
+from database.session_store import invalidate_session
 from core.utils.tool_function import build_update
 
 from log.logger_config import setup_logging
@@ -77,6 +78,7 @@ def modify_customer_tool(
             .execute()
         )
         updated_info = response.data[0]
+        invalidate_session(state.get("chat_id"))
         
         if not updated_info:
             logger.error("Xảy ra lỗi ở cấp DB -> Không thể cập nhật khách")
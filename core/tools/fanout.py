@@ -0,0 +1,62 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from dotenv import load_dotenv
+
+from core.utils.metrics import metrics
+
+load_dotenv()
+
+# Số tool tối đa chạy song song cho các tool call trong cùng một lượt của một chat
+TOOL_FANOUT_LIMIT = int(os.getenv("TOOL_FANOUT_LIMIT", "3"))
+
+
+class ToolFanout:
+    """
+    Giới hạn số tool bất đồng bộ chạy cùng lúc cho mỗi chat.
+
+    `ToolNode` chạy mọi tool call của một AIMessage song song bằng `asyncio.gather`;
+    các lượt của một chat đã được xử lý tuần tự nên giới hạn theo `chat_id` chính là
+    giới hạn fan-out của một lượt. Semaphore được xóa khi không còn tool nào dùng.
+    """
+
+    def __init__(self, limit: int = TOOL_FANOUT_LIMIT):
+        self.limit = max(limit, 1)
+        self._slots: dict[str, list] = {}
+        self.running = 0
+
+    @asynccontextmanager
+    async def slot(self, chat_id: Optional[str]) -> AsyncIterator[None]:
+        """
+        Chiếm một suất chạy tool cho `chat_id`, chờ nếu lượt hiện tại đã đủ `limit` tool.
+
+        Args:
+            chat_id (Optional[str]): ID cuộc hội thoại; rỗng thì dùng chung một nhóm.
+        """
+        key = chat_id or ""
+        entry = self._slots.get(key)
+        if entry is None:
+            entry = self._slots[key] = [asyncio.Semaphore(self.limit), 0]
+        entry[1] += 1
+
+        started = time.perf_counter()
+        try:
+            async with entry[0]:
+                metrics.observe("tools.fanout_wait", time.perf_counter() - started)
+                self.running += 1
+                try:
+                    yield
+                finally:
+                    self.running -= 1
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and self._slots.get(key) is entry:
+                del self._slots[key]
+
+
+tool_fanout = ToolFanout()
+
+metrics.register_gauge("tools.running", lambda: tool_fanout.running)
+metrics.register_gauge("tools.fanout_limit", lambda: tool_fanout.limit)
@@ -6,13 +6,12 @@ import json
 import os
 from log.logger_config import setup_logging # <-- Thêm import logger
 import random
+from database.http_pool import http_session
 logger = setup_logging(__name__) # <-- Khởi tạo logger
 
 LARK_WEBHOOK_URL = os.getenv("LARK_WEBHOOK_URL")
 agent = ["Đạt CSKH", "Long CSKH", "Sinh CSKH"]
-customer_agent = random.choice(agent)
 admin = ["Đạt R&D", "Long R&D", "Sinh R&D"]
-admin_agent = random.choice(admin)
 
 @tool
 def send_cskh_notification_tool(
@@ -33,6 +32,8 @@ def send_cskh_notification_tool(
     # --- KẾT THÚC THAY ĐỔI ---
 
     try:
+        # Chọn nhân viên cho từng thông báo
+        customer_agent = random.choice(agent)
         payload = {
             "msg_type": "interactive",
             "card": {
@@ -62,7 +63,7 @@ def send_cskh_notification_tool(
             }
         }
         
-        response = requests.post(LARK_WEBHOOK_URL, json=payload)
+        response = http_session.post(LARK_WEBHOOK_URL, json=payload, timeout=10)
         
         response.raise_for_status()  # Dòng này sẽ báo lỗi nếu status code là 4xx hoặc 5xx
         
@@ -99,6 +100,7 @@ def send_altercourse_notification_tool(
     logger.info(f"Đang gửi thông báo đến Lark Webhook: ...{LARK_WEBHOOK_URL[-10:]}")
 
     try:
+        admin_agent = random.choice(admin)
         payload = {
             "msg_type": "interactive",
             "card": {
@@ -123,7 +125,7 @@ def send_altercourse_notification_tool(
             }
         }
         
-        response = requests.post(LARK_WEBHOOK_URL, json=payload)
+        response = http_session.post(LARK_WEBHOOK_URL, json=payload, timeout=10)
         
         response.raise_for_status()  # Dòng này sẽ báo lỗi nếu status code là 4xx hoặc 5xx
         
@@ -8,12 +8,17 @@ from typing import Optional, Annotated
 from database.connection import supabase_client
 from core.utils.tool_function import build_update
 from core.graph.state import AgentState, Order, OrderItem, Cart
+from core.utils.course_catalog import course_catalog
 from core.tools.notification_tool import send_altercourse_notification_tool
 from log.logger_config import setup_logging
 from connection.order_connect import OrderSheetLogger 
+from database.lazy_client import LazyClient
 
 logger = setup_logging(__name__)
 
+# Kết nối Google Sheets (Order) một lần, ở lần ghi đầu tiên
+order_sheet_logger = LazyClient(OrderSheetLogger)
+
 def _get_first_schedule_start_date(course_id: int) -> Optional[str]:
     """
     Lấy ngày khai giảng (start_date) sớm nhất của một khóa học.
@@ -375,7 +380,17 @@ def add_order_tool(
         # 1. Tính tổng giá trị giỏ hàng
         order_total = 0
         total_discount_amount = 0
-        seen_products = state.get("seen_products", {})
+        seen_products = course_catalog.resolve(state.get("seen_products"))
+        unresolved = [item["course_id"] for item in cart.values() if item["course_id"] not in seen_products]
+        if unresolved:
+            # Kiểm tra trước khi ghi đơn vào DB
+            logger.info(f"Không tìm thấy khóa học {unresolved} trong seen_products")
+            return Command(
+                update=build_update(
+                    content="Không thể xác định được sản phẩm khách muốn mua, hỏi lại khách",
+                    tool_call_id=tool_call_id
+                )
+            )
 
         for item in cart.values():
             course_id = item["course_id"]
@@ -462,12 +477,10 @@ def add_order_tool(
         
         logger.info(f"Đang ghi log đơn hàng {new_order_id} vào Google Sheets (Order)...")
         try:
-            order_sheet_logger = OrderSheetLogger()
-            
             course_names_list = [
-                state["seen_products"][item["course_id"]]["name"]
+                seen_products[item["course_id"]]["name"]
                 for item in cart.values()
-                if item["course_id"] in state["seen_products"]
+                if item["course_id"] in seen_products
             ]
             # Nối tên các khóa học lại, phân cách bởi dấu phẩy
             course_names_str = ", ".join(course_names_list)
@@ -497,7 +510,7 @@ def add_order_tool(
         has_location_info = False
         for item in cart.values():
             course_id = item["course_id"]
-            course_name = state["seen_products"][course_id]["name"]
+            course_name = seen_products[course_id]["name"]
             location_details = _get_location_for_order(course_id) # Gọi hàm đã được refactor
             if location_details:
                 location_info += f"Khóa học '{course_name}':\n{location_details}"
@@ -520,6 +533,12 @@ def add_order_tool(
                     "Thông báo thêm về việc trung tâm sẽ liên hệ để xác nhận và hướng dẫn thủ tục nhập học." # Thay đổi cho phù hợp ngữ cảnh khóa học
                 ),
                 tool_call_id=tool_call_id,
+                artifact=(
+                    "Dạ, em đã tạo đơn hàng thành công cho anh/chị ạ:\n\n"
+                    f"{order_detail}\n"
+                    f"{location_info}\n\n"
+                    "Trung tâm sẽ liên hệ với anh/chị để xác nhận và hướng dẫn thủ tục nhập học ạ."
+                ),
                 order=order_state,
                 cart={},
                 seen_products={}
@@ -656,6 +675,11 @@ def get_customer_orders_tool(
                     "đơn khách muốn chỉnh sửa"
                 ),
                 tool_call_id=tool_call_id,
+                artifact=(
+                    "Dạ, đây là các đơn hàng anh/chị có thể chỉnh sửa ạ:\n\n"
+                    f"{order_detail}\n\n"
+                    "Anh/chị muốn chỉnh sửa đơn nào ạ?"
+                ),
                 order=order_state
             )
         )
@@ -684,7 +708,7 @@ def alter_item_order_tool(
     logger.info("alter_item_order_tool được gọi")
     
     order_state = state.get("order", {})
-    seen_products = state.get("seen_products", {})
+    seen_products = course_catalog.resolve(state.get("seen_products"))
     customer_name = state.get("name")
     customer_phone = state.get("phone_number")
 
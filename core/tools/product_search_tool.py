@@ -1,13 +1,16 @@
 from langgraph.types import Command
 from langgraph.prebuilt import InjectedState
-from langchain_core.tools import tool, InjectedToolCallId
+from langchain_core.tools import StructuredTool, InjectedToolCallId
 
 import json
 from typing import Annotated, Optional, List
 import re
 from core.utils.tool_function import build_update
-from core.graph.state import AgentState, SeenProducts
+from core.graph.state import AgentState, CourseRef
+from core.utils.course_catalog import course_catalog
+from core.tools.fanout import tool_fanout
 from database.connection import supabase_client, embeddings_model
+from database.executor import run_db
 
 from log.logger_config import setup_logging
 
@@ -62,32 +65,117 @@ def parse_custom_string_to_dict(content: str) -> dict:
             
     return data
 
-def _update_seen_products(
-    seen_products: dict, 
-    products: List[dict]
-) -> dict:
+def _to_seen_products(products: List[dict]) -> dict[int, CourseRef]:
     """
-    Cập nhật `seen_products` trong state bằng kết quả khóa học trả về.
+    Lưu các khóa học trả về vào `course_catalog` và tạo phần cập nhật cho `seen_products`.
+
+    Chỉ trả về tham chiếu của các khóa học mới tìm thấy; reducer của `seen_products` gộp chúng
+    vào state, nhờ đó nhiều tool chạy song song trong một lượt không ghi đè kết quả của nhau.
     """
-    for prod in products:
-        course_id = prod.get("course_id")
-        
-        seen_products[course_id] = SeenProducts(
-            course_id=course_id,
-            name=prod.get("name"),
-            description=prod.get("description"),
-            type=prod.get("type"),
-            duration=prod.get("duration"), 
-            price=prod.get("price"),
-            sessions_per_week=prod.get("sessions_per_week"),
-            minutes_per_session=prod.get("minutes_per_session"),
-            instructor_name=prod.get("instructor_name")
+    return course_catalog.remember(products)
+
+def _courses_by_name(keywords: str):
+    return (
+        supabase_client.from_("courses_description").select("*")
+        .ilike('name', f'%{keywords}%')
+        .limit(5)
+    )
+
+def _match_courses(query_embedding: List[float]):
+    return supabase_client.rpc(
+        "match_courses",
+        {
+            "query_embedding": query_embedding,
+            "match_count": 5,
+            "filter": {}
+        }
+    )
+
+def _sql_courses_command(
+    db_result: List[dict],
+    state: AgentState,
+    tool_call_id: str
+) -> Command:
+    logger.info("Có dữ liệu trả về từ SQL")
+    
+    courses_summary = []
+    for course in db_result:
+        courses_summary.append(
+            f"- {course.get('name')}: {course.get('description')}"
+        )
+    
+    formatted_response = (
+        "Đây là các khóa học tìm thấy dựa trên yêu cầu của bạn:\n"
+        f"{' '.join(courses_summary)}\n\n"
+        "Em sẽ tóm gọn lại thông tin khóa học một cách ngắn gọn và dễ hiểu nhé.\n"
+    )
+    
+    if state.get("phone_number"):
+        formatted_response += "Anh/chị có muốn đăng ký khóa học nào không ạ?"
+    else:
+        formatted_response += "Để tiện tư vấn đăng ký, anh/chị có thể cho em xin số điện thoại được không ạ?"
+    
+    logger.info("Trả về kết quả từ SQL")
+    return Command(
+        update=build_update(
+            content=formatted_response,
+            tool_call_id=tool_call_id,
+            seen_products=_to_seen_products(db_result)
+        )
+    )
+
+def _rag_courses_command(
+    rag_results: Optional[List[dict]],
+    tool_call_id: str
+) -> Command:
+    if not rag_results:
+        logger.info("Không có kết quả từ RAG")
+        return Command(update=build_update(
+            content="Xin lỗi, em không tìm thấy thông tin nào liên quan đến câu hỏi của anh/chị.",
+            tool_call_id=tool_call_id
+        ))
+
+    logger.info("Có kết quả trả về từ RAG")
+    products = []
+    for item in rag_results:
+        content = item.get("content")
+        if content and isinstance(content, str):
+            # Sử dụng hàm parse_custom_string_to_dict thay vì json.loads
+            parsed_data = parse_custom_string_to_dict(content)
+            if parsed_data:
+                products.append(parsed_data)
+            else:
+                logger.warning(f"Bỏ qua content không thể phân tích từ RAG: {content}")
+    
+    if not products:
+        logger.info("Không thể parse sản phẩm từ kết quả RAG")
+        return Command(update=build_update(
+            content="Xin lỗi, em không thể xác định được thông tin khóa học từ kết quả tìm kiếm.",
+            tool_call_id=tool_call_id
+        ))
+    
+    courses_summary_rag = []
+    for course in products:
+        courses_summary_rag.append(
+            f"- {course.get('name')}: {course.get('description')}"
+        )
+    
+    formatted_response = (
+        "Dưới đây là các khóa học phù hợp với yêu cầu của anh/chị ạ:\n\n"
+        f"{' '.join(courses_summary_rag)}\n"
+        "Em sẽ tóm tắt ngắn gọn để anh/chị dễ nắm thông tin nhé."
+    )
+    
+    logger.info("Trả về kết quả từ RAG")
+    return Command(
+        update=build_update(
+            content=formatted_response,
+            tool_call_id=tool_call_id,
+            seen_products=_to_seen_products(products)
         )
-        # --- KẾT THÚC THAY ĐỔI ---
-    return seen_products
+    )
 
-@tool
-def get_courses_tool(
+def get_courses(
     keywords: Annotated[str, "Từ khóa tìm kiếm khóa học mà nguời dùng cung cấp"],
     state: Annotated[AgentState, InjectedState],
     tool_call_id: Annotated[str, InjectedToolCallId]
@@ -104,122 +192,102 @@ def get_courses_tool(
     logger.info(f"get_courses_tool được gọi với keywords: {keywords}")
     # --- SQL First Approach ---
     try:
-        response = (
-            supabase_client.from_("courses_description").select("*")
-            .ilike('name', f'%{keywords}%')
-            .limit(5).execute()
-        )
-     
-        db_result = response.data
-
+        db_result = _courses_by_name(keywords).execute().data
         if db_result:
-            logger.info("Có dữ liệu trả về từ SQL")
-            
-            updated_seen_products = _update_seen_products(
-                seen_products=state["seen_products"] if state["seen_products"] is not None else {},
-                products=db_result
-            )
-            
-            courses_summary = []
-            for course in db_result:
-                courses_summary.append(
-                    f"- {course.get('name')}: {course.get('description')}"
-                )
-            
-            formatted_response = (
-                "Đây là các khóa học tìm thấy dựa trên yêu cầu của bạn:\n"
-                f"{' '.join(courses_summary)}\n\n"
-                "Em sẽ tóm gọn lại thông tin khóa học một cách ngắn gọn và dễ hiểu nhé.\n"
-            )
-            
-            if state.get("phone_number"):
-                formatted_response += "Anh/chị có muốn đăng ký khóa học nào không ạ?"
-            else:
-                formatted_response += "Để tiện tư vấn đăng ký, anh/chị có thể cho em xin số điện thoại được không ạ?"
-            
-            logger.info("Trả về kết quả từ SQL")
-            return Command(
-                update=build_update(
-                    content=formatted_response,
-                    tool_call_id=tool_call_id,
-                    seen_products=updated_seen_products
-                )
-            )
+            return _sql_courses_command(db_result, state, tool_call_id)
             
         logger.info("Không có kết quả từ SQL, chuyển sang tìm kiếm RAG")
-        query = f"{state["user_input"]}. {keywords}"
-        query_embedding = embeddings_model.embed_query(query)
-        
-        response = supabase_client.rpc(
-            "match_courses",
-            {
-                "query_embedding": query_embedding,
-                "match_count": 5,
-                "filter": {}
-            }
-        ).execute()
-
-        rag_results = response.data
-        
-        if not rag_results:
-            logger.info("Không có kết quả từ RAG")
-            return Command(update=build_update(
-                content="Xin lỗi, em không tìm thấy thông tin nào liên quan đến câu hỏi của anh/chị.",
-                tool_call_id=tool_call_id
-            ))
-
-        logger.info("Có kết quả trả về từ RAG")
-        products = []
-        for item in rag_results:
-            content = item.get("content")
-            if content and isinstance(content, str):
-                # Sử dụng hàm parse_custom_string_to_dict thay vì json.loads
-                parsed_data = parse_custom_string_to_dict(content)
-                if parsed_data:
-                    products.append(parsed_data)
-                else:
-                    logger.warning(f"Bỏ qua content không thể phân tích từ RAG: {content}")
-        
-        if not products:
-            logger.info("Không thể parse sản phẩm từ kết quả RAG")
-            return Command(update=build_update(
-                content="Xin lỗi, em không thể xác định được thông tin khóa học từ kết quả tìm kiếm.",
-                tool_call_id=tool_call_id
-            ))
+        query_embedding = embeddings_model.embed_query(f"{state["user_input"]}. {keywords}")
+        rag_results = _match_courses(query_embedding).execute().data
+        return _rag_courses_command(rag_results, tool_call_id)
 
-        
-        updated_seen_products = _update_seen_products(
-            seen_products=state["seen_products"] if state["seen_products"] is not None else {}, 
-            products=products
-        )
-        
-        courses_summary_rag = []
-        for course in products:
-            courses_summary_rag.append(
-                f"- {course.get('name')}: {course.get('description')}"
-            )
-        
-        formatted_response = (
-            "Dưới đây là các khóa học phù hợp với yêu cầu của anh/chị ạ:\n\n"
-            f"{' '.join(courses_summary_rag)}\n"
-            "Em sẽ tóm tắt ngắn gọn để anh/chị dễ nắm thông tin nhé."
-        )
-        
-        logger.info("Trả về kết quả từ RAG")
-        return Command(
-            update=build_update(
-                content=formatted_response,
-                tool_call_id=tool_call_id,
-                seen_products=updated_seen_products
-            )
-        )
+    except Exception as e:
+        logger.error(f"Lỗi: {e}")
+        raise
+
+async def aget_courses(
+    keywords: Annotated[str, "Từ khóa tìm kiếm khóa học mà nguời dùng cung cấp"],
+    state: Annotated[AgentState, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId]
+) -> Command:
+    """
+    Phiên bản bất đồng bộ của `get_courses`: truy vấn qua `run_db` và `aembed_query`.
+    """
+    logger.info(f"get_courses_tool được gọi với keywords: {keywords}")
+    try:
+        async with tool_fanout.slot(state.get("chat_id")):
+            db_result = (await run_db(_courses_by_name(keywords).execute)).data
+            if db_result:
+                return _sql_courses_command(db_result, state, tool_call_id)
+                
+            logger.info("Không có kết quả từ SQL, chuyển sang tìm kiếm RAG")
+            query_embedding = await embeddings_model.aembed_query(f"{state["user_input"]}. {keywords}")
+            rag_results = (await run_db(_match_courses(query_embedding).execute)).data
+            return _rag_courses_command(rag_results, tool_call_id)
 
     except Exception as e:
         logger.error(f"Lỗi: {e}")
         raise
 
-@tool
-def get_schedule_tool(
+get_courses_tool = StructuredTool.from_function(
+    func=get_courses,
+    coroutine=aget_courses,
+    name="get_courses_tool"
+)
+
+def _schedules_by_course(course_id: int):
+    return (
+        supabase_client.table("schedules")
+        .select("*")
+        .eq("course_id", course_id)
+    )
+
+def _missing_course_command(tool_call_id: str) -> Command:
+    return Command(update=build_update(
+        content="Không xác định được khóa học, hãy hỏi lại khách hàng xem họ muốn xem lịch học của khóa nào.",
+        tool_call_id=tool_call_id
+    ))
+
+def _schedule_command(schedules: Optional[List[dict]], tool_call_id: str) -> Command:
+    if not schedules:
+        return Command(update=build_update(
+            content=f"Xin lỗi, hiện tại chưa có lịch học cho khóa học này. Em sẽ cập nhật sớm nhất ạ.",
+            tool_call_id=tool_call_id
+        ))
+
+    formatted_schedules = ""
+    for i, schedule in enumerate(schedules):
+        start_date = schedule.get('start_date')
+        end_date = schedule.get('end_date')
+        days_of_week = schedule.get('days_of_week')
+        time = schedule.get('time')
+        mode = schedule.get('mode')
+        location_link = schedule.get('location_link')
+
+        formatted_schedules += (
+            f"Lịch học {i+1}:\n"
+            f"- Hình thức: {mode}\n"
+            f"- Thời gian: {time}, các ngày {days_of_week}\n"
+            f"- Khai giảng: {start_date}\n"
+            f"- Kết thúc: {end_date}\n"
+            f"- Địa điểm/Link học: {location_link}\n\n"
+        )
+
+    reply = f"Dạ, đây là lịch học chi tiết của khóa học ạ:\n\n{formatted_schedules}"
+    return Command(update=build_update(
+        content=reply,
+        tool_call_id=tool_call_id,
+        artifact=reply
+    ))
+
+def _schedule_error_command(e: Exception, tool_call_id: str) -> Command:
+    logger.error(f"Lỗi khi truy vấn lịch học: {e}")
+    return Command(update=build_update(
+        content="Đã có lỗi xảy ra khi em tra cứu lịch học, anh/chị vui lòng thử lại sau nhé.",
+        tool_call_id=tool_call_id
+    ))
+
+def get_schedule(
     course_id: Annotated[int, "ID của khóa học cần truy vấn lịch học."],
     state: Annotated[AgentState, InjectedState],
     tool_call_id: Annotated[str, InjectedToolCallId]
@@ -230,59 +298,73 @@ def get_schedule_tool(
     logger.info(f"get_schedule_tool được gọi với course_id: {course_id}")
     
     if not course_id:
-        return Command(update=build_update(
-            content="Không xác định được khóa học, hãy hỏi lại khách hàng xem họ muốn xem lịch học của khóa nào.",
-            tool_call_id=tool_call_id
-        ))
+        return _missing_course_command(tool_call_id)
 
     try:
-        response = (
-            supabase_client.table("schedules")
-            .select("*")
-            .eq("course_id", course_id)
-            .execute()
-        )
-        
-        schedules = response.data
-        
-        if not schedules:
-            return Command(update=build_update(
-                content=f"Xin lỗi, hiện tại chưa có lịch học cho khóa học này. Em sẽ cập nhật sớm nhất ạ.",
-                tool_call_id=tool_call_id
-            ))
-
-        formatted_schedules = ""
-        for i, schedule in enumerate(schedules):
-            start_date = schedule.get('start_date')
-            end_date = schedule.get('end_date')
-            days_of_week = schedule.get('days_of_week')
-            time = schedule.get('time')
-            mode = schedule.get('mode')
-            location_link = schedule.get('location_link')
-
-            formatted_schedules += (
-                f"Lịch học {i+1}:\n"
-                f"- Hình thức: {mode}\n"
-                f"- Thời gian: {time}, các ngày {days_of_week}\n"
-                f"- Khai giảng: {start_date}\n"
-                f"- Kết thúc: {end_date}\n"
-                f"- Địa điểm/Link học: {location_link}\n\n"
-            )
+        schedules = _schedules_by_course(course_id).execute().data
+        return _schedule_command(schedules, tool_call_id)
 
-        return Command(update=build_update(
-            content=f"Dạ, đây là lịch học chi tiết của khóa học ạ:\n\n{formatted_schedules}",
-            tool_call_id=tool_call_id
-        ))
+    except Exception as e:
+        return _schedule_error_command(e, tool_call_id)
+
+async def aget_schedule(
+    course_id: Annotated[int, "ID của khóa học cần truy vấn lịch học."],
+    state: Annotated[AgentState, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId]
+) -> Command:
+    """
+    Phiên bản bất đồng bộ của `get_schedule`.
+    """
+    logger.info(f"get_schedule_tool được gọi với course_id: {course_id}")
+    
+    if not course_id:
+        return _missing_course_command(tool_call_id)
+
+    try:
+        async with tool_fanout.slot(state.get("chat_id")):
+            schedules = (await run_db(_schedules_by_course(course_id).execute)).data
+        return _schedule_command(schedules, tool_call_id)
 
     except Exception as e:
-        logger.error(f"Lỗi khi truy vấn lịch học: {e}")
-        return Command(update=build_update(
-            content="Đã có lỗi xảy ra khi em tra cứu lịch học, anh/chị vui lòng thử lại sau nhé.",
+        return _schedule_error_command(e, tool_call_id)
+
+get_schedule_tool = StructuredTool.from_function(
+    func=get_schedule,
+    coroutine=aget_schedule,
+    name="get_schedule_tool"
+)
+
+def _match_qna(query_embedding: List[float]):
+    return supabase_client.rpc(
+        "match_qna",
+        {
+            "query_embedding": query_embedding,
+            "match_count": 3,
+            "filter": {}
+        }
+    )
+
+def _qna_command(data: Optional[List[dict]], tool_call_id: str) -> Command:
+    if not data:   # ✅ sửa lại check lỗi
+        logger.warning("Không có dữ liệu trả về từ RPC match_qna")
+        return Command(
+            update=build_update(
+                content="Xin lỗi, em không tìm thấy thông tin nào liên quan đến câu hỏi của anh/chị.",
+                tool_call_id=tool_call_id
+            )
+        )
+
+    all_documents = [item.get("content", "") for item in data]
+    
+    logger.info(f"Tìm thấy {len(all_documents)} tài liệu Q&A")
+    return Command(
+        update=build_update(
+            content=f"Đây là các thông tin tôi tìm thấy liên quan đến câu hỏi của bạn: {all_documents}",
             tool_call_id=tool_call_id
-        ))
+        )
+    )
 
-@tool
-def get_qna_tool(
+def get_qna(
     state: Annotated[AgentState, InjectedState],
     tool_call_id: Annotated[str, InjectedToolCallId]
 ) -> Command:
@@ -292,46 +374,92 @@ def get_qna_tool(
     """
     query = state["user_input"]
     logger.info(f"get_qna_tool được gọi với query: {query}")
-    all_documents = []
     
     try:
         query_embedding = embeddings_model.embed_query(query)
+        return _qna_command(_match_qna(query_embedding).execute().data, tool_call_id)
+             
+    except Exception as e:
+        logger.error(f"Lỗi: {e}")
+        raise
 
-        response = supabase_client.rpc(
-            "match_qna",
-            {
-                "query_embedding": query_embedding,
-                "match_count": 3,
-                "filter": {}
-            }
-        ).execute()
-
-        if not response.data:   # ✅ sửa lại check lỗi
-            logger.warning("Không có dữ liệu trả về từ RPC match_qna")
-            return Command(
-                update=build_update(
-                    content="Xin lỗi, em không tìm thấy thông tin nào liên quan đến câu hỏi của anh/chị.",
-                    tool_call_id=tool_call_id
-                )
-            )
-
-        for item in response.data:
-            all_documents.append(item.get("content", ""))
-        
-        logger.info(f"Tìm thấy {len(all_documents)} tài liệu Q&A")
-        return Command(
-            update=build_update(
-                content=f"Đây là các thông tin tôi tìm thấy liên quan đến câu hỏi của bạn: {all_documents}",
-                tool_call_id=tool_call_id
-            )
-        )
+async def aget_qna(
+    state: Annotated[AgentState, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId]
+) -> Command:
+    """
+    Phiên bản bất đồng bộ của `get_qna`.
+    """
+    query = state["user_input"]
+    logger.info(f"get_qna_tool được gọi với query: {query}")
+    
+    try:
+        async with tool_fanout.slot(state.get("chat_id")):
+            query_embedding = await embeddings_model.aembed_query(query)
+            response = await run_db(_match_qna(query_embedding).execute)
+        return _qna_command(response.data, tool_call_id)
              
     except Exception as e:
         logger.error(f"Lỗi: {e}")
         raise
 
-@tool
-def get_promotions_tool(
+get_qna_tool = StructuredTool.from_function(
+    func=get_qna,
+    coroutine=aget_qna,
+    name="get_qna_tool"
+)
+
+def _promotional_courses():
+    return (
+        supabase_client.from_("courses_description")
+        .select("course_id, name, price, promotion")
+        .gt("promotion", 0)  # Lấy các khóa có promotion > 0
+        .limit(10)
+    )
+
+def _no_promotion_command(tool_call_id: str) -> Command:
+    logger.info("Không tìm thấy khóa học nào có khuyến mãi.")
+    return Command(update=build_update(
+        content="Dạ hiện tại trung tâm chưa có chương trình ưu đãi đặc biệt nào ạ. Tuy nhiên, anh/chị có thể tham khảo các khóa học chất lượng cao của bên em nhé.",
+        tool_call_id=tool_call_id
+    ))
+
+def _promotions_command(
+    promotional_courses: List[dict],
+    full_details: List[dict],
+    tool_call_id: str
+) -> Command:
+    # Tạo chuỗi phản hồi cho người dùng
+    response_lines = ["Dạ hiện tại trung tâm đang có các ưu đãi hấp dẫn cho những khóa học sau ạ:"]
+    for course in promotional_courses:
+        original_price = course.get("price", 0)
+        promotion_rate = course.get("promotion", 0.0)
+        discounted_price = original_price * (1 - promotion_rate)
+        response_lines.append(
+            f"- Khóa học '{course.get('name')}': Giảm {promotion_rate:.0%}, "
+            f"giá gốc {original_price:,.0f} VNĐ chỉ còn **{discounted_price:,.0f} VNĐ**."
+        )
+    
+    response_lines.append("\nAnh/chị quan tâm đến khóa học nào để em tư vấn chi tiết hơn ạ?")
+    formatted_response = "\n".join(response_lines)
+    
+    logger.info(f"Tìm thấy {len(promotional_courses)} khóa học có khuyến mãi.")
+    return Command(
+        update=build_update(
+            content=formatted_response,
+            tool_call_id=tool_call_id,
+            seen_products=_to_seen_products(full_details)
+        )
+    )
+
+def _promotions_error_command(e: Exception, tool_call_id: str) -> Command:
+    logger.error(f"Lỗi khi truy vấn khuyến mãi: {e}")
+    return Command(update=build_update(
+        content="Đã có lỗi xảy ra khi em tra cứu thông tin ưu đãi, anh/chị vui lòng thử lại sau nhé.",
+        tool_call_id=tool_call_id
+    ))
+
+def get_promotions(
     state: Annotated[AgentState, InjectedState],
     tool_call_id: Annotated[str, InjectedToolCallId]
 ) -> Command:
@@ -341,57 +469,41 @@ def get_promotions_tool(
     """
     logger.info("get_promotions_tool được gọi")
     try:
-        response = (
-            supabase_client.from_("courses_description")
-            .select("course_id, name, price, promotion")
-            .gt("promotion", 0)  # Lấy các khóa có promotion > 0
-            .limit(10)
-            .execute()
-        )
-
-        promotional_courses = response.data
+        promotional_courses = _promotional_courses().execute().data
         if not promotional_courses:
-            logger.info("Không tìm thấy khóa học nào có khuyến mãi.")
-            return Command(update=build_update(
-                content="Dạ hiện tại trung tâm chưa có chương trình ưu đãi đặc biệt nào ạ. Tuy nhiên, anh/chị có thể tham khảo các khóa học chất lượng cao của bên em nhé.",
-                tool_call_id=tool_call_id
-            ))
+            return _no_promotion_command(tool_call_id)
 
         # Lấy thông tin chi tiết của các khóa học có khuyến mãi để cập nhật state
         full_details_ids = [course['course_id'] for course in promotional_courses]
-        full_details_res = supabase_client.from_("courses_description").select("*").in_("course_id", full_details_ids).execute()
-        
-        updated_seen_products = _update_seen_products(
-            seen_products=(state.get("seen_products") or {}).copy(),
-            products=full_details_res.data
-        )
+        full_details = course_catalog.fetch_rows(full_details_ids)
+        return _promotions_command(promotional_courses, full_details, tool_call_id)
 
-        # Tạo chuỗi phản hồi cho người dùng
-        response_lines = ["Dạ hiện tại trung tâm đang có các ưu đãi hấp dẫn cho những khóa học sau ạ:"]
-        for course in promotional_courses:
-            original_price = course.get("price", 0)
-            promotion_rate = course.get("promotion", 0.0)
-            discounted_price = original_price * (1 - promotion_rate)
-            response_lines.append(
-                f"- Khóa học '{course.get('name')}': Giảm {promotion_rate:.0%}, "
-                f"giá gốc {original_price:,.0f} VNĐ chỉ còn **{discounted_price:,.0f} VNĐ**."
-            )
-        
-        response_lines.append("\nAnh/chị quan tâm đến khóa học nào để em tư vấn chi tiết hơn ạ?")
-        formatted_response = "\n".join(response_lines)
-        
-        logger.info(f"Tìm thấy {len(promotional_courses)} khóa học có khuyến mãi.")
-        return Command(
-            update=build_update(
-                content=formatted_response,
-                tool_call_id=tool_call_id,
-                seen_products=updated_seen_products
-            )
-        )
+    except Exception as e:
+        return _promotions_error_command(e, tool_call_id)
+
+async def aget_promotions(
+    state: Annotated[AgentState, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId]
+) -> Command:
+    """
+    Phiên bản bất đồng bộ của `get_promotions`.
+    """
+    logger.info("get_promotions_tool được gọi")
+    try:
+        async with tool_fanout.slot(state.get("chat_id")):
+            promotional_courses = (await run_db(_promotional_courses().execute)).data
+            if not promotional_courses:
+                return _no_promotion_command(tool_call_id)
+
+            full_details_ids = [course['course_id'] for course in promotional_courses]
+            full_details = await course_catalog.afetch_rows(full_details_ids)
+        return _promotions_command(promotional_courses, full_details, tool_call_id)
 
     except Exception as e:
-        logger.error(f"Lỗi khi truy vấn khuyến mãi: {e}")
-        return Command(update=build_update(
-            content="Đã có lỗi xảy ra khi em tra cứu thông tin ưu đãi, anh/chị vui lòng thử lại sau nhé.",
-            tool_call_id=tool_call_id
-        ))
\ No newline at end of file
+        return _promotions_error_command(e, tool_call_id)
+
+get_promotions_tool = StructuredTool.from_function(
+    func=get_promotions,
+    coroutine=aget_promotions,
+    name="get_promotions_tool"
+)
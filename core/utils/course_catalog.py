@@ -0,0 +1,183 @@
+"""
+Bộ đệm danh mục khóa học dùng chung trong process.
+
+`AgentState.seen_products` chỉ giữ tham chiếu `{course_id: {"course_id", "version"}}`; bản ghi
+đầy đủ (tên, mô tả, giá...) nằm ở đây và được tra lại khi tool hoặc prompt cần. `version` là dấu
+băm ngắn của bản ghi lúc khách xem, dùng để phát hiện khóa học đã thay đổi (ví dụ giá) từ đó.
+Bản ghi chưa có trong bộ đệm (sau khi restart, hết hạn) được nạp lại từ `courses_description`.
+"""
+import os
+import json
+import hashlib
+import threading
+from typing import Iterable, List, Optional
+from cachetools import TTLCache
+from dotenv import load_dotenv
+
+from core.graph.state import CourseRef, SeenProducts
+from core.utils.metrics import metrics
+from database.connection import supabase_client
+from database.executor import run_db
+from log.logger_config import setup_logging
+
+load_dotenv()
+
+logger = setup_logging(__name__)
+
+COURSE_CATALOG_TTL_SECONDS = int(os.getenv("COURSE_CATALOG_TTL_SECONDS", "3600"))
+COURSE_CATALOG_SIZE = int(os.getenv("COURSE_CATALOG_SIZE", "5000"))
+
+
+def _courses_by_ids(course_ids: List[int]):
+    return supabase_client.from_("courses_description").select("*").in_("course_id", course_ids)
+
+
+def _to_record(product: dict) -> SeenProducts:
+    return SeenProducts(
+        course_id=product.get("course_id"),
+        name=product.get("name"),
+        description=product.get("description"),
+        type=product.get("type"),
+        duration=product.get("duration"),
+        price=product.get("price"),
+        sessions_per_week=product.get("sessions_per_week"),
+        minutes_per_session=product.get("minutes_per_session"),
+        instructor_name=product.get("instructor_name")
+    )
+
+
+def _version(record: SeenProducts) -> str:
+    payload = json.dumps(record, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def _is_record(value: dict) -> bool:
+    # Checkpoint cũ lưu nguyên bản ghi thay vì tham chiếu
+    return "name" in value
+
+
+class CourseCatalog:
+    """
+    Bộ đệm `course_id -> (version, bản ghi)` có TTL, an toàn khi dùng từ nhiều thread
+    (tool đồng bộ chạy trong thread pool của LangGraph).
+    """
+
+    def __init__(self, ttl_seconds: int = COURSE_CATALOG_TTL_SECONDS, maxsize: int = COURSE_CATALOG_SIZE):
+        self._lock = threading.Lock()
+        self._courses: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl_seconds)
+
+    def _store(self, record: SeenProducts) -> CourseRef:
+        version = _version(record)
+        with self._lock:
+            self._courses[record["course_id"]] = (version, record)
+        return CourseRef(course_id=record["course_id"], version=version)
+
+    def remember(self, products: Iterable[dict]) -> dict[int, CourseRef]:
+        """
+        Lưu các khóa học vừa tìm thấy vào bộ đệm.
+
+        Args:
+            products (Iterable[dict]): Bản ghi khóa học từ DB hoặc từ RAG.
+
+        Returns:
+            dict[int, CourseRef]: Phần cập nhật cho `seen_products` (chỉ gồm tham chiếu).
+        """
+        refs = {}
+        for product in products:
+            if product.get("course_id") is None:
+                continue
+            ref = self._store(_to_record(product))
+            refs[ref["course_id"]] = ref
+        return refs
+
+    def _missing(self, seen_products: dict) -> list[int]:
+        with self._lock:
+            return [
+                course_id for course_id, value in seen_products.items()
+                if not _is_record(value) and course_id not in self._courses
+            ]
+
+    def _store_rows(self, rows: Optional[List[dict]]):
+        for row in rows or []:
+            self._store(_to_record(row))
+
+    def _lookup(self, seen_products: dict) -> dict[int, SeenProducts]:
+        resolved = {}
+        for course_id, value in seen_products.items():
+            if _is_record(value):
+                resolved[course_id] = value
+                continue
+
+            with self._lock:
+                cached = self._courses.get(course_id)
+            if cached is None:
+                metrics.incr("course_catalog.unresolved")
+                logger.warning(f"Không tìm thấy khóa học {course_id} trong danh mục")
+                continue
+
+            version, record = cached
+            if version != value.get("version"):
+                # Khóa học đã đổi từ lúc khách xem: dùng thông tin hiện tại
+                metrics.incr("course_catalog.stale")
+            resolved[course_id] = record
+        return resolved
+
+    def fetch_rows(self, course_ids: List[int]) -> List[dict]:
+        """
+        Đọc bản ghi đầy đủ của các khóa học từ `courses_description`.
+
+        Args:
+            course_ids (List[int]): Danh sách mã khóa học.
+
+        Returns:
+            List[dict]: Các dòng tìm thấy (khóa học không tồn tại bị bỏ qua).
+        """
+        return _courses_by_ids(course_ids).execute().data or []
+
+    async def afetch_rows(self, course_ids: List[int]) -> List[dict]:
+        """
+        Phiên bản bất đồng bộ của `fetch_rows`: truy vấn DB qua `run_db`.
+        """
+        return (await run_db(_courses_by_ids(course_ids).execute)).data or []
+
+    def resolve(self, seen_products: Optional[dict]) -> dict[int, SeenProducts]:
+        """
+        Đổi tham chiếu trong `seen_products` thành bản ghi đầy đủ, nạp từ DB các khóa học chưa có
+        trong bộ đệm.
+
+        Args:
+            seen_products (Optional[dict]): `state["seen_products"]`.
+
+        Returns:
+            dict[int, SeenProducts]: `course_id -> bản ghi`, bỏ qua khóa học không còn tồn tại.
+        """
+        if not seen_products:
+            return {}
+
+        missing = self._missing(seen_products)
+        if missing:
+            metrics.incr("course_catalog.miss", len(missing))
+            self._store_rows(self.fetch_rows(missing))
+        return self._lookup(seen_products)
+
+    async def aresolve(self, seen_products: Optional[dict]) -> dict[int, SeenProducts]:
+        """
+        Phiên bản bất đồng bộ của `resolve`: truy vấn DB qua `run_db`.
+        """
+        if not seen_products:
+            return {}
+
+        missing = self._missing(seen_products)
+        if missing:
+            metrics.incr("course_catalog.miss", len(missing))
+            self._store_rows(await self.afetch_rows(missing))
+        return self._lookup(seen_products)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._courses)
+
+
+course_catalog = CourseCatalog()
+
+metrics.register_gauge("course_catalog.size", course_catalog.size)
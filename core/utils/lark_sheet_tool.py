@@ -2,8 +2,8 @@
 
 import os
 import json
-import requests
 from core.graph.state import AgentState
+from database.http_pool import http_session
 from log.logger_config import setup_logging
 
 logger = setup_logging(__name__)
@@ -21,7 +21,7 @@ def _get_tenant_access_token():
     payload = {"app_id": APP_ID, "app_secret": APP_SECRET}
     
     try:
-        response = requests.post(url, headers=headers, json=payload)
+        response = http_session.post(url, headers=headers, json=payload, timeout=10)
         response.raise_for_status()
         data = response.json()
         if data.get("code") == 0:
@@ -66,7 +66,7 @@ def add_complaint_to_lark_sheet(state: AgentState) -> str | None:
     }
 
     try:
-        response = requests.post(url, headers=headers, json=payload)
+        response = http_session.post(url, headers=headers, json=payload, timeout=10)
         response.raise_for_status()
         data = response.json()
         
@@ -0,0 +1,79 @@
+import threading
+from typing import Any, Callable, Dict
+
+
+class MetricsRegistry:
+    """
+    Bộ đếm và thống kê thời gian đơn giản trong process, xuất ra dạng dict cho endpoint `/metrics`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._timings: Dict[str, dict] = {}
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+
+    def incr(self, name: str, value: float = 1):
+        """Tăng bộ đếm `name` thêm `value`."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float):
+        """Ghi nhận một giá trị thời gian (giây) cho `name`."""
+        with self._lock:
+            timing = self._timings.setdefault(
+                name, {"count": 0, "total": 0.0, "min": seconds, "max": seconds, "last": seconds}
+            )
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["min"] = min(timing["min"], seconds)
+            timing["max"] = max(timing["max"], seconds)
+            timing["last"] = seconds
+
+    def register_gauge(self, name: str, fn: Callable[[], Any]):
+        """Đăng ký một gauge, giá trị được tính lại mỗi lần lấy snapshot."""
+        with self._lock:
+            self._gauges[name] = fn
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def gauge(self, name: str) -> Any:
+        """Giá trị hiện tại của gauge `name`, hoặc None nếu chưa đăng ký / lỗi."""
+        with self._lock:
+            fn = self._gauges.get(name)
+        try:
+            return fn() if fn else None
+        except Exception:
+            return None
+
+    def snapshot(self) -> dict:
+        """
+        Lấy toàn bộ số liệu hiện tại.
+
+        Returns:
+            dict: Gồm `counters`, `timings` (kèm `avg`) và `gauges`.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {
+                name: {
+                    **{k: round(v, 4) if isinstance(v, float) else v for k, v in timing.items()},
+                    "avg": round(timing["total"] / timing["count"], 4),
+                }
+                for name, timing in self._timings.items()
+            }
+            gauges = dict(self._gauges)
+
+        gauge_values = {}
+        for name, fn in gauges.items():
+            try:
+                gauge_values[name] = fn()
+            except Exception as e:
+                gauge_values[name] = f"error: {e}"
+
+        return {"counters": counters, "timings": timings, "gauges": gauge_values}
+
+
+metrics = MetricsRegistry()
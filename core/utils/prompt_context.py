@@ -0,0 +1,137 @@
+import os
+from typing import Any, Optional
+from dotenv import load_dotenv
+from langchain_core.runnables import RunnableLambda
+
+from core.utils.course_catalog import course_catalog
+
+load_dotenv()
+
+# "compact": hiển thị rút gọn các trường trạng thái trong prompt; "raw": giữ `repr` như trước.
+PROMPT_CONTEXT_MODE = os.getenv("PROMPT_CONTEXT_MODE", "compact")
+
+EMPTY = "không có"
+
+
+def _sorted_items(data: dict) -> list[tuple[Any, Any]]:
+    # Thứ tự ổn định theo id để prompt giống nhau giữa các lượt (tận dụng prompt cache)
+    return sorted(data.items(), key=lambda kv: str(kv[0]).zfill(12))
+
+
+def render_seen_products(seen_products: Optional[dict]) -> str:
+    """
+    Hiển thị các khóa học khách đã xem, mỗi khóa một dòng: id, tên, loại, thời lượng, lịch, giá.
+    Mô tả và giảng viên được bỏ qua; agent gọi `get_courses_tool` khi cần chi tiết.
+    Thông tin khóa học được tra từ `course_catalog` theo tham chiếu trong state.
+
+    Args:
+        seen_products (Optional[dict]): `state["seen_products"]`.
+
+    Returns:
+        str: Chuỗi rút gọn, hoặc "không có" nếu rỗng.
+    """
+    seen_products = course_catalog.resolve(seen_products)
+    if not seen_products:
+        return EMPTY
+
+    lines = []
+    for course_id, course in _sorted_items(seen_products):
+        lines.append(
+            f"#{course_id} {course.get('name')} | {course.get('type')} | "
+            f"thời lượng {course.get('duration')} | {course.get('sessions_per_week')} buổi/tuần x {course.get('minutes_per_session')} phút | "
+            f"{course.get('price')}đ"
+        )
+    lines.append("(chi tiết: gọi get_courses_tool)")
+    return "\n".join(lines)
+
+
+def render_cart(cart: Optional[dict], seen_products: Optional[dict] = None) -> str:
+    """
+    Hiển thị giỏ hàng: id khóa học, tên (nếu có trong `seen_products`), giá và tạm tính.
+
+    Args:
+        cart (Optional[dict]): `state["cart"]`.
+        seen_products (Optional[dict]): Dùng để tra tên khóa học.
+
+    Returns:
+        str: Chuỗi rút gọn, hoặc "không có" nếu rỗng.
+    """
+    if not cart:
+        return EMPTY
+
+    seen_products = course_catalog.resolve(seen_products)
+    lines = []
+    for course_id, item in _sorted_items(cart):
+        name = (seen_products.get(item.get("course_id", course_id)) or {}).get("name")
+        label = f"#{item.get('course_id', course_id)}" + (f" {name}" if name else "")
+        lines.append(f"{label} | {item.get('price')}đ | tạm tính {item.get('subtotal')}đ")
+    return "\n".join(lines)
+
+
+def render_order(order: Optional[dict]) -> str:
+    """
+    Hiển thị đơn hàng: id, trạng thái, thanh toán, tổng tiền, ngày nhập học, người nhận
+    và các dòng khóa học (item_id, course_id, tên, giá).
+
+    Args:
+        order (Optional[dict]): `state["order"]`.
+
+    Returns:
+        str: Chuỗi rút gọn, hoặc "không có" nếu rỗng.
+    """
+    if not order:
+        return EMPTY
+
+    lines = []
+    for order_id, detail in _sorted_items(order):
+        lines.append(
+            f"Đơn #{detail.get('order_id', order_id)} | {detail.get('status')} | {detail.get('payment')} | "
+            f"tổng {detail.get('grand_total')}đ (giảm {detail.get('discount_voucher') or 0}đ) | "
+            f"nhập học {detail.get('admission_day') or '-'} | "
+            f"người nhận {detail.get('receiver_name')}, {detail.get('receiver_phone_number')}, {detail.get('receiver_email')}"
+        )
+        for item_id, item in _sorted_items(detail.get("items") or {}):
+            lines.append(
+                f"  - item #{item.get('item_id', item_id)}: khóa #{item.get('course_id')} "
+                f"{item.get('name')} | {item.get('price')}đ"
+            )
+    return "\n".join(lines)
+
+
+def compact_prompt_input(state: dict) -> dict:
+    """
+    Tạo bản sao nông của `state` với `seen_products`, `cart`, `order` đã được hiển thị rút gọn,
+    dùng làm đầu vào cho `ChatPromptTemplate` của các agent.
+
+    Args:
+        state (dict): Trạng thái hội thoại.
+
+    Returns:
+        dict: Đầu vào prompt; giữ nguyên `state` nếu `PROMPT_CONTEXT_MODE` là "raw".
+    """
+    if PROMPT_CONTEXT_MODE == "raw":
+        if not state.get("seen_products"):
+            return state
+        # Giữ dạng `repr` của bản ghi đầy đủ như trước, không phải tham chiếu
+        return {**state, "seen_products": course_catalog.resolve(state["seen_products"])}
+
+    prompt_input = dict(state)
+    if "seen_products" in state:
+        prompt_input["seen_products"] = render_seen_products(state.get("seen_products"))
+    if "cart" in state:
+        prompt_input["cart"] = render_cart(state.get("cart"), state.get("seen_products"))
+    if "order" in state:
+        prompt_input["order"] = render_order(state.get("order"))
+    return prompt_input
+
+
+async def acompact_prompt_input(state: dict) -> dict:
+    """
+    Phiên bản bất đồng bộ của `compact_prompt_input`: nạp trước các khóa học chưa có trong
+    `course_catalog` qua `run_db` để phần hiển thị không gọi DB đồng bộ trên event loop.
+    """
+    await course_catalog.aresolve(state.get("seen_products"))
+    return compact_prompt_input(state)
+
+
+compact_context = RunnableLambda(compact_prompt_input, afunc=acompact_prompt_input, name="compact_context")
@@ -1,7 +1,7 @@
 from langgraph.types import Command
 from langchain_core.messages import ToolMessage
 
-from typing import Any
+from typing import Any, Optional
 from langgraph.graph import StateGraph
 from core.graph.state import AgentState
 
@@ -9,6 +9,7 @@ from core.graph.state import AgentState
 def build_update(
     content: str,
     tool_call_id: Any,
+    artifact: Optional[str] = None,
     **kwargs
 ) -> dict:
     """
@@ -17,6 +18,8 @@ def build_update(
     Args:
         content (str): Nội dung phản hồi hiển thị cho người dùng.
         tool_call_id (Any): ID gọi tool để liên kết message với lần gọi công cụ.
+        artifact (Optional[str]): Câu trả lời hoàn chỉnh gửi thẳng cho khách khi tool được
+            cấu hình trả về trực tiếp (`DIRECT_RETURN_TOOLS`); không đưa vào LLM.
         **kwargs: Các trường trạng thái bổ sung để cập nhật vào state.
 
     Returns:
@@ -27,12 +30,42 @@ def build_update(
             ToolMessage
             (
                 content=content,
-                tool_call_id=tool_call_id
+                tool_call_id=tool_call_id,
+                artifact=artifact
             )
         ],
         **kwargs
     }
     
+def direct_reply(messages: list) -> Optional[str]:
+    """
+    Lấy câu trả lời gửi thẳng cho khách khi lượt của agent kết thúc bằng tool trả về trực tiếp.
+
+    Args:
+        messages (list): `messages` của kết quả agent.
+
+    Returns:
+        Optional[str]: Các `artifact` của những ToolMessage cuối nối lại, hoặc None nếu lượt
+            kết thúc bằng AIMessage hoặc có ToolMessage không kèm `artifact`.
+    """
+    trailing = []
+    for message in reversed(messages):
+        if not isinstance(message, ToolMessage):
+            break
+        trailing.append(message)
+
+    if not trailing or any(not isinstance(message.artifact, str) for message in trailing):
+        return None
+    return "\n\n".join(message.artifact for message in reversed(trailing))
+
+def needs_llm_reply(result: dict) -> bool:
+    """
+    True nếu agent dừng sau một tool trả về trực tiếp nhưng tool không tạo được câu trả lời
+    cho khách (nhánh lỗi/thiếu thông tin); khi đó agent cần gọi LLM thêm một lần.
+    """
+    messages = result.get("messages") or []
+    return bool(messages) and isinstance(messages[-1], ToolMessage) and direct_reply(messages) is None
+
 def fail_if_missing(condition, message, tool_call_id) -> Command:
     """
     Trả về `Command` chứa thông báo hướng dẫn nếu điều kiện tiền đề không thỏa.
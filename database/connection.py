@@ -2,15 +2,17 @@ from langchain_openai import ChatOpenAI
 from langchain_openai import OpenAIEmbeddings
 from langchain_google_genai import ChatGoogleGenerativeAI
 import os
+from typing import Optional
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+from database.llm_limiter import llm_rate_limiter
+from database.lazy_client import LazyClient
+from database.http_pool import http_client, http_async_client
+
 load_dotenv()
 
 MODEL_EMBEDDING = os.getenv("MODEL_EMBEDDING")
-MODEL_ORCHESTRATOR = os.getenv("MODEL_ORCHESTRATOR")
-MODEL_SPECIALIST = os.getenv("MODEL_SPECIALIST")
-MODEL_SUMMARIZATION = os.getenv("MODEL_SUMMARIZATION")
 SUPABASE_URL=os.getenv("SUPABASE_URL")
 SUPABASE_KEY=os.getenv("SUPABASE_KEY")
 
@@ -27,35 +29,25 @@ def get_openai_embeddings() -> OpenAIEmbeddings:
     """
     Initializes and returns the OpenAI Embeddings model.
     """ 
-    return OpenAIEmbeddings(model=MODEL_EMBEDDING)
-
-def get_orchestrator_llm() -> ChatOpenAI:
-    """
-    Initializes and returns the Gemini LLM for orchestration (fast and cheap).
-    """
-    return ChatOpenAI(model=MODEL_ORCHESTRATOR)
-
+    return OpenAIEmbeddings(
+        model=MODEL_EMBEDDING,
+        http_client=http_client.get(),
+        http_async_client=http_async_client.get()
+    )
 
-def get_specialist_llm() -> ChatOpenAI:
+def build_chat_model(model: Optional[str], **kwargs) -> ChatOpenAI:
     """
-    Initializes and returns the Gemini LLM for specialist tasks (powerful).
+    Creates a ChatOpenAI client with the shared settings (rate limiter, pooled HTTP transport)
+    used by every task. Model names per task are configured in `database.model_router`.
     """
     return ChatOpenAI(
-        model=MODEL_SPECIALIST,
-        temperature=0,
-        max_retries=2
+        model=model,
+        rate_limiter=llm_rate_limiter,
+        http_client=http_client.get(),
+        http_async_client=http_async_client.get(),
+        **kwargs
     )
 
-def get_summarization_llm() -> ChatOpenAI:
-    """
-    Initializes and returns the Google Gemini LLM for summarization tasks.
-    """
-    return ChatOpenAI(model=MODEL_SUMMARIZATION)
-
-# Initialize clients
-supabase_client = get_supabase_client()
-embeddings_model = get_openai_embeddings()
-orchestrator_llm = get_orchestrator_llm()
-specialist_llm = get_specialist_llm()
-summarization_llm = get_summarization_llm()
-
+# Các client được khởi tạo ở lần dùng đầu tiên để import nhanh và không cần mạng lúc khởi động
+supabase_client: LazyClient[Client] = LazyClient(get_supabase_client)
+embeddings_model: LazyClient[OpenAIEmbeddings] = LazyClient(get_openai_embeddings)
@@ -0,0 +1,53 @@
+import os
+import asyncio
+import functools
+import threading
+from typing import Any, Callable
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from core.utils.metrics import metrics
+
+load_dotenv()
+
+# Pool riêng cho các truy vấn Supabase (client đồng bộ), tránh chặn event loop
+# và không tranh chấp với default executor của asyncio.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "16"))
+
+_db_executor = ThreadPoolExecutor(
+    max_workers=DB_POOL_SIZE,
+    thread_name_prefix="supabase-db"
+)
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+def _track(fn: Callable[[], Any]) -> Any:
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight += 1
+    try:
+        return fn()
+    finally:
+        with _in_flight_lock:
+            _in_flight -= 1
+
+
+async def run_db(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Chạy một lời gọi Supabase đồng bộ trên pool DB có giới hạn và chờ kết quả bất đồng bộ.
+
+    Args:
+        fn (Callable): Hàm đồng bộ cần chạy, thường là `query.execute`.
+        *args, **kwargs: Tham số truyền cho `fn`.
+
+    Returns:
+        Any: Kết quả trả về của `fn`.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(_track, functools.partial(fn, *args, **kwargs))
+    return await loop.run_in_executor(_db_executor, call)
+
+
+metrics.register_gauge("db.pool_size", lambda: DB_POOL_SIZE)
+metrics.register_gauge("db.in_flight", lambda: _in_flight)
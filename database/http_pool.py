@@ -0,0 +1,171 @@
+"""
+Pool kết nối HTTP dùng chung (keep-alive, HTTP/2) cho mọi client LLM/embedding và webhook Lark.
+
+Mỗi request được gắn trace của httpcore để đếm request dùng lại kết nối cũ và thời gian
+bắt tay (TCP + TLS) của các kết nối mới; "thời gian tiết kiệm" ước tính bằng số request
+dùng lại nhân với thời gian bắt tay trung bình.
+"""
+import os
+import time
+import threading
+import importlib.util
+from typing import Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+from core.utils.metrics import metrics
+from database.lazy_client import LazyClient
+
+from log.logger_config import setup_logging
+
+load_dotenv()
+
+logger = setup_logging(__name__)
+
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "60"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "60"))
+
+_NEW_CONNECTION_EVENTS = ("connection.connect_tcp.started",)
+_HANDSHAKE_DONE_EVENTS = ("connection.connect_tcp.complete", "connection.start_tls.complete")
+_REQUEST_EVENTS = ("http11.send_request_headers.started", "http2.send_request_headers.started")
+
+
+class ConnectionStats:
+    """
+    Thống kê dùng lại kết nối của pool, cập nhật từ trace httpcore.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.new = 0
+        self.reused = 0
+        self.handshake_seconds = 0.0
+
+    def record(self, reused: bool, handshake: float = 0.0):
+        with self._lock:
+            if reused:
+                self.reused += 1
+            else:
+                self.new += 1
+                self.handshake_seconds += handshake
+
+    def reuse_rate(self) -> float:
+        total = self.new + self.reused
+        return round(self.reused / total, 4) if total else 0.0
+
+    def handshake_saved_seconds(self) -> float:
+        if not self.new:
+            return 0.0
+        return round(self.reused * self.handshake_seconds / self.new, 4)
+
+
+connection_stats = ConnectionStats()
+
+
+class _RequestTrace:
+    """
+    Trace của một request: có sự kiện mở TCP thì là kết nối mới, đo đến khi xong TLS.
+    """
+
+    def __init__(self):
+        self.connect_started: Optional[float] = None
+        self.handshake = 0.0
+        self.recorded = False
+
+    def on_event(self, name: str):
+        if name in _NEW_CONNECTION_EVENTS:
+            self.connect_started = time.perf_counter()
+        elif name in _HANDSHAKE_DONE_EVENTS and self.connect_started is not None:
+            self.handshake = time.perf_counter() - self.connect_started
+        elif name in _REQUEST_EVENTS and not self.recorded:
+            self.recorded = True
+            connection_stats.record(reused=self.connect_started is None, handshake=self.handshake)
+
+    def trace(self, name: str, info: dict):
+        self.on_event(name)
+
+    async def atrace(self, name: str, info: dict):
+        self.on_event(name)
+
+
+def _attach_trace(request: httpx.Request):
+    request.extensions["trace"] = _RequestTrace().trace
+
+
+async def _aattach_trace(request: httpx.Request):
+    request.extensions["trace"] = _RequestTrace().atrace
+
+
+def _http2() -> bool:
+    if HTTP2_ENABLED and importlib.util.find_spec("h2") is None:
+        logger.warning("Chưa cài gói h2, dùng HTTP/1.1 cho pool kết nối")
+        return False
+    return HTTP2_ENABLED
+
+
+def _pool_settings() -> dict:
+    return {
+        "http2": _http2(),
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS
+        ),
+        "timeout": httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+    }
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Tạo `httpx.Client` dùng chung cho các lời gọi đồng bộ tới OpenAI.
+    """
+    return httpx.Client(**_pool_settings(), event_hooks={"request": [_attach_trace]})
+
+
+def get_http_async_client() -> httpx.AsyncClient:
+    """
+    Tạo `httpx.AsyncClient` dùng chung cho các lời gọi bất đồng bộ tới OpenAI.
+    """
+    return httpx.AsyncClient(**_pool_settings(), event_hooks={"request": [_aattach_trace]})
+
+
+def get_http_session() -> requests.Session:
+    """
+    Tạo `requests.Session` giữ kết nối keep-alive cho webhook/API Lark.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_MAX_KEEPALIVE_CONNECTIONS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+http_client: LazyClient[httpx.Client] = LazyClient(get_http_client)
+http_async_client: LazyClient[httpx.AsyncClient] = LazyClient(get_http_async_client)
+http_session: LazyClient[requests.Session] = LazyClient(get_http_session)
+
+
+async def aclose_http_clients():
+    """
+    Đóng các pool đã được khởi tạo, gọi khi ứng dụng tắt.
+    """
+    if http_async_client.initialized:
+        await http_async_client.get().aclose()
+    if http_client.initialized:
+        http_client.get().close()
+    if http_session.initialized:
+        http_session.get().close()
+
+
+metrics.register_gauge("http.connections_new", lambda: connection_stats.new)
+metrics.register_gauge("http.connections_reused", lambda: connection_stats.reused)
+metrics.register_gauge("http.reuse_rate", connection_stats.reuse_rate)
+metrics.register_gauge("http.handshake_seconds", lambda: round(connection_stats.handshake_seconds, 4))
+metrics.register_gauge("http.handshake_saved_seconds", connection_stats.handshake_saved_seconds)
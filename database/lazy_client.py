@@ -0,0 +1,52 @@
+import time
+import threading
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+from log.logger_config import setup_logging
+
+logger = setup_logging(__name__)
+
+T = TypeVar("T")
+
+
+class LazyClient(Generic[T]):
+    """
+    Khởi tạo client ở lần dùng đầu tiên thay vì lúc import, an toàn khi nhiều thread cùng gọi.
+    Truy cập thuộc tính được chuyển tiếp sang client thật; dùng `get()` khi cần chính đối tượng
+    (ví dụ truyền vào `create_react_agent`). Nếu khởi tạo lỗi, lần dùng sau sẽ thử lại.
+    """
+
+    def __init__(self, factory: Callable[[], T], name: Optional[str] = None):
+        self._factory = factory
+        self._name = name or getattr(factory, "__name__", repr(factory))
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    def get(self) -> T:
+        """
+        Lấy client thật, khởi tạo nếu chưa có.
+
+        Returns:
+            T: Đối tượng do `factory` tạo ra.
+        """
+        instance = self._instance
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if self._instance is None:
+                started = time.perf_counter()
+                self._instance = self._factory()
+                logger.info(f"Khởi tạo {self._name} mất {(time.perf_counter() - started) * 1000:.1f} ms")
+            return self._instance
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self.get(), item)
+
+    def __repr__(self) -> str:
+        state = "initialized" if self.initialized else "pending"
+        return f"LazyClient({self._name}, {state})"
@@ -0,0 +1,71 @@
+import os
+import time
+import threading
+from typing import Optional
+from dotenv import load_dotenv
+from langchain_core.rate_limiters import InMemoryRateLimiter
+
+from core.utils.metrics import metrics
+
+load_dotenv()
+
+# Token bucket dùng chung cho mọi client LLM (orchestrator, specialist, summarization).
+# 0 = tắt giới hạn.
+LLM_REQUESTS_PER_SECOND = float(os.getenv("LLM_REQUESTS_PER_SECOND", "0"))
+LLM_MAX_BURST = int(os.getenv("LLM_MAX_BURST", "10"))
+
+_waiting = 0
+_waiting_lock = threading.Lock()
+
+
+def _track_waiting(delta: int):
+    global _waiting
+    with _waiting_lock:
+        _waiting += delta
+
+
+class MeteredRateLimiter(InMemoryRateLimiter):
+    """
+    `InMemoryRateLimiter` có ghi nhận số lời gọi LLM đang chờ token và thời gian chờ.
+    """
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        started = time.perf_counter()
+        _track_waiting(1)
+        try:
+            return super().acquire(blocking=blocking)
+        finally:
+            _track_waiting(-1)
+            metrics.observe("llm.rate_limit_wait", time.perf_counter() - started)
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        started = time.perf_counter()
+        _track_waiting(1)
+        try:
+            return await super().aacquire(blocking=blocking)
+        finally:
+            _track_waiting(-1)
+            metrics.observe("llm.rate_limit_wait", time.perf_counter() - started)
+
+
+def get_llm_rate_limiter() -> Optional[MeteredRateLimiter]:
+    """
+    Tạo token bucket dùng chung cho các client LLM.
+
+    Returns:
+        Optional[MeteredRateLimiter]: Bộ giới hạn, hoặc None nếu `LLM_REQUESTS_PER_SECOND` <= 0.
+    """
+    if LLM_REQUESTS_PER_SECOND <= 0:
+        return None
+
+    return MeteredRateLimiter(
+        requests_per_second=LLM_REQUESTS_PER_SECOND,
+        check_every_n_seconds=0.05,
+        max_bucket_size=LLM_MAX_BURST
+    )
+
+
+llm_rate_limiter = get_llm_rate_limiter()
+
+metrics.register_gauge("llm.rate_limit_waiting", lambda: _waiting)
+metrics.register_gauge("llm.requests_per_second", lambda: LLM_REQUESTS_PER_SECOND)
@@ -0,0 +1,243 @@
+"""
+Định tuyến model theo tác vụ: mỗi tác vụ có model chính và một model dự phòng rẻ hơn.
+
+Tác vụ tự chuyển sang model dự phòng khi:
+- độ trễ trung bình (EWMA) của model chính vượt ngưỡng (trong thời gian `MODEL_DOWNGRADE_COOLDOWN_SECONDS`),
+- số request đang xếp hàng chờ chạy (`admission.queued`) vượt ngưỡng,
+- hoặc thread hội thoại đã dùng hết ngân sách token.
+Mỗi lần hạ cấp đều được ghi log và đếm trong `/metrics`.
+"""
+import os
+import time
+import threading
+from typing import Any, Callable, Optional
+from uuid import UUID
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from core.utils.metrics import metrics
+from database.connection import build_chat_model
+
+from log.logger_config import setup_logging
+
+load_dotenv()
+
+logger = setup_logging(__name__)
+
+PRIMARY = "primary"
+FALLBACK = "fallback"
+
+# Tác vụ -> biến môi trường cũ dùng làm model chính mặc định
+TASKS = {
+    "routing": "MODEL_ORCHESTRATOR",
+    "summarization": "MODEL_SUMMARIZATION",
+    "course_advice": "MODEL_SPECIALIST",
+    "enrollment": "MODEL_SPECIALIST",
+    "order_editing": "MODEL_SPECIALIST",
+}
+# Các tác vụ cần câu trả lời ổn định (agent gọi tool)
+DETERMINISTIC_TASKS = {"course_advice", "enrollment", "order_editing"}
+
+MODEL_FALLBACK = os.getenv("MODEL_FALLBACK")
+MODEL_LATENCY_ALPHA = float(os.getenv("MODEL_LATENCY_ALPHA", "0.3"))
+MODEL_DOWNGRADE_LATENCY_SECONDS = float(os.getenv("MODEL_DOWNGRADE_LATENCY_SECONDS", "8"))
+MODEL_DOWNGRADE_COOLDOWN_SECONDS = float(os.getenv("MODEL_DOWNGRADE_COOLDOWN_SECONDS", "120"))
+# 0 = không hạ cấp theo hàng đợi / ngân sách
+MODEL_DOWNGRADE_QUEUE_DEPTH = int(os.getenv("MODEL_DOWNGRADE_QUEUE_DEPTH", "0"))
+CHAT_TOKEN_BUDGET = int(os.getenv("CHAT_TOKEN_BUDGET", "0"))
+CHAT_TOKEN_BUDGET_WINDOW_SECONDS = int(os.getenv("CHAT_TOKEN_BUDGET_WINDOW_SECONDS", "86400"))
+
+
+def _task_models(task: str) -> tuple[Optional[str], Optional[str]]:
+    env = f"MODEL_{task.upper()}"
+    primary = os.getenv(env) or os.getenv(TASKS[task])
+    fallback = os.getenv(f"{env}_FALLBACK") or MODEL_FALLBACK
+    return primary, fallback if fallback != primary else None
+
+
+def _current_thread_id() -> Optional[str]:
+    try:
+        from langgraph.config import get_config
+        return get_config().get("configurable", {}).get("thread_id")
+    except Exception:
+        # Ngoài ngữ cảnh chạy graph (ví dụ gọi trực tiếp chain)
+        return None
+
+
+class _UsageTracker(BaseCallbackHandler):
+    """
+    Đo độ trễ và token của từng lời gọi model, đưa về `ModelRouter`.
+    """
+
+    run_inline = True
+
+    def __init__(self, router: "ModelRouter", task: str, tier: str):
+        self.router = router
+        self.task = task
+        self.tier = tier
+        self._runs: dict[UUID, tuple[float, Optional[str]]] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs):
+        self._runs[run_id] = (time.perf_counter(), (metadata or {}).get("thread_id"))
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        started, thread_id = self._runs.pop(run_id, (None, None))
+        tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    tokens += usage.get("total_tokens", 0)
+        self.router.record(self.task, self.tier, time.perf_counter() - started if started else None, tokens, thread_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._runs.pop(run_id, None)
+
+
+class ModelRouter:
+    """
+    Giữ model chính/dự phòng của từng tác vụ và quyết định tier cho mỗi lần gọi.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: dict[tuple[str, str], ChatOpenAI] = {}
+        self._latency: dict[str, Optional[float]] = {task: None for task in TASKS}
+        self._downgraded_until: dict[str, float] = {task: 0.0 for task in TASKS}
+        self._chat_tokens: TTLCache = TTLCache(maxsize=100_000, ttl=CHAT_TOKEN_BUDGET_WINDOW_SECONDS)
+
+    def model(self, task: str, tier: str = PRIMARY) -> ChatOpenAI:
+        """
+        Lấy (và tạo nếu chưa có) client của `task` ở `tier`.
+
+        Args:
+            task (str): Một khóa trong `TASKS`.
+            tier (str): "primary" hoặc "fallback"; không có model dự phòng thì dùng model chính.
+
+        Returns:
+            ChatOpenAI: Client đã gắn rate limiter và callback đo độ trễ/token.
+        """
+        primary, fallback = _task_models(task)
+        if tier == FALLBACK and not fallback:
+            tier = PRIMARY
+
+        key = (task, tier)
+        with self._lock:
+            if key not in self._models:
+                kwargs = {"temperature": 0, "max_retries": 2} if task in DETERMINISTIC_TASKS else {}
+                self._models[key] = build_chat_model(
+                    fallback if tier == FALLBACK else primary,
+                    callbacks=[_UsageTracker(self, task, tier)],
+                    **kwargs
+                )
+            return self._models[key]
+
+    def record(self, task: str, tier: str, seconds: Optional[float], tokens: int, thread_id: Optional[str]):
+        """
+        Ghi nhận một lời gọi: cập nhật EWMA độ trễ của model chính và token đã dùng của thread.
+        """
+        metrics.incr(f"model_router.{task}.{tier}.calls")
+        metrics.incr(f"model_router.{task}.{tier}.tokens", tokens)
+        if seconds is not None:
+            metrics.observe(f"model_router.{task}.{tier}", seconds)
+
+        with self._lock:
+            if thread_id and tokens:
+                self._chat_tokens[thread_id] = self._chat_tokens.get(thread_id, 0) + tokens
+            if tier != PRIMARY or seconds is None:
+                return
+            previous = self._latency[task]
+            latency = seconds if previous is None else MODEL_LATENCY_ALPHA * seconds + (1 - MODEL_LATENCY_ALPHA) * previous
+            self._latency[task] = latency
+            if latency > MODEL_DOWNGRADE_LATENCY_SECONDS and _task_models(task)[1]:
+                self._downgraded_until[task] = time.monotonic() + MODEL_DOWNGRADE_COOLDOWN_SECONDS
+                # Đo lại từ đầu khi hết thời gian hạ cấp
+                self._latency[task] = None
+                logger.warning(
+                    f"Độ trễ model chính của {task} là {latency:.2f}s > {MODEL_DOWNGRADE_LATENCY_SECONDS}s, "
+                    f"dùng model dự phòng trong {MODEL_DOWNGRADE_COOLDOWN_SECONDS:.0f}s"
+                )
+
+    def _downgrade_reason(self, task: str, thread_id: Optional[str]) -> Optional[str]:
+        if time.monotonic() < self._downgraded_until[task]:
+            return "latency"
+        if MODEL_DOWNGRADE_QUEUE_DEPTH and (metrics.gauge("admission.queued") or 0) >= MODEL_DOWNGRADE_QUEUE_DEPTH:
+            return "queue"
+        if CHAT_TOKEN_BUDGET and thread_id and self._chat_tokens.get(thread_id, 0) >= CHAT_TOKEN_BUDGET:
+            return "budget"
+        return None
+
+    def select(self, task: str, thread_id: Optional[str] = None) -> ChatOpenAI:
+        """
+        Chọn client cho một lần gọi của `task`.
+
+        Args:
+            task (str): Một khóa trong `TASKS`.
+            thread_id (Optional[str]): Thread hội thoại; mặc định lấy từ config của graph đang chạy.
+
+        Returns:
+            ChatOpenAI: Model chính, hoặc model dự phòng nếu cần hạ cấp.
+        """
+        thread_id = thread_id or _current_thread_id()
+        reason = self._downgrade_reason(task, thread_id)
+        if reason and _task_models(task)[1]:
+            metrics.incr(f"model_router.{task}.downgrade.{reason}")
+            logger.info(f"Hạ cấp model cho {task} (thread {thread_id}) vì {reason}")
+            return self.model(task, FALLBACK)
+        return self.model(task, PRIMARY)
+
+    def for_agent(self, task: str, tools: list) -> Callable[[Any, Any], Any]:
+        """
+        Model động cho `create_react_agent(model=...)`: chọn tier ở mỗi bước gọi model.
+
+        Args:
+            task (str): Tác vụ của agent.
+            tools (list): Toolbox của agent, được `bind_tools` sẵn cho từng tier.
+        """
+        bound: dict[int, Any] = {}
+
+        def select_model(state: Any, runtime: Any) -> Any:
+            llm = self.select(task)
+            if id(llm) not in bound:
+                bound[id(llm)] = llm.bind_tools(tools)
+            return bound[id(llm)]
+
+        return select_model
+
+    def runnable(self, task: str, wrap: Optional[Callable[[ChatOpenAI], Runnable]] = None) -> Runnable:
+        """
+        Runnable chọn tier ở mỗi lần gọi, dùng trong các chain thường (Supervisor, tóm tắt).
+
+        Args:
+            task (str): Tác vụ.
+            wrap (Optional[Callable]): Biến đổi client trước khi gọi, ví dụ `with_structured_output`.
+        """
+        wrapped: dict[int, Runnable] = {}
+
+        def resolve() -> Runnable:
+            llm = self.select(task)
+            if id(llm) not in wrapped:
+                wrapped[id(llm)] = wrap(llm) if wrap else llm
+            return wrapped[id(llm)]
+
+        def invoke(value: Any, config: RunnableConfig) -> Any:
+            return resolve().invoke(value, config)
+
+        async def ainvoke(value: Any, config: RunnableConfig) -> Any:
+            return await resolve().ainvoke(value, config)
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"model_router.{task}")
+
+    def latency(self, task: str) -> Optional[float]:
+        latency = self._latency[task]
+        return round(latency, 4) if latency is not None else None
+
+
+model_router = ModelRouter()
+
+for _task in TASKS:
+    metrics.register_gauge(f"model_router.{_task}.latency_ewma", lambda task=_task: model_router.latency(task))
@@ -0,0 +1,136 @@
+import os
+import uuid
+import threading
+from typing import Optional
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from supabase import PostgrestAPIError
+
+from database.connection import supabase_client
+from database.executor import run_db
+from core.utils.metrics import metrics
+from log.logger_config import setup_logging
+
+load_dotenv()
+
+logger = setup_logging(__name__)
+
+SESSION_CACHE_TTL_SECONDS = int(os.getenv("SESSION_CACHE_TTL_SECONDS", "300"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+
+# chat_id -> bản ghi students (đã có uuid của phiên chat)
+_session_cache: TTLCache = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL_SECONDS)
+_cache_lock = threading.Lock()
+
+# Mã lỗi khi RPC `resolve_session` chưa được tạo: PostgREST không thấy hàm / Postgres undefined_function
+MISSING_FUNCTION_CODES = {"PGRST202", "42883"}
+# Ghi nhớ sau lần đầu phát hiện DB chưa có RPC để không gọi thử lại ở mỗi lượt
+_rpc_missing = False
+
+
+def _resolve_legacy(chat_id: str) -> Optional[dict]:
+    """
+    Cách cũ (2-3 lần gọi DB), chỉ dùng khi RPC `resolve_session` chưa được tạo trên DB.
+    """
+    response = (
+        supabase_client.table("students")
+        .upsert({"chat_id": chat_id}, on_conflict="chat_id")
+        .execute()
+    )
+    if not response.data:
+        return None
+
+    student = response.data[0]
+    if not student.get("uuid"):
+        res = (
+            supabase_client.table("students")
+            .update({"uuid": str(uuid.uuid4())})
+            .eq("chat_id", chat_id)
+            .execute()
+        )
+        student = res.data[0] if res.data else student
+
+    return student
+
+
+def _resolve_from_db(chat_id: str) -> Optional[dict]:
+    """
+    Gọi RPC `resolve_session`; chỉ dùng truy vấn cũ khi DB chưa có hàm này. Lỗi khác (timeout,
+    mất kết nối) trả về None thay vì gọi thêm 2-3 truy vấn khi Supabase đang chập chờn.
+    """
+    global _rpc_missing
+
+    if not _rpc_missing:
+        try:
+            response = supabase_client.rpc("resolve_session", {"p_chat_id": chat_id}).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            if not (isinstance(e, PostgrestAPIError) and e.code in MISSING_FUNCTION_CODES):
+                logger.error(f"RPC resolve_session lỗi: {e}")
+                metrics.incr("session.rpc_error")
+                return None
+            logger.warning(f"DB chưa có RPC resolve_session, chuyển sang truy vấn cũ: {e}")
+            _rpc_missing = True
+
+    metrics.incr("session.rpc_fallback")
+    return _resolve_legacy(chat_id)
+
+
+def _get_cached(chat_id: str) -> Optional[dict]:
+    with _cache_lock:
+        student = _session_cache.get(chat_id)
+    if student is not None:
+        metrics.incr("session.cache_hit")
+        return dict(student)
+
+    metrics.incr("session.cache_miss")
+    return None
+
+
+def _set_cached(chat_id: str, student: Optional[dict]) -> Optional[dict]:
+    if student:
+        with _cache_lock:
+            _session_cache[chat_id] = dict(student)
+    return student
+
+
+def resolve_session(chat_id: str) -> Optional[dict]:
+    """
+    Lấy bản ghi học viên kèm `uuid` phiên chat theo `chat_id` (tạo mới nếu chưa có).
+
+    Args:
+        chat_id (str): Định danh cuộc hội thoại/khách hàng.
+
+    Returns:
+        Optional[dict]: Bản ghi `students` (có trường `uuid`) hoặc None nếu thất bại.
+    """
+    student = _get_cached(chat_id)
+    if student is not None:
+        return student
+
+    return _set_cached(chat_id, _resolve_from_db(chat_id))
+
+
+async def aresolve_session(chat_id: str) -> Optional[dict]:
+    """
+    Phiên bản bất đồng bộ của `resolve_session`, truy vấn DB chạy trên pool DB.
+    """
+    student = _get_cached(chat_id)
+    if student is not None:
+        return student
+
+    return _set_cached(chat_id, await run_db(_resolve_from_db, chat_id))
+
+
+def invalidate_session(chat_id: Optional[str]):
+    """
+    Xóa cache phiên của `chat_id`, gọi khi uuid hoặc thông tin khách thay đổi.
+    """
+    if not chat_id:
+        return
+
+    with _cache_lock:
+        _session_cache.pop(chat_id, None)
+
+
+metrics.register_gauge("session.cache_size", lambda: len(_session_cache))
@@ -0,0 +1,23 @@
+-- Lấy (hoặc tạo mới) học viên theo chat_id và đảm bảo có uuid phiên chat,
+-- trả về toàn bộ bản ghi students trong một round trip.
+-- Gọi từ Python: supabase_client.rpc("resolve_session", {"p_chat_id": chat_id})
+create or replace function resolve_session(p_chat_id text)
+returns setof students
+language plpgsql
+as $$
+begin
+    insert into students (chat_id)
+    values (p_chat_id)
+    on conflict (chat_id) do nothing;
+
+    update students
+    set uuid = gen_random_uuid()
+    where chat_id = p_chat_id
+      and uuid is null;
+
+    return query
+        select *
+        from students
+        where chat_id = p_chat_id;
+end;
+$$;
@@ -1,32 +1,39 @@
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 
-from core.graph.build_graph import create_main_graph
+from core.utils.metrics import metrics
+from services.admission import AdmissionRejected
+from core.graph.graph_dependencies import init_graph, graph_build_stats
+from core.graph.supervisor import flush_route_cache
+from database.http_pool import aclose_http_clients
+from core.graph.checkpointer import open_checkpointer
 
 from api.v1.routes import router as api_router_v1
 from api.v2.routes import router as api_router_v2
 from api.v3.routes import router as api_router_v3
 
-# @asynccontextmanager
-# async def lifespan(app: FastAPI):
-#     # Startup
-#     graph = create_main_graph()
-#     app.state.graph = graph
-    
-#     # Start cleanup task
-#     graph.cleanup_manager.start_cleanup_task()
-    
-#     yield
-    
-#     # Shutdown
-#     graph.cleanup_manager.stop_cleanup_task()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: graph được build một lần và dùng chung cho mọi phiên bản API,
+    # checkpointer (memory/sqlite/postgres) mở trong suốt vòng đời app
+    async with open_checkpointer() as checkpointer:
+        app.state.graph = init_graph(checkpointer)
+        app.state.graph.cleanup_manager.start_cleanup_task()
+
+        yield
+
+        app.state.graph.cleanup_manager.stop_cleanup_task()
+
+    # Shutdown: đóng pool kết nối HTTP dùng chung
+    await aclose_http_clients()
 
 # Create a FastAPI app instance
 app = FastAPI(
     title="Chatbot customer service project", 
-    # lifespan=lifespan
+    lifespan=lifespan
 )
 
 # Add CORS middleware to allow cross-origin requests
@@ -38,6 +45,17 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """
+    Trả lời nhanh 429/503 kèm `Retry-After` khi hệ thống quá tải.
+    """
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"error": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Include the API router with a prefix
 app.include_router(api_router_v1, prefix="/api/v1")
 app.include_router(api_router_v2, prefix="/api/v2")
@@ -54,9 +72,29 @@ async def health():
     Endpoint kiểm tra tình trạng dịch vụ.
 
     Returns:
-        dict: Trạng thái "healthy" nếu ứng dụng sẵn sàng.
+        dict: Trạng thái "healthy" nếu ứng dụng sẵn sàng, kèm chi phí khởi tạo graph.
+    """
+    return {"status": "healthy", "graph": graph_build_stats}
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Endpoint xuất các số liệu vận hành trong process (bộ đếm, thời gian, gauge).
+
+    Returns:
+        dict: Snapshot hiện tại của `metrics`.
+    """
+    return metrics.snapshot()
+
+@app.post("/cache/routes/flush")
+async def flush_routes():
+    """
+    Xóa cache quyết định định tuyến của Supervisor (dùng sau khi đổi prompt hoặc luật định tuyến).
+
+    Returns:
+        dict: Số mục đã xóa.
     """
-    return {"status": "healthy"}
+    return {"flushed": flush_route_cache()}
 
 
 if __name__ == "__main__":
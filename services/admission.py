@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import asyncio
+from typing import AsyncIterator
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+from core.utils.metrics import metrics
+from log.logger_config import setup_logging
+
+load_dotenv()
+
+logger = setup_logging(__name__)
+
+MAX_CONCURRENT_RUNS = int(os.getenv("MAX_CONCURRENT_RUNS", "32"))
+MAX_QUEUED_RUNS = int(os.getenv("MAX_QUEUED_RUNS", "64"))
+ADMISSION_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_TIMEOUT_SECONDS", "10"))
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "5"))
+
+
+class AdmissionRejected(Exception):
+    """
+    Lượt chạy graph bị từ chối do quá tải: 429 khi hàng đợi đầy, 503 khi chờ quá lâu.
+    """
+
+    def __init__(self, status_code: int, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Giới hạn số lượt chạy graph (và do đó số lời gọi LLM) đồng thời trong process.
+    Khi hàng đợi vượt `max_queue` thì từ chối ngay thay vì để mọi request cùng chậm.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_queue: int,
+        timeout_seconds: float,
+        retry_after: int
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.timeout_seconds = timeout_seconds
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.running = 0
+        self.queued = 0
+
+    def check(self):
+        """
+        Từ chối ngay nếu hàng đợi đã đầy, không chờ. Route gọi trước khi trả về `StreamingResponse`
+        để 429 được trả về trước khi response bắt đầu.
+
+        Raises:
+            AdmissionRejected: 429 nếu hàng đợi đã đầy.
+        """
+        if self.running >= self.max_concurrent and self.queued >= self.max_queue:
+            metrics.incr("admission.rejected")
+            logger.warning(f"Từ chối lượt chạy: {self.queued} lượt đang chờ")
+            raise AdmissionRejected(429, self.retry_after, "Hệ thống đang quá tải, vui lòng thử lại sau")
+
+    async def acquire(self):
+        """
+        Chờ tới lượt chạy.
+
+        Raises:
+            AdmissionRejected: 429 nếu hàng đợi đã đầy, 503 nếu chờ quá `timeout_seconds`.
+        """
+        self.check()
+
+        started = time.perf_counter()
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.timeout_seconds)
+        except asyncio.TimeoutError:
+            metrics.incr("admission.timed_out")
+            logger.warning(f"Hết thời gian chờ lượt chạy sau {self.timeout_seconds}s")
+            raise AdmissionRejected(503, self.retry_after, "Hệ thống đang bận, vui lòng thử lại sau")
+        finally:
+            self.queued -= 1
+
+        self.running += 1
+        metrics.observe("admission.wait", time.perf_counter() - started)
+
+    def release(self):
+        self.running -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Giữ một lượt chạy trong suốt khối `async with`."""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def guard_stream(self, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        Chạy một generator SSE trong một lượt chạy (`slot`). Lượt chạy được giữ ngay trong generator
+        nên luôn được trả khi stream kết thúc, bị ngắt, hoặc client ngắt kết nối trước chunk đầu tiên.
+        Response đã bắt đầu nên nếu bị từ chối khi chờ, lỗi được gửi dưới dạng sự kiện SSE.
+        """
+        try:
+            async with self.slot():
+                async for chunk in stream:
+                    yield chunk
+        except AdmissionRejected as e:
+            error_dict = {"error": e.reason, "retry_after": e.retry_after}
+            yield f"data: {json.dumps(error_dict, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+
+
+admission = AdmissionController(
+    max_concurrent=MAX_CONCURRENT_RUNS,
+    max_queue=MAX_QUEUED_RUNS,
+    timeout_seconds=ADMISSION_TIMEOUT_SECONDS,
+    retry_after=RETRY_AFTER_SECONDS
+)
+
+metrics.register_gauge("admission.running", lambda: admission.running)
+metrics.register_gauge("admission.queued", lambda: admission.queued)
+metrics.register_gauge("admission.max_concurrent", lambda: admission.max_concurrent)
@@ -0,0 +1,138 @@
+import os
+import time
+import asyncio
+from typing import AsyncIterator, Optional
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+from core.utils.metrics import metrics
+from log.logger_config import setup_logging
+
+load_dotenv()
+
+logger = setup_logging(__name__)
+
+CHAT_DEBOUNCE_MS = int(os.getenv("CHAT_DEBOUNCE_MS", "0"))
+
+
+class _PendingTurn:
+    """Các tin nhắn đang chờ được gộp vào cùng một lượt chạy graph."""
+
+    def __init__(self, inputs: list[str]):
+        self.inputs = inputs
+        self.open = True
+        # Được set khi lượt đóng lại: `taken` = True nếu chủ lượt đã nhận tin nhắn để chạy,
+        # False nếu chủ lượt bị hủy trước đó và tin nhắn cần người khác tiếp quản
+        self.settled = asyncio.Event()
+        self.taken = False
+        self.heir: Optional["_PendingTurn"] = None
+
+
+class ChatMailbox:
+    """
+    Hộp thư theo `chat_id`: mỗi chat chỉ có một lượt chạy graph tại một thời điểm,
+    tin nhắn đến trong lúc đang chờ (hoặc trong cửa sổ debounce) được gộp vào lượt kế tiếp.
+    """
+
+    def __init__(self, debounce_seconds: float = 0.0):
+        self.debounce_seconds = debounce_seconds
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._lock_users: dict[str, int] = {}
+        self._pending: dict[str, _PendingTurn] = {}
+        self.waiting = 0
+
+    @property
+    def active_chats(self) -> int:
+        return len(self._locks)
+
+    def _close_pending(self, chat_id: str, pending: _PendingTurn, taken: bool = False):
+        if pending.open:
+            pending.open = False
+            pending.taken = taken
+            pending.settled.set()
+        if self._pending.get(chat_id) is pending:
+            del self._pending[chat_id]
+
+    async def _await_owner(self, pending: _PendingTurn) -> Optional[_PendingTurn]:
+        """
+        Chờ chủ lượt nhận các tin nhắn đã gộp. Nếu chủ lượt bị hủy trước khi chạy (client ngắt
+        kết nối, batch bị hủy), người chờ đầu tiên tiếp quản; những người còn lại gộp vào lượt đó.
+
+        Returns:
+            Optional[_PendingTurn]: Lượt cần tự chạy khi tiếp quản, None nếu tin nhắn đã được chạy.
+        """
+        while True:
+            await pending.settled.wait()
+            if pending.taken:
+                return None
+            if pending.heir is None:
+                pending.heir = _PendingTurn(pending.inputs)
+                return pending.heir
+            pending = pending.heir
+
+    @asynccontextmanager
+    async def turn(self, chat_id: str, user_input: str) -> AsyncIterator[Optional[str]]:
+        """
+        Giữ lượt chạy của `chat_id` trong suốt khối `async with`.
+
+        Args:
+            chat_id (str): Định danh cuộc hội thoại.
+            user_input (str): Tin nhắn vừa nhận.
+
+        Yields:
+            Optional[str]: Nội dung đã gộp để chạy graph, hoặc None nếu tin nhắn
+            đã được gộp vào một lượt khác (trả về khi lượt đó đã nhận tin nhắn để chạy).
+        """
+        pending = self._pending.get(chat_id)
+        if pending is not None and pending.open:
+            pending.inputs.append(user_input)
+            metrics.incr("mailbox.coalesced")
+            logger.info(f"Gộp tin nhắn của {chat_id} vào lượt đang chờ")
+
+            pending = await self._await_owner(pending)
+            if pending is None:
+                yield None
+                return
+
+            metrics.incr("mailbox.takeover")
+            logger.warning(f"Lượt đang chờ của {chat_id} bị hủy, tiếp quản {len(pending.inputs)} tin nhắn")
+            self._pending.setdefault(chat_id, pending)
+        else:
+            pending = _PendingTurn([user_input])
+            self._pending[chat_id] = pending
+
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        self._lock_users[chat_id] = self._lock_users.get(chat_id, 0) + 1
+
+        try:
+            if lock.locked():
+                metrics.incr("mailbox.queued")
+
+            started = time.perf_counter()
+            self.waiting += 1
+            try:
+                await lock.acquire()
+            finally:
+                self.waiting -= 1
+
+            try:
+                if self.debounce_seconds > 0:
+                    await asyncio.sleep(self.debounce_seconds)
+                self._close_pending(chat_id, pending, taken=True)
+                metrics.observe("mailbox.wait", time.perf_counter() - started)
+
+                yield "\n".join(pending.inputs)
+            finally:
+                lock.release()
+        finally:
+            self._close_pending(chat_id, pending)
+            self._lock_users[chat_id] -= 1
+            if not self._lock_users[chat_id]:
+                del self._lock_users[chat_id]
+                del self._locks[chat_id]
+
+
+chat_mailbox = ChatMailbox(debounce_seconds=CHAT_DEBOUNCE_MS / 1000)
+
+metrics.register_gauge("mailbox.waiting", lambda: chat_mailbox.waiting)
+metrics.register_gauge("mailbox.active_chats", lambda: chat_mailbox.active_chats)
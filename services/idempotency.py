@@ -0,0 +1,92 @@
+import os
+import asyncio
+from typing import Any, Awaitable, Callable
+from cachetools import TTLCache
+from dotenv import load_dotenv
+
+from core.utils.metrics import metrics
+from log.logger_config import setup_logging
+
+load_dotenv()
+
+logger = setup_logging(__name__)
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+
+
+class IdempotencyCache:
+    """
+    Ghi nhớ kết quả theo (`chat_id`, `message_id`) để tin nhắn gửi lại không chạy lại graph.
+    Lần gửi lại trong lúc lượt đầu còn chạy sẽ chờ chung kết quả của lượt đó.
+    """
+
+    def __init__(self, ttl_seconds: int, maxsize: int):
+        self._results: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl_seconds)
+        self._in_flight: dict[tuple[str, str], asyncio.Future] = {}
+
+    @property
+    def size(self) -> int:
+        return len(self._results)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    async def run(
+        self,
+        chat_id: str,
+        message_id: str,
+        factory: Callable[[], Awaitable[Any]]
+    ) -> tuple[Any, bool]:
+        """
+        Chạy `factory` đúng một lần cho mỗi (`chat_id`, `message_id`) còn trong cache.
+
+        Args:
+            chat_id (str): Định danh cuộc hội thoại.
+            message_id (str): Định danh tin nhắn do phía gọi cung cấp.
+            factory (Callable[[], Awaitable[Any]]): Hàm tạo coroutine xử lý tin nhắn.
+
+        Returns:
+            tuple[Any, bool]: (kết quả, True nếu là kết quả dùng lại).
+        """
+        key = (chat_id, message_id)
+
+        if key in self._results:
+            metrics.incr("idempotency.replayed")
+            logger.info(f"Trả lại kết quả đã lưu cho tin nhắn {message_id} của {chat_id}")
+            return self._results[key], True
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            metrics.incr("idempotency.joined_in_flight")
+            logger.info(f"Tin nhắn {message_id} của {chat_id} đang được xử lý, chờ kết quả")
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await factory()
+        except BaseException as e:
+            # Không lưu lỗi: lần gửi lại sau sẽ được chạy lại
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()
+            raise
+        else:
+            self._results[key] = result
+            future.set_result(result)
+            return result, False
+        finally:
+            self._in_flight.pop(key, None)
+
+
+idempotency_cache = IdempotencyCache(
+    ttl_seconds=IDEMPOTENCY_TTL_SECONDS,
+    maxsize=IDEMPOTENCY_CACHE_SIZE
+)
+
+metrics.register_gauge("idempotency.cache_size", lambda: idempotency_cache.size)
+metrics.register_gauge("idempotency.in_flight", lambda: idempotency_cache.in_flight)
@@ -1,16 +1,42 @@
+import os
+import time
 import uuid
 import json
 import asyncio
+from typing import Optional
+from dotenv import load_dotenv
 
 from langgraph.graph import StateGraph
 
 from core.graph.state import init_state
-from services.utils import get_uuid, update_uuid
+from services.chat_mailbox import chat_mailbox
+from services.admission import admission, AdmissionRejected
+from services.utils import (
+    get_uuid,
+    update_uuid,
+    get_or_create_customer,
+    get_final_response,
+    stream_tokens
+)
+from database.session_store import invalidate_session
+from state_management.state_cleanup_manager import track_thread
+from core.utils.metrics import metrics
 
 from log.logger_config import setup_logging
 
+load_dotenv()
+
 logger = setup_logging(__name__)
 
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+RESET_COMMANDS = ["/start", "/restart"]
+
+NEW_CHAT_GREETING = (
+    "Chào anh/chị, em rất vui được hỗ trợ anh/chị. Nếu anh/chị có thắc mắc hoặc "
+    "cần tư vấn về các khóa học của trung tâm, hãy cho em biết nhé! Em rất sẵn lòng giúp đỡ.\n"
+)
+
 async def _get_or_create_uuid(chat_id: str) -> str:
     """
     Lấy `uuid` hiện tại của khách theo `chat_id`, nếu chưa tồn tại thì tạo mới và lưu.
@@ -35,7 +61,8 @@ async def handle_normal_chat(
     user_input: str,
     chat_id: str,
     customer: dict,
-    graph: StateGraph
+    graph: StateGraph,
+    stream_mode: str = "updates"
 ):
     """
     Xử lý luồng chat thông thường: nạp state, cập nhật thông tin khách, gọi graph và trả về `events`.
@@ -45,12 +72,14 @@ async def handle_normal_chat(
         chat_id (str): Mã cuộc hội thoại.
         customer (dict): Thông tin khách hàng lấy từ DB.
         graph (StateGraph): Đồ thị tác vụ chính để suy luận.
+        stream_mode (str): Chế độ stream của graph, "updates" (mặc định) hoặc "messages" để stream token;
+            với "messages", sự kiện gồm cả subgraph dạng `(namespace, (message, metadata))`.
 
     Returns:
         tuple[Any, str] | tuple[None, None]: Cặp (events, thread_id) hoặc (None, None) nếu lỗi.
     """
     try:
-        thread_id = await _get_or_create_uuid(chat_id=chat_id)
+        thread_id = customer.get("uuid") or await _get_or_create_uuid(chat_id=chat_id)
 
         if not thread_id:
             logger.error("Lỗi ở cấp DB -> không lấy được uuid")
@@ -58,11 +87,12 @@ async def handle_normal_chat(
 
         logger.info(f"Lấy được uuid của khách: {chat_id} là {thread_id}")
 
+        await track_thread(graph, thread_id)
+
         config = {"configurable": {"thread_id": thread_id}}
 
-        state = (graph.get_state(config).values 
-                 if graph.get_state(config).values 
-                 else init_state())
+        snapshot = await graph.aget_state(config)
+        state = snapshot.values if snapshot.values else init_state()
 
         state["user_input"] = user_input
         state["chat_id"] = chat_id
@@ -72,14 +102,121 @@ async def handle_normal_chat(
         state["phone_number"] = customer["phone_number"]
         state["email"] = customer["email"]
 
-        events = graph.astream(state, config=config)
+        # Agent chuyên trách là ReAct agent lồng trong node: cần `subgraphs=True` để token của nó
+        # được stream ra ngoài, nếu không chỉ nhận được AIMessage hoàn chỉnh khi node kết thúc
+        events = graph.astream(
+            state,
+            config=config,
+            stream_mode=stream_mode,
+            subgraphs=stream_mode == "messages"
+        )
 
         return events, thread_id
     
     except Exception as e:
         logger.error(f"Lỗi: {e}")
         raise
+
+async def stream_chat_turn(
+    user_input: str,
+    chat_id: str,
+    graph: StateGraph,
+    metric_prefix: str = "chat"
+):
+    """
+    Chạy một lượt chat qua hộp thư của `chat_id` và stream phản hồi dạng SSE theo token.
+    Các lượt của cùng một chat được chạy tuần tự; tin nhắn đến dồn dập được gộp lại.
+
+    Args:
+        user_input (str): Nội dung người dùng nhập.
+        chat_id (str): Mã cuộc hội thoại.
+        graph (StateGraph): Đồ thị tác vụ chính để suy luận.
+        metric_prefix (str): Tiền tố tên metric của endpoint gọi.
+
+    Yields:
+        str: Chuỗi SSE dạng `data: {...}` và token `[DONE]` khi hoàn tất.
+    """
+    async with chat_mailbox.turn(chat_id, user_input) as merged_input:
+        if merged_input is None:
+            msg = {"coalesced": True}
+            yield f"data: {json.dumps(msg, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+            return
+
+        try:
+            # Lấy thông tin khách sau khi đã giữ lượt để không ghi đè cập nhật của lượt trước
+            customer = await get_or_create_customer(chat_id=chat_id)
+            logger.info(f"Lấy hoặc tạo mới khách: {customer}")
+            logger.info(f"Tin nhắn của khách: {merged_input}")
+
+            events, thread_id = await handle_normal_chat(
+                user_input=merged_input,
+                chat_id=chat_id,
+                customer=customer,
+                graph=graph,
+                stream_mode="messages"
+            )
+        except Exception as e:
+            error_dict = {"error": str(e)}
+            yield f"data: {json.dumps(error_dict, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+            return
+
+        async for chunk in stream_tokens(events, thread_id, metric_prefix=metric_prefix):
+            yield chunk
+
+async def invoke_chat_turn(
+    user_input: str,
+    chat_id: str,
+    graph: StateGraph
+) -> tuple[Optional[str], bool]:
+    """
+    Chạy một lượt chat qua hộp thư của `chat_id` và trả về câu trả lời cuối cùng.
+
+    Args:
+        user_input (str): Nội dung người dùng nhập.
+        chat_id (str): Mã cuộc hội thoại.
+        graph (StateGraph): Đồ thị tác vụ chính để suy luận.
+
+    Returns:
+        tuple[Optional[str], bool]: (câu trả lời, đã gộp vào lượt khác hay chưa).
+    """
+    async with chat_mailbox.turn(chat_id, user_input) as merged_input:
+        if merged_input is None:
+            return None, True
+
+        customer = await get_or_create_customer(chat_id=chat_id)
+        events, thread_id = await handle_normal_chat(
+            user_input=merged_input,
+            chat_id=chat_id,
+            customer=customer,
+            graph=graph
+        )
+
+        if not (events and thread_id):
+            return None, False
+
+        return await get_final_response(events), False
         
+async def reset_chat(chat_id: str) -> Optional[str]:
+    """
+    Bắt đầu phiên chat mới cho `chat_id` bằng cách gán `uuid` (thread) mới trong DB.
+
+    Args:
+        chat_id (str): Định danh cuộc hội thoại.
+
+    Returns:
+        Optional[str]: UUID mới nếu cập nhật thành công, ngược lại None.
+    """
+    new_uuid = str(uuid.uuid4())
+    updated_uuid = await update_uuid(
+        chat_id=chat_id,
+        new_uuid=new_uuid
+    )
+    invalidate_session(chat_id)
+    
+    return updated_uuid
+
 async def handle_new_chat(
     chat_id: str
 ):
@@ -92,12 +229,9 @@ async def handle_new_chat(
     Yields:
         str: Chuỗi SSE dạng `data: {...}` và token `[DONE]` khi hoàn tất.
     """
+    updated_uuid = None
     try:
-        new_uuid = str(uuid.uuid4())
-        updated_uuid = await update_uuid(
-            chat_id=chat_id,
-            new_uuid=new_uuid
-        )
+        updated_uuid = await reset_chat(chat_id=chat_id)
 
         if not updated_uuid:
             logger.error("Lỗi ở cấp DB -> Không thể cập nhật uuid")
@@ -107,12 +241,7 @@ async def handle_new_chat(
         else:
             logger.info(f"Cập nhật uuid của khách: {chat_id} là {updated_uuid}")
 
-            response = (
-                "Chào anh/chị, em rất vui được hỗ trợ anh/chị. Nếu anh/chị có thắc mắc hoặc "
-                "cần tư vấn về các khóa học của trung tâm, hãy cho em biết nhé! Em rất sẵn lòng giúp đỡ.\n"
-            )
-
-            msg = {"content": response}
+            msg = {"content": NEW_CHAT_GREETING}
             yield f"data: {json.dumps(msg, ensure_ascii=False)}\n\n"
         
     except Exception as e:
@@ -123,4 +252,165 @@ async def handle_new_chat(
     finally:
         await asyncio.sleep(0.01)
         yield "data: [DONE]\n\n"
-        
\ No newline at end of file
+
+def _group_batch(items: list[dict]) -> dict[str, list[list[int]]]:
+    """
+    Gom các tin nhắn trong batch theo `chat_id`, giữ nguyên thứ tự. Các tin nhắn thường
+    liên tiếp của cùng một chat được gộp thành một lượt; lệnh reset luôn là một lượt riêng.
+
+    Returns:
+        dict[str, list[list[int]]]: `chat_id` -> danh sách lượt, mỗi lượt là các chỉ số trong `items`.
+    """
+    groups: dict[str, list[list[int]]] = {}
+    for index, item in enumerate(items):
+        turns = groups.setdefault(item["chat_id"], [])
+        is_reset = any(cmd in item["user_input"] for cmd in RESET_COMMANDS)
+        
+        if (
+            turns
+            and not is_reset
+            and not any(cmd in items[turns[-1][0]]["user_input"] for cmd in RESET_COMMANDS)
+        ):
+            turns[-1].append(index)
+        else:
+            turns.append([index])
+    
+    return groups
+
+async def _run_batch_chat(
+    chat_id: str,
+    turns: list[list[int]],
+    items: list[dict],
+    graph: StateGraph,
+    semaphore: asyncio.Semaphore,
+    publish
+):
+    """
+    Chạy lần lượt các lượt của một `chat_id` trong batch và gọi `publish(index, result)` cho từng tin nhắn.
+    """
+    async with semaphore:
+        for turn in turns:
+            first = turn[0]
+            user_input = "\n".join(items[i]["user_input"] for i in turn)
+            result = {"chat_id": chat_id, "reply": None, "coalesced": False, "error": None}
+            
+            try:
+                if any(cmd in user_input for cmd in RESET_COMMANDS):
+                    if await reset_chat(chat_id=chat_id):
+                        result["reply"] = NEW_CHAT_GREETING
+                    else:
+                        result["error"] = "Lỗi không thể cập nhật uuid"
+                else:
+                    async with admission.slot():
+                        reply, coalesced = await invoke_chat_turn(
+                            user_input=user_input,
+                            chat_id=chat_id,
+                            graph=graph
+                        )
+                    result["reply"] = reply
+                    result["coalesced"] = coalesced
+
+            except AdmissionRejected:
+                # Quá tải: từ chối cả batch để phía gọi nhận 429/503 kèm Retry-After
+                raise
+
+            except Exception as e:
+                logger.error(f"Lỗi khi xử lý batch cho {chat_id}: {e}")
+                result["error"] = str(e)
+            
+            await publish(first, result)
+            for index in turn[1:]:
+                metrics.incr("batch.coalesced")
+                await publish(index, {"chat_id": chat_id, "reply": None, "coalesced": True, "error": None})
+
+async def _gather_batch(items: list[dict], graph: StateGraph, concurrency: int, publish):
+    """
+    Chạy mọi chat trong batch; nếu một chat bị từ chối do quá tải thì hủy các chat còn lại
+    và ném lại lỗi đó.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    tasks = [
+        asyncio.create_task(_run_batch_chat(chat_id, turns, items, graph, semaphore, publish))
+        for chat_id, turns in _group_batch(items).items()
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+async def run_chat_batch(
+    items: list[dict],
+    graph: StateGraph,
+    concurrency: int = BATCH_CONCURRENCY
+) -> list[dict]:
+    """
+    Xử lý đồng thời một batch tin nhắn (`chat_id`, `user_input`) với giới hạn số chat chạy song song.
+    Các tin nhắn của cùng một chat chạy tuần tự theo thứ tự gửi.
+
+    Args:
+        items (list[dict]): Danh sách tin nhắn, mỗi phần tử có `chat_id` và `user_input`.
+        graph (StateGraph): Đồ thị tác vụ chính để suy luận.
+        concurrency (int): Số chat tối đa được xử lý cùng lúc.
+
+    Returns:
+        list[dict]: Kết quả theo đúng thứ tự `items`, mỗi phần tử gồm
+        `chat_id`, `reply`, `coalesced`, `error`.
+
+    Raises:
+        AdmissionRejected: Khi một lượt chạy bị từ chối do quá tải; các chat còn lại bị hủy.
+    """
+    started = time.perf_counter()
+    results: list[Optional[dict]] = [None] * len(items)
+
+    async def publish(index: int, result: dict):
+        results[index] = result
+
+    await _gather_batch(items, graph, concurrency, publish)
+
+    metrics.incr("batch.items", len(items))
+    metrics.observe("batch.duration", time.perf_counter() - started)
+    return results
+
+async def stream_chat_batch(
+    items: list[dict],
+    graph: StateGraph,
+    concurrency: int = BATCH_CONCURRENCY
+):
+    """
+    Giống `run_chat_batch` nhưng phát kết quả dạng SSE ngay khi từng tin nhắn xử lý xong.
+    Mỗi sự kiện được gắn `index` và `chat_id` để phía gọi ghép lại. Response đã bắt đầu nên
+    nếu batch bị từ chối do quá tải, lỗi được gửi dưới dạng sự kiện SSE kèm `retry_after`.
+
+    Yields:
+        str: Chuỗi SSE dạng `data: {...}` và token `[DONE]` khi toàn bộ batch hoàn tất.
+    """
+    started = time.perf_counter()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def publish(index: int, result: dict):
+        await queue.put({"index": index, **result})
+
+    async def run_all():
+        try:
+            await _gather_batch(items, graph, concurrency, publish)
+        finally:
+            await queue.put(None)
+
+    runner = asyncio.create_task(run_all())
+    try:
+        while (event := await queue.get()) is not None:
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        await runner
+    except AdmissionRejected as e:
+        error_dict = {"error": e.reason, "retry_after": e.retry_after}
+        yield f"data: {json.dumps(error_dict, ensure_ascii=False)}\n\n"
+    finally:
+        if not runner.done():
+            runner.cancel()
+        metrics.incr("batch.items", len(items))
+        metrics.observe("batch.duration", time.perf_counter() - started)
+
+    yield "data: [DONE]\n\n"
@@ -1,15 +1,22 @@
 import json
-import asyncio
+import time
 from typing import Any
 from typing import Optional
 from langgraph.graph import StateGraph
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, AIMessageChunk
 from database.connection import supabase_client
+from database.executor import run_db
+from database.session_store import aresolve_session
+from core.utils.metrics import metrics
 
 from log.logger_config import setup_logging
 
 logger = setup_logging(__name__)
 
+# Các node được phép stream token trực tiếp tới khách
+SPECIALIST_NODES = {"course_advisor_agent", "enrollment_agent", "modify_agent"}
+# Các node có thể trả về nguyên một AIMessage cho khách (không qua token)
+REPLY_NODES = SPECIALIST_NODES | {"supervisor", "escalation_agent"}
 
 async def stream_messages(events: Any, thread_id: str):
     """
@@ -39,7 +46,6 @@ async def stream_messages(events: Any, thread_id: str):
                             last_printed = content
                             msg = {"content": content}
                             yield f"data: {json.dumps(msg, ensure_ascii=False)}\n\n"
-                            await asyncio.sleep(0.01)  # slight delay for smoother streaming
     except GeneratorExit:
         closed = True
         raise
@@ -50,21 +56,98 @@ async def stream_messages(events: Any, thread_id: str):
         if not closed:
             yield "data: [DONE]\n\n"
 
+def _source_node(namespace: tuple, metadata: dict) -> str:
+    """
+    Xác định node cấp cao nhất của graph chính đã sinh ra message.
+    Các ReAct agent chạy như subgraph nên `langgraph_node` là node bên trong ("agent", "tools"),
+    còn namespace của subgraph luôn bắt đầu bằng node cha ("course_advisor_agent:<task_id>").
+    Message của graph chính có namespace rỗng.
+    """
+    if namespace:
+        return namespace[0].split(":")[0]
+
+    return metadata.get("langgraph_node", "")
+
+async def stream_tokens(events: Any, thread_id: str, metric_prefix: str = "chat"):
+    """
+    Chuyển luồng `graph.astream(..., stream_mode="messages", subgraphs=True)` thành SSE theo từng token.
+
+    Chỉ token của các agent chuyên trách được gửi đi; token structured output của supervisor,
+    token của LLM tóm tắt và các delta gọi tool đều bị bỏ qua. AIMessage hoàn chỉnh mà node trả về
+    được gửi một lần nếu nội dung chưa được stream: node không stream token (supervisor kết thúc
+    hội thoại, escalation) hoặc agent đã stream một câu dẫn rồi trả thẳng kết quả tool.
+
+    Args:
+        events (Any): Async iterator các bộ `(namespace, (message, metadata))` từ graph.astream.
+        thread_id (str): Định danh luồng hội thoại.
+        metric_prefix (str): Tiền tố tên metric, ví dụ "api_v2.chat".
+
+    Yields:
+        str: Chuỗi SSE dạng `data: {...}\n\n`.
+    """
+    started = time.perf_counter()
+    first_sent = False
+    # node -> message id -> nội dung đã stream của message đó
+    streamed: dict[str, dict[str, str]] = {}
+    closed = False
+
+    try:
+        async for namespace, (message, metadata) in events:
+            node = _source_node(namespace, metadata)
+
+            if isinstance(message, AIMessageChunk):
+                if node not in SPECIALIST_NODES or message.tool_call_chunks:
+                    continue
+                content = message.text()
+                if not content:
+                    continue
+                node_streamed = streamed.setdefault(node, {})
+                node_streamed[message.id] = node_streamed.get(message.id, "") + content
+            elif isinstance(message, AIMessage):
+                # Tin nhắn hoàn chỉnh do node trả về; bỏ qua nếu đúng là nội dung đã stream
+                if message.name not in REPLY_NODES:
+                    continue
+                content = message.text().strip()
+                if not content:
+                    continue
+                if any(text.strip() == content for text in streamed.get(message.name, {}).values()):
+                    continue
+            else:
+                continue
+
+            if not first_sent:
+                first_sent = True
+                metrics.observe(f"{metric_prefix}.time_to_first_token", time.perf_counter() - started)
+
+            msg = {"content": content}
+            yield f"data: {json.dumps(msg, ensure_ascii=False)}\n\n"
+    except GeneratorExit:
+        closed = True
+        raise
+    except Exception as e:
+        metrics.incr(f"{metric_prefix}.errors")
+        error_dict = {"error": str(e), "thread_id": thread_id}
+        yield f"data: {json.dumps(error_dict, ensure_ascii=False)}\n\n"
+    finally:
+        metrics.observe(f"{metric_prefix}.stream_duration", time.perf_counter() - started)
+        if not closed:
+            yield "data: [DONE]\n\n"
+
 async def check_state(
     config: dict,
     graph: StateGraph
 ):
-    state = graph.get_state(config).values
+    state = (await graph.aget_state(config)).values
     
     return state if state else None
 
 async def get_customer(chat_id: str) -> str | None:
     try:
-        res = (
+        res = await run_db(
             supabase_client.table("students")
                 .select("*")
                 .eq("chat_id", chat_id)
-                .execute()
+                .execute
         )
         
         return res.data[0] if res.data else None
@@ -82,11 +165,11 @@ async def get_uuid(chat_id: str) -> str | None:
         str | None: UUID nếu tồn tại, ngược lại None.
     """
     try:
-        res = (
+        res = await run_db(
             supabase_client.table("students")
                 .select("uuid")
                 .eq("chat_id", chat_id)
-                .execute()
+                .execute
         )
 
         return res.data[0]["uuid"] if res.data else None
@@ -105,11 +188,11 @@ async def update_uuid(chat_id: str, new_uuid: str) -> str | None:
         str | None: UUID sau cập nhật nếu thành công, ngược lại None.
     """
     try:
-        res = (
+        res = await run_db(
             supabase_client.table("students")
             .update({"uuid": new_uuid})
             .eq("chat_id", chat_id)
-            .execute()
+            .execute
         )
 
         return res.data[0]["uuid"] if res.data else None
@@ -120,6 +203,7 @@ async def update_uuid(chat_id: str, new_uuid: str) -> str | None:
 async def get_or_create_customer(chat_id: str) -> Optional[dict]:
     """
     Lấy thông tin khách theo `chat_id`, nếu chưa có sẽ tạo bản ghi mới.
+    Bản ghi trả về đã kèm `uuid` phiên chat (một lần gọi RPC, có cache theo TTL).
 
     Args:
         chat_id (str): Định danh cuộc hội thoại/khách hàng.
@@ -127,16 +211,7 @@ async def get_or_create_customer(chat_id: str) -> Optional[dict]:
     Returns:
         Optional[dict]: Bản ghi khách hàng (dict) hoặc None nếu thất bại.
     """
-    response = (
-        supabase_client.table("students")
-        .upsert(
-            {"chat_id": chat_id},
-            on_conflict="chat_id"
-        )
-        .execute()
-    )
-    
-    return response.data[0] if response.data else None
+    return await aresolve_session(chat_id=chat_id)
 
 async def get_final_response(events: Any) -> str:
     """
@@ -1,62 +1,271 @@
+import os
 import time
+import heapq
 import asyncio
-import threading
-from typing import Dict
+from typing import Optional
+from dotenv import load_dotenv
+
+from core.utils.metrics import metrics
+from core.graph.checkpointer import CHECKPOINT_KEEP_LAST, MeteredMemorySaver
 
 from log.logger_config import setup_logging
 
+load_dotenv()
+
 logger = setup_logging(__name__)
 
+CLEANUP_INTERVAL_MINUTES = float(os.getenv("CLEANUP_INTERVAL_MINUTES", "30"))
+STATE_TTL_MINUTES = float(os.getenv("STATE_TTL_MINUTES", "120"))
+# 0 = không giới hạn
+STATE_MAX_THREADS = int(os.getenv("STATE_MAX_THREADS", "10000"))
+STATE_MAX_MEMORY_MB = float(os.getenv("STATE_MAX_MEMORY_MB", "512"))
+CHECKPOINT_COMPACTION_INTERVAL_SECONDS = float(os.getenv("CHECKPOINT_COMPACTION_INTERVAL_SECONDS", "60"))
+# Checkpointer bền (sqlite/postgres) là nơi lưu hội thoại lâu dài: chỉ xóa theo TTL/LRU khi bật rõ ràng
+STATE_EVICT_DURABLE = os.getenv("STATE_EVICT_DURABLE", "false").lower() == "true"
+# Số thread xóa đồng thời mỗi đợt
+STATE_DELETE_BATCH_SIZE = int(os.getenv("STATE_DELETE_BATCH_SIZE", "100"))
+# Số thread nén liên tiếp trước khi nhường event loop
+COMPACTION_BATCH_SIZE = 200
+# Số mục cũ tối thiểu được phép tồn trong heap trước khi dựng lại
+HEAP_SLACK = 1024
+
+
+class ExpiryIndex:
+    """
+    Chỉ mục thời điểm truy cập của các thread: min-heap `(timestamp, thread_id)` với xóa lười.
+
+    Mỗi lần truy cập chỉ đẩy thêm một mục mới (O(log n)); mục cũ của cùng thread bị bỏ qua khi
+    nổi lên đỉnh heap vì không khớp `last_access`. Đỉnh heap luôn là thread ít dùng nhất, nên cùng
+    một heap phục vụ cả hết hạn TTL lẫn loại LRU, và mỗi lượt dọn chỉ chạm vào các thread bị loại.
+    """
+
+    def __init__(self):
+        self.last_access: dict[str, float] = {}
+        self._heap: list[tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self.last_access)
+
+    def __contains__(self, thread_id: str) -> bool:
+        return thread_id in self.last_access
+
+    def touch(self, thread_id: str, timestamp: float):
+        """Ghi nhận truy cập của `thread_id` tại `timestamp`."""
+        self.last_access[thread_id] = timestamp
+        heapq.heappush(self._heap, (timestamp, thread_id))
+        if len(self._heap) > 2 * len(self.last_access) + HEAP_SLACK:
+            self._rebuild()
+
+    def _rebuild(self):
+        # Bỏ hết mục cũ; chi phí O(n) được chia đều cho >= n lần `touch` trước đó
+        self._heap = [(timestamp, thread_id) for thread_id, timestamp in self.last_access.items()]
+        heapq.heapify(self._heap)
+
+    def _peek(self) -> Optional[tuple[float, str]]:
+        heap = self._heap
+        while heap:
+            timestamp, thread_id = heap[0]
+            if self.last_access.get(thread_id) == timestamp:
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+
+    def pop_expired(self, cutoff: float) -> list[str]:
+        """Lấy ra mọi thread có lần truy cập cuối không muộn hơn `cutoff`."""
+        expired = []
+        while (entry := self._peek()) is not None and entry[0] <= cutoff:
+            heapq.heappop(self._heap)
+            del self.last_access[entry[1]]
+            expired.append(entry[1])
+        return expired
+
+    def pop_oldest(self, keep: Optional[str] = None) -> Optional[str]:
+        """Lấy ra thread ít dùng nhất, bỏ qua `keep`; None nếu không còn thread nào khác."""
+        skipped = None
+        entry = self._peek()
+        if entry is not None and entry[1] == keep:
+            skipped = heapq.heappop(self._heap)
+            entry = self._peek()
+        if entry is not None:
+            heapq.heappop(self._heap)
+            del self.last_access[entry[1]]
+        if skipped is not None:
+            heapq.heappush(self._heap, skipped)
+        return entry[1] if entry is not None else None
+
+
+
 class StateCleanupManager:
-    def __init__(self, graph, cleanup_interval_minutes=30, state_ttl_minutes=60):
+    def __init__(
+        self,
+        graph,
+        cleanup_interval_minutes=CLEANUP_INTERVAL_MINUTES,
+        state_ttl_minutes=STATE_TTL_MINUTES,
+        max_threads=STATE_MAX_THREADS,
+        max_memory_mb=STATE_MAX_MEMORY_MB,
+        checkpoint_keep_last=CHECKPOINT_KEEP_LAST,
+        compaction_interval_seconds=CHECKPOINT_COMPACTION_INTERVAL_SECONDS,
+        delete_batch_size=STATE_DELETE_BATCH_SIZE,
+        evict_durable=STATE_EVICT_DURABLE
+    ):
         """
         Args:
             graph: LangGraph instance
             cleanup_interval_minutes: Khoảng thời gian chạy cleanup task (phút)
             state_ttl_minutes: Thời gian sống của state (phút)
+            max_threads: Số thread tối đa được giữ state (0 = không giới hạn)
+            max_memory_mb: Tổng dung lượng checkpoint tối đa (MB, 0 = không giới hạn);
+                chỉ áp dụng khi checkpointer đếm được byte (`MeteredMemorySaver`)
+            checkpoint_keep_last: Số checkpoint mới nhất giữ lại mỗi thread khi nén (0 = không nén)
+            compaction_interval_seconds: Khoảng thời gian giữa các lần nén checkpoint (giây)
+            delete_batch_size: Số thread xóa đồng thời mỗi đợt
+            evict_durable: Cho phép xóa thread theo TTL/LRU cả khi checkpointer không phải
+                `MeteredMemorySaver` (sqlite/postgres); mặc định chỉ xóa state trong bộ nhớ
         """
         self.graph = graph
         self.cleanup_interval = cleanup_interval_minutes * 60  # Convert to seconds
         self.state_ttl = state_ttl_minutes * 60  # Convert to seconds
-        self.thread_timestamps: Dict[str, float] = {}
+        self.max_threads = max_threads
+        self.max_bytes = int(max_memory_mb * 1024 * 1024)
+        self.checkpoint_keep_last = checkpoint_keep_last
+        self.compaction_interval = compaction_interval_seconds
+        self.delete_batch_size = max(1, delete_batch_size)
+        self.expiry_index = ExpiryIndex()
+        self.thread_timestamps = self.expiry_index.last_access
         self.cleanup_task = None
+        self.compaction_task = None
         self.is_running = False
-        
+        self.evict_threads = isinstance(graph.checkpointer, MeteredMemorySaver) or evict_durable
+
+        if not self.evict_threads:
+            logger.warning(
+                f"{type(graph.checkpointer).__name__} may be a durable checkpointer, "
+                "STATE_TTL_MINUTES and STATE_MAX_THREADS are ignored (set STATE_EVICT_DURABLE=true to evict)"
+            )
+            self.max_threads = 0
+
+        if self.max_bytes and not hasattr(graph.checkpointer, "total_bytes"):
+            logger.warning(
+                f"{type(graph.checkpointer).__name__} does not report its size, "
+                "STATE_MAX_MEMORY_MB is ignored"
+            )
+            self.max_bytes = 0
+
+        if self.checkpoint_keep_last and not hasattr(graph.checkpointer, "prune_thread"):
+            logger.warning(
+                f"{type(graph.checkpointer).__name__} does not support history pruning, "
+                "CHECKPOINT_KEEP_LAST is ignored"
+            )
+            self.checkpoint_keep_last = 0
+
+        metrics.register_gauge("state.resident_threads", lambda: len(self.expiry_index))
+        metrics.register_gauge("state.bytes_retained", self.bytes_retained)
+
     def register_thread(self, thread_id: str):
         """Đăng ký thread_id mới với timestamp hiện tại"""
-        self.thread_timestamps[thread_id] = time.time()
+        self.update_thread_access(thread_id)
         logger.info(f"Registered thread {thread_id} for cleanup")
-    
+
     def update_thread_access(self, thread_id: str):
         """Cập nhật thời gian truy cập cuối của thread"""
-        self.thread_timestamps[thread_id] = time.time()
-    
+        self.expiry_index.touch(thread_id, time.time())
+
+    def bytes_retained(self) -> Optional[int]:
+        """Tổng số byte checkpoint đang giữ, None nếu checkpointer không đếm được"""
+        return getattr(self.graph.checkpointer, "total_bytes", None)
+
+    async def touch(self, thread_id: str):
+        """
+        Gọi ở mỗi lượt chat: ghi nhận truy cập của `thread_id` rồi loại các thread ít dùng nhất
+        nếu vượt giới hạn số thread hoặc bộ nhớ. Thread hiện tại không bao giờ bị loại.
+        """
+        if not self.evict_threads:
+            return
+
+        if thread_id in self.expiry_index:
+            self.update_thread_access(thread_id)
+        else:
+            self.register_thread(thread_id)
+        await self._evict_over_limits(keep=thread_id)
+
+    def _pick_lru_victims(self, keep: Optional[str]) -> dict[str, list[str]]:
+        victims = {"threads": [], "memory": []}
+
+        if self.max_threads:
+            while len(self.expiry_index) > self.max_threads:
+                thread_id = self.expiry_index.pop_oldest(keep)
+                if thread_id is None:
+                    break
+                victims["threads"].append(thread_id)
+
+        if self.max_bytes:
+            thread_bytes = self.graph.checkpointer.thread_bytes
+            extra_bytes = self.bytes_retained() - self.max_bytes
+            # Byte của các thread vừa chọn ở trên chưa được trừ vì chưa xóa
+            extra_bytes -= sum(thread_bytes(thread_id) for thread_id in victims["threads"])
+            while extra_bytes > 0:
+                thread_id = self.expiry_index.pop_oldest(keep)
+                if thread_id is None:
+                    break
+                victims["memory"].append(thread_id)
+                extra_bytes -= thread_bytes(thread_id)
+
+        return victims
+
+    async def _evict_over_limits(self, keep: Optional[str] = None):
+        for reason, thread_ids in self._pick_lru_victims(keep).items():
+            if thread_ids:
+                logger.info(f"Evicting {len(thread_ids)} least recently used threads over the {reason} limit")
+                await self._delete_threads(thread_ids, reason)
+
+    async def _delete_threads(self, thread_ids: list[str], reason: str):
+        """Xóa state của các thread theo từng đợt `delete_batch_size` thread chạy đồng thời"""
+        checkpointer = self.graph.checkpointer
+        deleted = 0
+        for start in range(0, len(thread_ids), self.delete_batch_size):
+            batch = thread_ids[start:start + self.delete_batch_size]
+            # Xóa state từ LangGraph checkpointer
+            results = await asyncio.gather(
+                *(checkpointer.adelete_thread(thread_id) for thread_id in batch),
+                return_exceptions=True
+            )
+            for thread_id, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Failed to delete state for thread {thread_id}: {result}")
+                else:
+                    deleted += 1
+
+        metrics.incr(f"state.evictions.{reason}", deleted)
+        logger.info(f"Deleted state for {deleted}/{len(thread_ids)} threads ({reason})")
+
     def start_cleanup_task(self):
-        """Bắt đầu background cleanup task"""
+        """Bắt đầu background cleanup task trên event loop đang chạy"""
         if self.is_running:
             logger.warning("Cleanup task is already running")
             return
-            
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            logger.warning("State cleanup needs a running event loop, background task not started")
+            return
+
         self.is_running = True
-        
-        # Sử dụng asyncio.create_task cho async environment
-        if asyncio.get_event_loop().is_running():
+        if self.evict_threads:
             self.cleanup_task = asyncio.create_task(self._async_cleanup_loop())
-        else:
-            # Sử dụng threading cho sync environment
-            self.cleanup_task = threading.Thread(target=self._sync_cleanup_loop, daemon=True)
-            self.cleanup_task.start()
-            
+        if self.checkpoint_keep_last:
+            self.compaction_task = asyncio.create_task(self._async_compaction_loop())
+
         logger.info("Started state cleanup background task")
-    
+
     def stop_cleanup_task(self):
         """Dừng background cleanup task"""
         self.is_running = False
-        if self.cleanup_task:
-            if hasattr(self.cleanup_task, 'cancel'):
-                self.cleanup_task.cancel()
+        for task in (self.cleanup_task, self.compaction_task):
+            if task:
+                task.cancel()
         logger.info("Stopped state cleanup background task")
-    
+
     async def _async_cleanup_loop(self):
         """Async cleanup loop"""
         while self.is_running:
@@ -67,37 +276,65 @@ class StateCleanupManager:
                 break
             except Exception as e:
                 logger.error(f"Error in async cleanup loop: {e}")
-    
-    def _sync_cleanup_loop(self):
-        """Sync cleanup loop"""
+
+    async def _async_compaction_loop(self):
+        """Async checkpoint compaction loop"""
         while self.is_running:
             try:
-                time.sleep(self.cleanup_interval)
-                asyncio.run(self._cleanup_expired_states())
+                await asyncio.sleep(self.compaction_interval)
+                await self.compact_checkpoints()
+            except asyncio.CancelledError:
+                break
             except Exception as e:
-                logger.error(f"Error in sync cleanup loop: {e}")
-    
+                logger.error(f"Error in checkpoint compaction loop: {e}")
+
+    async def compact_checkpoints(self) -> int:
+        """
+        Cắt lịch sử checkpoint của các thread có checkpoint mới kể từ lần nén trước,
+        chỉ giữ `checkpoint_keep_last` checkpoint mới nhất mỗi thread.
+
+        Returns:
+            int: Tổng số byte đã giải phóng.
+        """
+        checkpointer = self.graph.checkpointer
+        started = time.perf_counter()
+        reclaimed = 0
+
+        thread_ids = checkpointer.take_dirty_threads()
+        for index, thread_id in enumerate(thread_ids, start=1):
+            reclaimed += checkpointer.prune_thread(thread_id, self.checkpoint_keep_last)
+            if index % COMPACTION_BATCH_SIZE == 0:
+                await asyncio.sleep(0)
+
+        metrics.incr("checkpoints.compaction.threads", len(thread_ids))
+        metrics.incr("checkpoints.compaction.bytes_reclaimed", reclaimed)
+        metrics.observe("checkpoints.compaction", time.perf_counter() - started)
+        if reclaimed:
+            logger.info(f"Compacted {len(thread_ids)} threads, reclaimed {reclaimed} bytes")
+        return reclaimed
+
     async def _cleanup_expired_states(self):
-        """Xóa các state đã hết hạn"""
-        current_time = time.time()
-        expired_threads = []
-        
-        for thread_id, timestamp in list(self.thread_timestamps.items()):
-            if current_time - timestamp > self.state_ttl:
-                expired_threads.append(thread_id)
-        
+        """Xóa các state đã hết hạn, sau đó áp lại giới hạn số thread / bộ nhớ"""
+        started = time.perf_counter()
+        expired_threads = self.expiry_index.pop_expired(time.time() - self.state_ttl)
+        metrics.observe("state.expiry_tick", time.perf_counter() - started)
+
         if expired_threads:
             logger.info(f"Cleaning up {len(expired_threads)} expired threads")
-            
             # Xóa state từ database/memory
-            for thread_id in expired_threads:
-                try:
-                    # Xóa state từ LangGraph checkpointer
-                    self.graph.checkpointer.delete_thread(thread_id)
-                    
-                    # Xóa khỏi tracking dictionary
-                    del self.thread_timestamps[thread_id]
-                    
-                    logger.info(f"Deleted state for thread {thread_id}")
-                except Exception as e:
-                    logger.error(f"Failed to delete state for thread {thread_id}: {e}")
\ No newline at end of file
+            await self._delete_threads(expired_threads, "ttl")
+
+        await self._evict_over_limits()
+
+
+async def track_thread(graph, thread_id: str):
+    """
+    Ghi nhận một lượt của `thread_id` với `cleanup_manager` của graph (nếu có).
+
+    Args:
+        graph: Graph dùng chung, được gắn `cleanup_manager` trong `init_graph`.
+        thread_id (str): Thread hội thoại của lượt hiện tại.
+    """
+    cleanup_manager = getattr(graph, "cleanup_manager", None)
+    if cleanup_manager is not None:
+        await cleanup_manager.touch(thread_id)
@@ -0,0 +1,9 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Các client (Supabase, OpenAI) được tạo lười nên khóa giả đủ để import module mà không gọi dịch vụ thật
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_KEY", "test")
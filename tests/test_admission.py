@@ -0,0 +1,100 @@
+import json
+import asyncio
+
+import httpx
+import pytest
+
+import services.process_chat as process_chat
+from api.v2.routes import chat, ChatRequest
+from core.graph.graph_dependencies import get_graph
+from services.admission import AdmissionController, AdmissionRejected, admission
+from main import app
+
+BATCH = [{"chat_id": "chat-1", "user_input": "Xin chào"}, {"chat_id": "chat-2", "user_input": "Học phí bao nhiêu?"}]
+
+
+async def _chunks(count: int):
+    for index in range(count):
+        yield f"data: {index}\n\n"
+
+
+def test_route_does_not_hold_a_slot_before_the_stream_starts():
+    async def run():
+        # Client ngắt kết nối trước khi Starlette đọc chunk đầu tiên: generator không bao giờ chạy
+        response = await chat(ChatRequest(chat_id="chat-1", user_input="Xin chào"), graph=None)
+        return response, admission.running, admission.queued
+
+    response, running, queued = asyncio.run(run())
+
+    assert response.media_type == "text/event-stream"
+    assert (running, queued) == (0, 0)
+
+
+def test_guard_stream_releases_the_slot_when_the_client_disconnects():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, timeout_seconds=1, retry_after=5)
+
+    async def run():
+        stream = controller.guard_stream(_chunks(3))
+        first = await anext(stream)
+        running = controller.running
+        await stream.aclose()
+        return first, running
+
+    first, running = asyncio.run(run())
+
+    assert first == "data: 0\n\n"
+    assert running == 1
+    assert controller.running == 0
+
+
+def test_guard_stream_reports_a_timed_out_wait_as_an_sse_error():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, timeout_seconds=0.05, retry_after=5)
+
+    async def run():
+        async with controller.slot():
+            return [chunk async for chunk in controller.guard_stream(_chunks(3))]
+
+    chunks = asyncio.run(run())
+
+    assert json.loads(chunks[0].removeprefix("data: "))["retry_after"] == 5
+    assert chunks[1:] == ["data: [DONE]\n\n"]
+    assert (controller.running, controller.queued) == (0, 0)
+
+
+def test_batch_is_rejected_up_front_when_the_queue_is_full(monkeypatch):
+    monkeypatch.setattr(admission, "max_queue", 0)
+    monkeypatch.setattr(admission, "running", admission.max_concurrent)
+    app.dependency_overrides[get_graph] = lambda: None
+
+    async def run() -> httpx.Response:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/v3/chat/batch", json={"items": BATCH})
+
+    try:
+        response = asyncio.run(run())
+    finally:
+        app.dependency_overrides.pop(get_graph, None)
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == str(admission.retry_after)
+
+
+def test_batch_propagates_a_timed_out_admission(monkeypatch):
+    controller = AdmissionController(max_concurrent=1, max_queue=4, timeout_seconds=0.05, retry_after=5)
+    monkeypatch.setattr(process_chat, "admission", controller)
+
+    async def invoke_chat_turn(**kwargs):
+        raise AssertionError("graph must not run without an admission slot")
+
+    monkeypatch.setattr(process_chat, "invoke_chat_turn", invoke_chat_turn)
+
+    async def run():
+        async with controller.slot():
+            await process_chat.run_chat_batch(items=BATCH, graph=None)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        asyncio.run(run())
+
+    assert rejected.value.status_code == 503
+    assert (controller.running, controller.queued) == (0, 0)
@@ -0,0 +1,39 @@
+from core.graph.state import init_state, Cart, CourseRef
+from core.tools.cart_tool import add_item_cart_tool, alter_item_cart_tool
+from core.utils.course_catalog import course_catalog
+
+MISSING_COURSE_ID = 987654
+
+
+def _state_with_unresolvable_course() -> dict:
+    # Tham chiếu còn trong checkpoint nhưng khóa học đã bị xóa khỏi `courses_description`
+    state = init_state()
+    state["seen_products"] = {MISSING_COURSE_ID: CourseRef(course_id=MISSING_COURSE_ID, version="deadbeef0000")}
+    state["cart"] = {MISSING_COURSE_ID: Cart(course_id=MISSING_COURSE_ID, price=1000, subtotal=1000)}
+    return state
+
+
+def test_add_item_asks_again_when_course_cannot_be_resolved(monkeypatch):
+    monkeypatch.setattr(course_catalog, "fetch_rows", lambda course_ids: [])
+
+    command = add_item_cart_tool.func(
+        course_id=MISSING_COURSE_ID,
+        state=_state_with_unresolvable_course(),
+        tool_call_id="call-1"
+    )
+
+    assert "cart" not in command.update
+    assert command.update["messages"][0].content == "Không thể xác định được sản phẩm khách muốn mua, hỏi lại khách"
+
+
+def test_alter_item_asks_again_when_course_cannot_be_resolved(monkeypatch):
+    monkeypatch.setattr(course_catalog, "fetch_rows", lambda course_ids: [])
+
+    command = alter_item_cart_tool.func(
+        course_id=MISSING_COURSE_ID,
+        state=_state_with_unresolvable_course(),
+        tool_call_id="call-1"
+    )
+
+    assert "cart" not in command.update
+    assert command.update["messages"][0].content.startswith("Không xác định được sản phẩm khách muốn thay đổi")
@@ -0,0 +1,60 @@
+import asyncio
+
+from services.chat_mailbox import ChatMailbox
+
+
+async def _hold_turn(mailbox: ChatMailbox, user_input: str, started: asyncio.Event, release: asyncio.Event):
+    async with mailbox.turn("chat-1", user_input) as merged_input:
+        started.set()
+        await release.wait()
+        return merged_input
+
+
+async def _take_turn(mailbox: ChatMailbox, user_input: str):
+    async with mailbox.turn("chat-1", user_input) as merged_input:
+        return merged_input
+
+
+def test_coalesced_messages_run_in_the_owner_turn():
+    async def run():
+        mailbox = ChatMailbox()
+        started, release = asyncio.Event(), asyncio.Event()
+        running = asyncio.create_task(_hold_turn(mailbox, "a", started, release))
+        await started.wait()
+
+        owner = asyncio.create_task(_take_turn(mailbox, "b"))
+        await asyncio.sleep(0)
+        coalesced = asyncio.create_task(_take_turn(mailbox, "c"))
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(running, owner, coalesced)
+
+    assert asyncio.run(run()) == ["a", "b\nc", None]
+
+
+def test_coalesced_messages_survive_a_cancelled_owner():
+    async def run():
+        mailbox = ChatMailbox()
+        started, release = asyncio.Event(), asyncio.Event()
+        running = asyncio.create_task(_hold_turn(mailbox, "a", started, release))
+        await started.wait()
+
+        # Chủ lượt đang chờ lock thì client ngắt kết nối
+        owner = asyncio.create_task(_take_turn(mailbox, "b"))
+        await asyncio.sleep(0)
+        first = asyncio.create_task(_take_turn(mailbox, "c"))
+        second = asyncio.create_task(_take_turn(mailbox, "d"))
+        await asyncio.sleep(0)
+        owner.cancel()
+        await asyncio.sleep(0)
+
+        release.set()
+        results = await asyncio.gather(running, first, second)
+        return owner.cancelled(), results, mailbox.active_chats
+
+    cancelled, results, active_chats = asyncio.run(run())
+
+    assert cancelled
+    # Người chờ đầu tiên tiếp quản toàn bộ tin nhắn đã gộp, người còn lại gộp vào lượt đó
+    assert results == ["a", "b\nc\nd", None]
+    assert active_chats == 0
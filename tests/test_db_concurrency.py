@@ -0,0 +1,82 @@
+import math
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph, START, END
+
+import database.executor as executor
+import database.session_store as session_store
+from core.graph.state import AgentState
+from core.graph.graph_dependencies import get_graph
+from main import app
+
+DB_LATENCY = 0.2
+POOL_SIZE = 4
+REQUESTS = 16
+
+
+def _build_graph():
+    async def course_advisor_agent(state: AgentState) -> dict:
+        return {"messages": [AIMessage(content="Dạ em chào anh/chị ạ", name="course_advisor_agent")]}
+
+    workflow = StateGraph(AgentState)
+    workflow.add_node("course_advisor_agent", course_advisor_agent)
+    workflow.add_edge(START, "course_advisor_agent")
+    workflow.add_edge("course_advisor_agent", END)
+    return workflow.compile(checkpointer=MemorySaver())
+
+
+async def _fire(client: httpx.AsyncClient, count: int) -> list[httpx.Response]:
+    return await asyncio.gather(*(
+        client.post("/api/v2/chat", json={"chat_id": f"chat-{index}", "user_input": "Xin chào"})
+        for index in range(count)
+    ))
+
+
+def test_chat_db_calls_run_concurrently_on_bounded_pool(monkeypatch):
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def slow_resolve(chat_id: str) -> dict:
+        # Truy vấn Supabase đồng bộ giả: chặn thread đang chạy trong DB_LATENCY giây
+        nonlocal in_flight, max_in_flight
+        with lock:
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+        time.sleep(DB_LATENCY)
+        with lock:
+            in_flight -= 1
+        return {"uuid": f"thread-{chat_id}", "student_id": 1, "name": None, "phone_number": None, "email": None}
+
+    pool = ThreadPoolExecutor(max_workers=POOL_SIZE)
+    monkeypatch.setattr(executor, "_db_executor", pool)
+    monkeypatch.setattr(executor, "DB_POOL_SIZE", POOL_SIZE)
+    monkeypatch.setattr(session_store, "_resolve_from_db", slow_resolve)
+    graph = _build_graph()
+    app.dependency_overrides[get_graph] = lambda: graph
+
+    async def run() -> tuple[float, list[httpx.Response]]:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            started = time.perf_counter()
+            responses = await _fire(client, REQUESTS)
+            return time.perf_counter() - started, responses
+
+    try:
+        elapsed, responses = asyncio.run(run())
+    finally:
+        app.dependency_overrides.pop(get_graph, None)
+        pool.shutdown()
+
+    assert all(response.status_code == 200 for response in responses)
+    assert all("data: [DONE]" in response.text for response in responses)
+    # Tuần tự sẽ mất REQUESTS * DB_LATENCY; pool giới hạn còn ceil(REQUESTS / POOL_SIZE) đợt
+    assert max_in_flight == POOL_SIZE
+    assert elapsed >= math.ceil(REQUESTS / POOL_SIZE) * DB_LATENCY * 0.9
+    assert elapsed < REQUESTS * DB_LATENCY / 2
@@ -0,0 +1,28 @@
+import pytest
+
+from core.graph.intent_router import IntentRouter
+
+CART = {101: {"course_id": 101, "price": 6500000, "subtotal": 6500000}}
+ORDER = {7: {"order_id": 7, "status": "pending"}}
+
+router = IntentRouter(enabled=True)
+
+
+def _route(user_input: str, cart=None, order=None):
+    decision = router.route({"user_input": user_input, "cart": cart, "order": order, "messages": []})
+    return decision.next if decision else None
+
+
+@pytest.mark.parametrize("user_input", ["ok", "Oke em", "ok, chốt đơn nhé", "Xác nhận!", "đúng rồi ạ"])
+def test_short_confirmation_with_cart_goes_to_enrollment(user_input):
+    assert _route(user_input, cart=CART) == "enrollment_agent"
+
+
+def test_confirmation_followed_by_a_question_falls_back_to_llm():
+    assert _route("ok còn khóa TOEIC học phí bao nhiêu", cart=CART) is None
+
+
+def test_course_info_routes_locally_only_without_cart_or_order():
+    assert _route("cho em hỏi lịch học khóa IELTS") == "course_advisor_agent"
+    assert _route("cho em hỏi lịch học khóa IELTS", order=ORDER) is None
+    assert _route("tư vấn giúp em học phí", cart=CART) is None
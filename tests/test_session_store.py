@@ -0,0 +1,57 @@
+import httpx
+from supabase import PostgrestAPIError
+
+import database.session_store as session_store
+
+STUDENT = {"chat_id": "chat-1", "uuid": "thread-1", "student_id": 1}
+
+
+class FailingRpc:
+    """Client Supabase giả: mọi lời gọi RPC ném `error`."""
+
+    def __init__(self, error: Exception):
+        self.error = error
+        self.calls = 0
+
+    def rpc(self, name: str, params: dict):
+        self.calls += 1
+        return self
+
+    def execute(self):
+        raise self.error
+
+
+def _patch(monkeypatch, error: Exception) -> tuple[FailingRpc, list[str]]:
+    client = FailingRpc(error)
+    legacy_calls = []
+
+    def resolve_legacy(chat_id: str) -> dict:
+        legacy_calls.append(chat_id)
+        return STUDENT
+
+    monkeypatch.setattr(session_store, "supabase_client", client)
+    monkeypatch.setattr(session_store, "_resolve_legacy", resolve_legacy)
+    monkeypatch.setattr(session_store, "_rpc_missing", False)
+    return client, legacy_calls
+
+
+def test_missing_rpc_falls_back_once_and_is_remembered(monkeypatch):
+    error = PostgrestAPIError({"code": "PGRST202", "message": "Could not find the function public.resolve_session"})
+    client, legacy_calls = _patch(monkeypatch, error)
+
+    assert session_store._resolve_from_db("chat-1") == STUDENT
+    assert session_store._resolve_from_db("chat-1") == STUDENT
+    assert client.calls == 1
+    assert legacy_calls == ["chat-1", "chat-1"]
+
+
+def test_transient_rpc_errors_do_not_fall_back(monkeypatch):
+    for error in (
+        httpx.ReadTimeout("timed out"),
+        PostgrestAPIError({"code": "57014", "message": "canceling statement due to statement timeout"}),
+    ):
+        client, legacy_calls = _patch(monkeypatch, error)
+
+        assert session_store._resolve_from_db("chat-1") is None
+        assert legacy_calls == []
+        assert not session_store._rpc_missing
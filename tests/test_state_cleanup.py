@@ -0,0 +1,58 @@
+import asyncio
+from types import SimpleNamespace
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from core.graph.checkpointer import MeteredMemorySaver
+from state_management.state_cleanup_manager import StateCleanupManager
+
+
+class DurableSaver(InMemorySaver):
+    """Đứng thay cho checkpointer sqlite/postgres: ghi lại các thread bị xóa."""
+
+    def __init__(self):
+        super().__init__()
+        self.deleted = []
+
+    async def adelete_thread(self, thread_id: str):
+        self.deleted.append(thread_id)
+
+
+async def _fill(manager: StateCleanupManager, count: int):
+    for index in range(count):
+        await manager.touch(f"thread-{index}")
+    await manager._cleanup_expired_states()
+
+
+def test_durable_checkpointer_is_not_evicted_by_default():
+    checkpointer = DurableSaver()
+    manager = StateCleanupManager(SimpleNamespace(checkpointer=checkpointer), state_ttl_minutes=0, max_threads=2)
+
+    asyncio.run(_fill(manager, 5))
+
+    assert checkpointer.deleted == []
+
+
+def test_durable_checkpointer_evicts_when_opted_in():
+    checkpointer = DurableSaver()
+    manager = StateCleanupManager(
+        SimpleNamespace(checkpointer=checkpointer), state_ttl_minutes=0, max_threads=2, evict_durable=True
+    )
+
+    asyncio.run(_fill(manager, 5))
+
+    assert sorted(checkpointer.deleted) == [f"thread-{index}" for index in range(5)]
+
+
+def test_memory_checkpointer_evicts_least_recently_used():
+    checkpointer = MeteredMemorySaver()
+    manager = StateCleanupManager(SimpleNamespace(checkpointer=checkpointer), max_threads=2)
+    deleted = []
+
+    async def adelete_thread(thread_id: str):
+        deleted.append(thread_id)
+
+    checkpointer.adelete_thread = adelete_thread
+    asyncio.run(_fill(manager, 5))
+
+    assert deleted == ["thread-0", "thread-1", "thread-2"]
@@ -0,0 +1,81 @@
+import json
+import asyncio
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph, START, END
+from langgraph.prebuilt import create_react_agent
+
+from core.graph.state import AgentState
+from services.process_chat import handle_normal_chat
+from services.utils import stream_tokens
+
+REPLY = "Dạ trung tâm đang có khóa IELTS cấp tốc 8 tuần ạ"
+CUSTOMER = {"uuid": "thread-1", "student_id": 1, "name": None, "phone_number": None, "email": None}
+
+
+def _build_graph(progress: dict):
+    # Agent chuyên trách lồng trong node giống CourseAdvisorAgent; model giả stream từng từ
+    agent = create_react_agent(GenericFakeChatModel(messages=iter([AIMessage(content=REPLY)])), tools=[])
+
+    async def course_advisor_agent(state: AgentState) -> dict:
+        result = await agent.ainvoke({"messages": [HumanMessage(content=state["user_input"])]})
+        progress["finished"] = True
+        return {"messages": [AIMessage(content=result["messages"][-1].content, name="course_advisor_agent")]}
+
+    workflow = StateGraph(AgentState)
+    workflow.add_node("course_advisor_agent", course_advisor_agent)
+    workflow.add_edge(START, "course_advisor_agent")
+    workflow.add_edge("course_advisor_agent", END)
+    return workflow.compile(checkpointer=MemorySaver())
+
+
+async def _collect(graph, progress: dict) -> list[tuple[str, bool]]:
+    events, thread_id = await handle_normal_chat(
+        user_input="Trung tâm có khóa IELTS nào không?",
+        chat_id="chat-1",
+        customer=CUSTOMER,
+        graph=graph,
+        stream_mode="messages"
+    )
+    return [(chunk, progress["finished"]) async for chunk in stream_tokens(events, thread_id)]
+
+
+def _content(chunk: str) -> str:
+    return json.loads(chunk.removeprefix("data: "))["content"]
+
+
+def test_specialist_tokens_stream_before_the_graph_finishes():
+    progress = {"finished": False}
+    chunks = asyncio.run(_collect(_build_graph(progress), progress))
+
+    assert chunks[-1][0] == "data: [DONE]\n\n"
+    contents = [(_content(chunk), finished) for chunk, finished in chunks[:-1]]
+    early = [content for content, finished in contents if not finished]
+    assert len(early) > 1
+    # AIMessage hoàn chỉnh của node trùng nội dung đã stream nên không được gửi lại
+    assert "".join(content for content, _ in contents) == REPLY
+
+
+def test_direct_return_reply_is_sent_after_streamed_preamble():
+    progress = {"finished": False}
+    preamble = "Dạ em kiểm tra lịch khai giảng ngay ạ"
+    direct_reply = "Khóa IELTS cấp tốc khai giảng ngày 15/11 ạ"
+    model = GenericFakeChatModel(messages=iter([AIMessage(content=preamble)]))
+
+    async def course_advisor_agent(state: AgentState) -> dict:
+        # Model stream câu dẫn, sau đó node trả thẳng kết quả tool (return_direct) cho khách
+        await model.ainvoke(state["user_input"])
+        progress["finished"] = True
+        return {"messages": [AIMessage(content=direct_reply, name="course_advisor_agent")]}
+
+    workflow = StateGraph(AgentState)
+    workflow.add_node("course_advisor_agent", course_advisor_agent)
+    workflow.add_edge(START, "course_advisor_agent")
+    workflow.add_edge("course_advisor_agent", END)
+    chunks = asyncio.run(_collect(workflow.compile(checkpointer=MemorySaver()), progress))
+
+    contents = [_content(chunk) for chunk, _ in chunks[:-1]]
+    assert "".join(contents[:-1]) == preamble
+    assert contents[-1] == direct_reply